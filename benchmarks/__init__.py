@@ -0,0 +1,13 @@
+"""
+Benchmarks for the ``merethread`` package.
+
+Each ``bench_*`` module can be run as a script, e.g.::
+
+    % python -m benchmarks.bench_pool
+
+All of them can be run together, optionally writing (``-o``) or comparing against
+(``--compare``) a JSON baseline::
+
+    % python -m benchmarks -o baseline.json
+    % python -m benchmarks --compare baseline.json
+"""
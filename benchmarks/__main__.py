@@ -0,0 +1,101 @@
+"""
+Run all the benchmarks, and report their results together.
+
+    % python -m benchmarks --json -o results.json
+    % python -m benchmarks --compare results.json
+"""
+
+import sys
+import json
+import importlib
+
+from .common import get_arg_parser, parse_args, report, to_json_obj
+
+
+################################################################################
+
+MODULES = [
+    'bench_lifecycle',
+    'bench_construction',
+    'bench_futures',
+    'bench_stop_check',
+    'bench_pool',
+    'bench_eventloop',
+    'bench_queues',
+    'bench_profile',
+    'bench_introspection',
+    'bench_deadlines',
+    'bench_green',
+    'bench_logs',
+    'bench_streaming',
+    'bench_parallel',
+    'bench_dag',
+]
+
+
+def get_modules(names=None):
+    if not names:
+        names = MODULES
+    return [importlib.import_module('.%s' % name, __package__) for name in names]
+
+
+def get_module_args(module, args):
+    """
+    Parse the module's default args, overriding the common ones with the values passed.
+    """
+    parser = get_arg_parser(module.__doc__, n=module.DEFAULT_N)
+    if hasattr(module, 'add_arguments'):
+        module.add_arguments(parser)
+    module_args = parser.parse_args([])
+    if args.n is not None:
+        module_args.n = args.n
+    return module_args
+
+
+def compare(sections, baseline, stream=None):
+    """
+    Report the results side-by-side with the results in a baseline JSON file (as written using
+    ``--json``), including the ratio between them.
+    """
+    if stream is None:
+        stream = sys.stdout
+    baseline_results = {b['benchmark']: b['results'] for b in baseline['benchmarks']}
+    for section in sections:
+        stream.write('# %s (%s)\n' % (section.name, section.unit))
+        base = baseline_results.get(section.name, {})
+        width = max(len(label) for label, _ in section.results)
+        for label, value in section.results:
+            base_value = base.get(label)
+            if base_value is None:
+                stream.write('%-*s %14.1f %14s\n' % (width, label, value, '-'))
+            else:
+                ratio = value / base_value if base_value else float('nan')
+                stream.write('%-*s %14.1f %14.1f %8.2fx\n' % (
+                    width, label, value, base_value, ratio))
+
+
+def main(argv=None):
+    parser = get_arg_parser(__doc__, n=None)
+    parser.add_argument('-o', '--output', help='also write the JSON results to this file')
+    parser.add_argument('--compare', metavar='BASELINE_JSON',
+                        help='compare the results to a previous JSON output')
+    parser.add_argument('modules', nargs='*', help='benchmark modules to run (default: all)')
+    args = parse_args(parser, argv)
+
+    sections = []
+    for module in get_modules(args.modules):
+        sys.stderr.write('running %s...\n' % module.__name__)
+        sections.extend(module.run(get_module_args(module, args)))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(to_json_obj(sections), f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(sections, json.load(f))
+    else:
+        report(sections, as_json=args.json)
+
+
+if __name__ == '__main__':
+    main()
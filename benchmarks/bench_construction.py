@@ -0,0 +1,68 @@
+"""
+Benchmark: the cost of constructing (not starting) many threads and tasks -- time and memory
+per object, compared to a ``threading.Thread`` baseline.
+
+To compare with an older version, run with ``--json -o results.json`` on each version, and use
+``--compare``.
+"""
+
+import gc
+import time
+import threading
+import tracemalloc
+
+from merethread.samples import NoopThread, NoopTaskThread, NoopPoolTask, NoopGreenTask
+
+from .common import Section, main
+
+
+################################################################################
+
+def measure_construction(factory, n):
+    """
+    :return: the average construction time (in microseconds) and memory (in bytes, of traced
+        allocations) per object.
+    """
+    gc.collect()
+    t0 = time.perf_counter()
+    objs = [factory() for _ in range(n)]
+    elapsed = time.perf_counter() - t0
+    del objs
+    gc.collect()
+    # measuring memory separately, because tracing slows down allocations
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        objs = [factory() for _ in range(n)]
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del objs
+    return elapsed / n * 1e6, (after - before) / n
+
+
+DEFAULT_N = 10000
+
+
+def run(args):
+    factories = [
+        ('threading.Thread (baseline)', threading.Thread),
+        ('Thread', NoopThread),
+        ('TaskThread', NoopTaskThread),
+        ('PoolTask', NoopPoolTask),
+        ('GreenTask', NoopGreenTask),
+    ]
+    results = [(label, measure_construction(factory, args.n)) for label, factory in factories]
+    return [
+        Section('construction: time', 'usec', [
+            (label, t) for label, (t, _) in results
+        ]),
+        Section('construction: memory', 'bytes', [
+            (label, m) for label, (_, m) in results
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
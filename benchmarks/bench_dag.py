@@ -0,0 +1,115 @@
+"""
+Benchmark: running a layered DAG of tasks (each node depending on all the nodes of the previous
+layer) with ``TaskThread``s which ``join()`` their upstream threads vs. a ``TaskGraph`` -- the
+wall-clock time, and the peak number of live threads.
+"""
+
+import threading
+import time
+
+from merethread import TaskThread
+from merethread.dag import TaskGraph
+
+from .common import Section, main
+
+
+################################################################################
+
+class _PeakThreads:
+
+    def __init__(self):
+        self.peak = 0
+
+    def sample(self):
+        self.peak = max(self.peak, threading.active_count())
+
+
+class _JoiningTaskThread(TaskThread):
+    """ Waits for its upstream threads using join(), and then does its work """
+
+    def __init__(self, upstream, work_time, peak, **kwargs):
+        super().__init__(**kwargs)
+        self.upstream = upstream
+        self.work_time = work_time
+        self.peak = peak
+
+    def _main(self):
+        for t in self.upstream:
+            t.join()
+        self.peak.sample()
+        self._sleep(self.work_time)
+
+
+class _WorkTaskThread(TaskThread):
+
+    def __init__(self, work_time, peak, **kwargs):
+        super().__init__(**kwargs)
+        self.work_time = work_time
+        self.peak = peak
+
+    def _main(self):
+        self.peak.sample()
+        self._sleep(self.work_time)
+
+
+def run_joining(layers, width, work_time):
+    peak = _PeakThreads()
+    upstream = []
+    threads = []
+    for _ in range(layers):
+        upstream = [_JoiningTaskThread(upstream, work_time, peak) for _ in range(width)]
+        threads.extend(upstream)
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0, peak.peak
+
+
+def run_graph(layers, width, work_time):
+    peak = _PeakThreads()
+    graph = TaskGraph()
+    deps = []
+    for layer in range(layers):
+        names = ['%d-%d' % (layer, i) for i in range(width)]
+        for name in names:
+            graph.add(name, lambda *args: _WorkTaskThread(work_time, peak), deps=deps)
+        deps = names
+    t0 = time.perf_counter()
+    graph.run()
+    return time.perf_counter() - t0, peak.peak
+
+
+################################################################################
+
+DEFAULT_N = 20
+
+
+def add_arguments(parser):
+    parser.add_argument('--layers', type=int, default=5,
+                        help='number of layers of the DAG (n is the number of nodes per layer)')
+    parser.add_argument('--work-time', type=float, default=0.02,
+                        help='number of seconds each task works')
+
+
+def run(args):
+    shape = (args.layers, args.n, args.work_time)
+    results = [
+        ('TaskThreads joining upstream', run_joining(*shape)),
+        ('TaskGraph', run_graph(*shape)),
+    ]
+    title = 'dag: %d layers x %d nodes' % (args.layers, args.n)
+    return [
+        Section('%s: wall-clock time' % title, 'msec', [
+            (label, elapsed * 1e3) for label, (elapsed, _) in results
+        ]),
+        Section('%s: peak live threads' % title, 'threads', [
+            (label, peak) for label, (_, peak) in results
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
@@ -0,0 +1,93 @@
+"""
+Benchmark: the ``DeadlineScheduler`` with many pending deadlines (e.g. many concurrent
+expiring tasks): the cost of adding and removing a deadline, and how late deadlines are fired.
+"""
+
+import time
+import heapq
+import statistics
+
+from merethread.deadlines import DeadlineScheduler
+from merethread.misc import monotonic_ns
+
+from .common import Section, main
+
+
+################################################################################
+
+def _noop():
+    pass
+
+
+def measure_add_remove(n):
+    scheduler = DeadlineScheduler()  # not started: deadlines are only added and removed
+    base = monotonic_ns() + int(3600e9)
+    deadlines = [base + i * 1000 for i in range(n)]
+
+    t0 = time.perf_counter()
+    heap = []
+    for d in deadlines:
+        heapq.heappush(heap, (d, id(d)))
+    heap_cost = (time.perf_counter() - t0) / n * 1e6
+
+    t0 = time.perf_counter()
+    handles = [scheduler.add(d, _noop) for d in deadlines]
+    add_cost = (time.perf_counter() - t0) / n * 1e6
+
+    t0 = time.perf_counter()
+    for handle in handles:
+        scheduler.remove(handle)
+    remove_cost = (time.perf_counter() - t0) / n * 1e6
+
+    return [
+        ('heapq.heappush (baseline)', heap_cost),
+        ('add', add_cost),
+        ('remove', remove_cost),
+    ]
+
+
+def measure_lateness(n, spread):
+    scheduler = DeadlineScheduler()
+    scheduler.start()
+    try:
+        lateness = []
+
+        def fired(deadline_ns):
+            return lambda: lateness.append(monotonic_ns() - deadline_ns)
+
+        start = monotonic_ns() + int(0.1e9)
+        for i in range(n):
+            deadline_ns = start + int(spread * 1e9) * i // n
+            scheduler.add(deadline_ns, fired(deadline_ns))
+        while len(lateness) < n:
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+        scheduler.join()
+    return [
+        ('median lateness (resolution=%s)' % scheduler.resolution,
+            statistics.median(lateness) / 1e6),
+        ('max lateness', max(lateness) / 1e6),
+    ]
+
+
+DEFAULT_N = 50000
+
+
+def add_arguments(parser):
+    parser.add_argument('-s', '--spread', type=float, default=1.,
+                        help='number of seconds over which the fired deadlines are spread')
+
+
+def run(args):
+    return [
+        Section('deadlines: add/remove (%d pending)' % args.n, 'usec',
+                measure_add_remove(args.n)),
+        Section('deadlines: firing (%d over %s sec)' % (args.n, args.spread), 'msec',
+                measure_lateness(args.n, args.spread)),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
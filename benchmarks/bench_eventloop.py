@@ -0,0 +1,85 @@
+"""
+Benchmark: ``EventLoopThread`` throughput (events per second), handling events one at a time vs.
+in batches, and with metrics enabled.
+"""
+
+from merethread import EventLoopThread
+from merethread.daemon import BatchEventLoopThread
+from merethread.metrics import MetricsRegistry
+
+from .common import Section, measure_batch_rate, main
+
+
+################################################################################
+
+class _IterEventLoopThread(EventLoopThread):
+    """ Handles ``n`` events, then stops """
+
+    def __init__(self, *, n, **kwargs):
+        super().__init__(**kwargs)
+        self.events = iter(range(1, n + 1))
+        self.total = 0
+
+    def _read_next_event(self):
+        event = next(self.events, None)
+        if event is None:
+            self.stop()
+        return event
+
+    def _handle_event(self, event):
+        self.total += event
+
+
+class _IterBatchEventLoopThread(BatchEventLoopThread, _IterEventLoopThread):
+    """ Same, but using the default (per-event) batch handler """
+    pass
+
+
+class _IterBulkEventLoopThread(_IterBatchEventLoopThread):
+    """ Same, but reading and handling batches in bulk """
+
+    def _read_next_events(self, max_n, max_wait):
+        batch = [e for _, e in zip(range(max_n), self.events)]
+        if not batch:
+            self.stop()
+        return batch
+
+    def _handle_events(self, batch):
+        self.total += sum(batch)
+
+
+def run_thread(tcls, **kwargs):
+    def run(n):
+        t = tcls(n=n, **kwargs)
+        t.start()
+        t.join()
+        assert t.total == n * (n + 1) // 2, t.total
+    return run
+
+
+DEFAULT_N = 200000
+
+
+def add_arguments(parser):
+    parser.add_argument('-b', '--batch-size', type=int, default=100)
+
+
+def run(args):
+    n, batch_size = args.n, args.batch_size
+    benchmarks = [
+        ('EventLoopThread', run_thread(_IterEventLoopThread)),
+        ('EventLoopThread (metrics enabled)',
+            run_thread(_IterEventLoopThread, metrics=MetricsRegistry())),
+        ('BatchEventLoopThread (per-event handler)',
+            run_thread(_IterBatchEventLoopThread, batch_size=batch_size)),
+        ('BatchEventLoopThread (bulk handler)',
+            run_thread(_IterBulkEventLoopThread, batch_size=batch_size)),
+    ]
+    return [Section('eventloop', 'events/sec', [
+        (label, measure_batch_rate(func, n)) for label, func in benchmarks
+    ])]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
@@ -0,0 +1,55 @@
+"""
+Benchmark: ``ThreadFuture`` callback dispatch overhead (adding a callback, and dispatching it
+when the future is set), compared to a plain ``concurrent.futures.Future``.
+"""
+
+from concurrent.futures import Future
+
+from merethread.thread import ThreadFuture
+
+from .common import Section, measure_cost, main
+
+
+################################################################################
+
+def _noop_cb(*args):
+    pass
+
+
+def dispatch(factory, add, num_callbacks):
+    def run():
+        fut = factory()
+        for _ in range(num_callbacks):
+            add(fut, _noop_cb)
+        fut.set_result(None)
+    return run
+
+
+DEFAULT_N = 20000
+
+
+def add_arguments(parser):
+    parser.add_argument('-c', '--callbacks', type=int, default=10,
+                        help='number of callbacks per future')
+
+
+def run(args):
+    n, k = args.n, args.callbacks
+    benchmarks = [
+        ('Future.add_done_callback (baseline)',
+            dispatch(Future, Future.add_done_callback, k)),
+        ('ThreadFuture.add_done_callback',
+            dispatch(lambda: ThreadFuture(None), ThreadFuture.add_done_callback, k)),
+        ('ThreadFuture.add_callback',
+            dispatch(lambda: ThreadFuture(None), ThreadFuture.add_callback, k)),
+        ('ThreadFuture.add_errback',
+            dispatch(lambda: ThreadFuture(None), ThreadFuture.add_errback, k)),
+    ]
+    return [Section('futures: callback add+dispatch (per callback)', 'usec', [
+        (label, measure_cost(func, n) / k) for label, func in benchmarks
+    ])]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
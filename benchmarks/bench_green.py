@@ -0,0 +1,87 @@
+"""
+Benchmark: running many mostly-sleeping tasks as green tasks (on a single
+``GreenTaskScheduler``) vs. as ``TaskThread``s: the time to run them all, and the memory per
+pending green task.
+"""
+
+import time
+import tracemalloc
+
+from merethread.green import GreenTaskScheduler
+from merethread.samples import IdleTaskThread, IdleGreenTask
+
+from .common import Section, main
+
+
+################################################################################
+
+def run_threads(n, period):
+    tasks = [IdleTaskThread(period=period) for _ in range(n)]
+    for t in tasks:
+        t.start()
+    for t in tasks:
+        t.join()
+
+
+def run_green(n, period):
+    scheduler = GreenTaskScheduler()
+    scheduler.start()
+    try:
+        futures = [scheduler.submit_task(IdleGreenTask(period=period)) for _ in range(n)]
+        for fut in futures:
+            fut.result()
+    finally:
+        scheduler.stop()
+        scheduler.join()
+
+
+def measure_green_memory(n):
+    """ :return: the memory allocated per pending (sleeping) green task, in KB """
+    scheduler = GreenTaskScheduler()
+    scheduler.start()
+    try:
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        tasks = [IdleGreenTask(period=3600) for _ in range(n)]
+        for t in tasks:
+            scheduler.submit_task(t)
+        while not all(t.is_started() for t in tasks):
+            time.sleep(0.01)
+        after, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return (after - before) / n / 1024
+    finally:
+        scheduler.stop()
+        scheduler.join()
+
+
+def measure_elapsed(func, *args):
+    t0 = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - t0
+
+
+DEFAULT_N = 2000
+
+
+def add_arguments(parser):
+    parser.add_argument('-p', '--period', type=float, default=0.5,
+                        help='number of seconds each task sleeps')
+
+
+def run(args):
+    n, period = args.n, args.period
+    return [
+        Section('green: %d tasks sleeping %s sec' % (n, period), 'sec (total)', [
+            ('TaskThread', measure_elapsed(run_threads, n, period)),
+            ('GreenTask', measure_elapsed(run_green, n, period)),
+        ]),
+        Section('green: memory', 'KB/task', [
+            ('GreenTask (pending, traced allocations)', measure_green_memory(n)),
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
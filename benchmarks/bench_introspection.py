@@ -0,0 +1,67 @@
+"""
+Benchmark: the cost of introspecting threads (``status()`` and ``get_current_stacktrace()``)
+while many threads are alive, of dumping all their stacks at once (``dump_stacks``), and of
+checking them for stalls (``StallWatchdog``).
+"""
+
+import threading
+
+from merethread.registry import get_threads, dump_stacks
+from merethread.watchdog import StallWatchdog
+from merethread.samples import IdleDaemonThread
+
+from .common import Section, measure_cost, main
+
+
+################################################################################
+
+def status_all(threads):
+    def run():
+        for t in threads:
+            t.status()
+    return run
+
+
+def stacktrace_all(threads):
+    def run():
+        for t in threads:
+            t.get_current_stacktrace()
+    return run
+
+
+DEFAULT_N = 1000
+
+
+def add_arguments(parser):
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='number of times to introspect all threads')
+
+
+def run(args):
+    # the watchdog is not started: its checks are run by the benchmark
+    watchdog = StallWatchdog()
+    threads = [IdleDaemonThread(stall_timeout=3600, watchdog=watchdog) for _ in range(args.n)]
+    for t in threads:
+        t.start()
+    try:
+        benchmarks = [
+            ('threading.enumerate (baseline, all threads)', threading.enumerate),
+            ('status (all threads)', status_all(threads)),
+            ('get_current_stacktrace (all threads)', stacktrace_all(threads)),
+            ('registry.get_threads (by class)', lambda: get_threads(cls=IdleDaemonThread)),
+            ('registry.dump_stacks (all threads, grouped)', lambda: dump_stacks(threads)),
+            ('StallWatchdog.check (all threads)', watchdog.check),
+        ]
+        return [Section('introspection: %d live threads' % args.n, 'msec', [
+            (label, measure_cost(func, args.repeat, scale=1e3)) for label, func in benchmarks
+        ])]
+    finally:
+        for t in threads:
+            t.stop()
+        for t in threads:
+            t.join()
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
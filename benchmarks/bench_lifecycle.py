@@ -0,0 +1,154 @@
+"""
+Benchmark: thread life-cycle costs -- create/start/join latency, and stop latency (time from
+``stop()``/``cancel()`` until ``join()`` returns), compared to ``threading.Thread`` and
+``ThreadPoolExecutor`` baselines.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from merethread import FunctionThread, QueueEventLoopThread
+from merethread.samples import (
+    NoopThread, NoopTaskThread, IdleTaskThread, IdleDaemonThread, SlowStoppingDaemonThread,
+    _noop_func)
+from merethread.utils import stop_threads
+
+from .common import Section, measure_cost, measure_median_latency, main
+
+
+################################################################################
+# create/start/join
+
+def start_join(factory):
+    def run():
+        t = factory()
+        t.start()
+        t.join()
+    return run
+
+
+def start_stop_join(factory):
+    def run():
+        t = factory()
+        t.start()
+        t.stop()
+        t.join()
+    return run
+
+
+def executor_submit(executor):
+    return lambda: executor.submit(_noop_func).result()
+
+
+################################################################################
+# stop latency
+
+def stop_latency(factory, stop):
+    def run():
+        t = factory()
+        t.start()
+        time.sleep(0.001)  # let the thread start waiting
+        t0 = time.perf_counter()
+        stop(t)
+        t.join()
+        return time.perf_counter() - t0
+    return run
+
+
+def _event_thread():
+    event = threading.Event()
+    t = threading.Thread(target=event.wait)
+    t.event = event
+    return t
+
+
+################################################################################
+# stopping many threads
+
+def stop_many(num_threads, stop_delay, stop):
+    threads = [SlowStoppingDaemonThread(stop_delay=stop_delay) for _ in range(num_threads)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)  # let the threads start
+    t0 = time.perf_counter()
+    stop(threads)
+    return time.perf_counter() - t0
+
+
+def _stop_and_join_each(threads):
+    for t in threads:
+        t.stop()
+        t.join()
+
+
+def _stop_all(threads):
+    stop_threads(threads)
+
+
+################################################################################
+
+DEFAULT_N = 2000
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency-n', type=int, default=200,
+                        help='number of samples for latency measurements')
+    parser.add_argument('--stop-threads', type=int, default=300,
+                        help='number of threads to stop, when stopping many threads')
+    parser.add_argument('--stop-delay', type=float, default=0.005,
+                        help='number of seconds each thread takes to stop, when stopping many '
+                        'threads')
+
+
+def run(args):
+    n = args.n
+    num_stopped, stop_delay = args.stop_threads, args.stop_delay
+
+    with ThreadPoolExecutor(1) as executor:
+        executor_cost = measure_cost(executor_submit(executor), n)
+
+    lifecycle = [
+        ('threading.Thread (baseline)', start_join(lambda: threading.Thread(target=_noop_func))),
+        ('Thread', start_join(NoopThread)),
+        ('TaskThread', start_join(NoopTaskThread)),
+        ('FunctionThread', start_join(lambda: FunctionThread(_noop_func))),
+        ('DaemonThread', start_stop_join(IdleDaemonThread)),
+    ]
+    creation = [
+        ('threading.Thread (baseline)', lambda: threading.Thread(target=_noop_func)),
+        ('Thread', NoopThread),
+        ('TaskThread', NoopTaskThread),
+        ('FunctionThread', lambda: FunctionThread(_noop_func)),
+        ('DaemonThread', IdleDaemonThread),
+    ]
+    stopping = [
+        ('threading.Thread + Event (baseline)',
+            stop_latency(_event_thread, lambda t: t.event.set())),
+        ('TaskThread.cancel', stop_latency(IdleTaskThread, lambda t: t.cancel())),
+        ('DaemonThread.stop', stop_latency(IdleDaemonThread, lambda t: t.stop())),
+        ('QueueEventLoopThread.stop', stop_latency(QueueEventLoopThread, lambda t: t.stop())),
+    ]
+
+    return [
+        Section('lifecycle: create', 'usec', [
+            (label, measure_cost(func, n)) for label, func in creation
+        ]),
+        Section('lifecycle: create/start/join', 'usec', [
+            (label, measure_cost(func, n)) for label, func in lifecycle
+        ] + [
+            ('ThreadPoolExecutor.submit (baseline)', executor_cost),
+        ]),
+        Section('lifecycle: stop latency (median)', 'usec', [
+            (label, measure_median_latency(func, args.latency_n)) for label, func in stopping
+        ]),
+        Section('lifecycle: stop %d threads' % num_stopped, 'sec', [
+            ('stop and join one by one', stop_many(num_stopped, stop_delay, _stop_and_join_each)),
+            ('stop_threads', stop_many(num_stopped, stop_delay, _stop_all)),
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
@@ -0,0 +1,102 @@
+"""
+Benchmark: logging costs -- creating threads (and their loggers) per ``logger_mode``, and the
+latency of a log call on the logging thread, with the handler called synchronously vs. through
+a ``LogWriterThread``.
+"""
+
+import os
+import time
+import logging
+
+from merethread.logs import LogWriterThread
+from merethread.samples import NoopTaskThread
+
+from .common import Section, measure_cost, main
+
+
+################################################################################
+
+def create_and_log(logger_mode):
+    def run():
+        t = NoopTaskThread(logger_mode=logger_mode)
+        t.logger.debug('created')
+    return run
+
+
+def count_new_loggers(func, n):
+    before = len(logging.Logger.manager.loggerDict)
+    for _ in range(n):
+        func()
+    return len(logging.Logger.manager.loggerDict) - before
+
+
+class _SlowHandler(logging.FileHandler):
+    """ A handler with slow (blocking) I/O """
+
+    def __init__(self, io_delay):
+        super().__init__(os.devnull)
+        self.io_delay = io_delay
+
+    def emit(self, record):
+        super().emit(record)
+        time.sleep(self.io_delay)
+
+
+def measure_log_call(n, writer=False, io_delay=None):
+    """ :return: the average cost of a log call, in microseconds """
+    logger = logging.getLogger('merethread.benchmarks.bench_logs')
+    logger.propagate = False
+    if io_delay is None:
+        handler = logging.FileHandler(os.devnull)
+    else:
+        handler = _SlowHandler(io_delay)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    logger.addHandler(handler)
+    try:
+        if writer:
+            writer = LogWriterThread(capacity=n, drop_policy='block').install(logger)
+        # (logging at WARNING, because benchmarks disable INFO logging by default)
+        cost = measure_cost(lambda: logger.warning('value: %s', 12345), n)
+        if writer:
+            writer.uninstall()
+        return cost
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+
+################################################################################
+
+DEFAULT_N = 2000
+
+
+def add_arguments(parser):
+    parser.add_argument('--io-delay', type=float, default=0.0001,
+                        help='number of seconds each write of the slow handler blocks')
+
+
+def run(args):
+    n, io_delay = args.n, args.io_delay
+    creation = [
+        ("logger_mode='name'", create_and_log('name')),
+        ("logger_mode='class'", create_and_log('class')),
+    ]
+    return [
+        Section('logs: create thread and log', 'usec', [
+            (label, measure_cost(func, n)) for label, func in creation
+        ]),
+        Section('logs: loggers created', 'loggers', [
+            (label, count_new_loggers(func, n)) for label, func in creation
+        ]),
+        Section('logs: log call on the calling thread', 'usec', [
+            ('handler called synchronously', measure_log_call(n)),
+            ('LogWriterThread', measure_log_call(n, writer=True)),
+            ('slow I/O, handler called synchronously', measure_log_call(n, io_delay=io_delay)),
+            ('slow I/O, LogWriterThread', measure_log_call(n, writer=True, io_delay=io_delay)),
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
@@ -0,0 +1,71 @@
+"""
+Benchmark: mapping a function over many small items -- a ``FunctionThread`` per item vs.
+``TaskPoolExecutor.map`` (a task per item) vs. ``parallel_map``, with a task per item and with
+automatic chunking.
+"""
+
+from merethread import FunctionThread, TaskPoolExecutor
+from merethread.parallel import parallel_map, imap_unordered
+
+from .common import Section, measure_batch_rate, main
+
+
+################################################################################
+
+def work(x):
+    return sum(range(x % 100))
+
+
+def map_function_threads(n):
+    threads = [FunctionThread(work, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return [t.future.result() for t in threads]
+
+
+def map_executor(n, max_workers):
+    executor = TaskPoolExecutor(max_workers)
+    try:
+        return list(executor.map(work, range(n)))
+    finally:
+        executor.shutdown()
+
+
+def map_parallel(n, max_workers, **kwargs):
+    return list(parallel_map(work, range(n), max_workers=max_workers, **kwargs))
+
+
+def map_unordered(n, max_workers):
+    return list(imap_unordered(work, range(n), max_workers=max_workers))
+
+
+################################################################################
+
+DEFAULT_N = 10000
+
+
+def add_arguments(parser):
+    parser.add_argument('--max-workers', type=int, default=4,
+                        help='number of worker threads')
+
+
+def run(args):
+    n, max_workers = args.n, args.max_workers
+    return [
+        Section('parallel: map %d small items' % n, 'items/sec', [
+            ('FunctionThread per item', measure_batch_rate(map_function_threads, n)),
+            ('TaskPoolExecutor.map',
+                measure_batch_rate(lambda n: map_executor(n, max_workers), n)),
+            ('parallel_map, chunk_size=1',
+                measure_batch_rate(lambda n: map_parallel(n, max_workers, chunk_size=1), n)),
+            ('parallel_map, automatic chunking',
+                measure_batch_rate(lambda n: map_parallel(n, max_workers), n)),
+            ('imap_unordered, automatic chunking',
+                measure_batch_rate(lambda n: map_unordered(n, max_workers), n)),
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
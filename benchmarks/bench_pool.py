@@ -0,0 +1,75 @@
+"""
+Benchmark: tasks per second, running short tasks using a thread per task vs. using a
+``TaskPoolExecutor``.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from merethread import FunctionThread
+from merethread.pool import TaskPoolExecutor
+from merethread.samples import NoopTaskThread, NoopPoolTask, _noop_func
+
+from .common import Section, measure_batch_rate, main
+
+
+################################################################################
+
+def thread_per_task(thread_factory):
+    def run(n):
+        for _ in range(n):
+            t = thread_factory()
+            t.start()
+            t.join()
+    return run
+
+
+def thread_per_task_concurrent(thread_factory, concurrency):
+    def run(n):
+        threads = []
+        for _ in range(n):
+            t = thread_factory()
+            t.start()
+            threads.append(t)
+            if len(threads) >= concurrency:
+                threads.pop(0).join()
+        for t in threads:
+            t.join()
+    return run
+
+
+def pooled(executor_factory, submit):
+    def run(n):
+        with executor_factory() as executor:
+            wait([submit(executor) for _ in range(n)])
+    return run
+
+
+DEFAULT_N = 5000
+
+
+def add_arguments(parser):
+    parser.add_argument('-w', '--workers', type=int, default=8, help='number of pool workers')
+
+
+def run(args):
+    n, workers = args.n, args.workers
+    benchmarks = [
+        ('FunctionThread per task', thread_per_task(lambda: FunctionThread(_noop_func))),
+        ('TaskThread per task', thread_per_task(NoopTaskThread)),
+        ('TaskThread per task (%d concurrent)' % workers,
+            thread_per_task_concurrent(NoopTaskThread, workers)),
+        ('ThreadPoolExecutor.submit', pooled(
+            lambda: ThreadPoolExecutor(workers), lambda ex: ex.submit(_noop_func))),
+        ('TaskPoolExecutor.submit', pooled(
+            lambda: TaskPoolExecutor(workers), lambda ex: ex.submit(_noop_func))),
+        ('TaskPoolExecutor.submit_task', pooled(
+            lambda: TaskPoolExecutor(workers), lambda ex: ex.submit_task(NoopPoolTask()))),
+    ]
+    return [Section('pool', 'tasks/sec', [
+        (label, measure_batch_rate(func, n)) for label, func in benchmarks
+    ])]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
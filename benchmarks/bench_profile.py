@@ -0,0 +1,45 @@
+"""
+Benchmark: the overhead of running a thread with profiling enabled, on a CPU-bound task:
+deterministic (``profile=True``) vs. sampling (``profile='sampling'``).
+"""
+
+import time
+
+from merethread.samples import SlowTaskThread
+
+from .common import Section, main
+
+
+################################################################################
+
+def run_task(n, **kwargs):
+    t = SlowTaskThread(min=n, **kwargs)
+    t0 = time.perf_counter()
+    t.start()
+    t.join()
+    return time.perf_counter() - t0
+
+
+DEFAULT_N = 300000
+
+
+def run(args):
+    plain = run_task(args.n)
+    profiled = run_task(args.n, profile=True)
+    sampled = run_task(args.n, profile='sampling')
+    return [
+        Section('profile: SlowTaskThread runtime', 'sec', [
+            ('profile=False', plain),
+            ('profile=True', profiled),
+            ("profile='sampling'", sampled),
+        ]),
+        Section('profile: overhead', 'ratio', [
+            ('profile=True', profiled / plain),
+            ("profile='sampling'", sampled / plain),
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
@@ -0,0 +1,270 @@
+"""
+Benchmark: ``QueueEventLoopThread`` queue backends -- throughput (events per second), wake-up
+latency (put on an empty queue until handled) and stop latency (``stop()`` until ``join()``
+returns).  Also, overload: a producer outpacing a slow consumer, with an unbounded queue vs.
+bounded queues with the various overflow policies, and the latency of a control event put
+behind a backlog of data events, with a FIFO queue vs. a ``PriorityEventLoopThread``, and
+handling a burst of "latest value wins" events, with a FIFO queue vs. a
+``CoalescingEventLoopThread``.
+"""
+
+import time
+import queue
+import threading
+import statistics
+
+from merethread import QueueEventLoopThread, PriorityEventLoopThread, CoalescingEventLoopThread
+from merethread.queues import (
+    SimpleEventQueue, DequeEventQueue, RingBufferEventQueue, BoundedEventQueue,
+    PriorityEventQueue, CoalescingEventQueue)
+
+from .common import Section, main
+
+
+################################################################################
+
+QUEUE_TYPES = [
+    SimpleEventQueue, DequeEventQueue, RingBufferEventQueue, BoundedEventQueue,
+    PriorityEventQueue, CoalescingEventQueue]
+
+
+class _CountingThread(QueueEventLoopThread):
+
+    def __init__(self, n, **kwargs):
+        super().__init__(**kwargs)
+        self.n = n
+        self.count = 0
+        self.done = threading.Event()
+
+    def _handle_event(self, event):
+        self.count += 1
+        if self.count == self.n:
+            self.done.set()
+
+
+class _TimestampThread(QueueEventLoopThread):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = None
+        self.handled = threading.Event()
+
+    def _handle_event(self, put_time):
+        self.latency = time.perf_counter() - put_time
+        self.handled.set()
+
+
+def throughput(qcls, n):
+    t = _CountingThread(n, queue=qcls())
+    t.start()
+    t0 = time.perf_counter()
+    for i in range(n):
+        t.put(i)
+    t.done.wait()
+    elapsed = time.perf_counter() - t0
+    t.stop()
+    t.join()
+    return n / elapsed
+
+
+def wakeup_latency(qcls, n):
+    t = _TimestampThread(queue=qcls())
+    t.start()
+    latencies = []
+    for _ in range(n):
+        time.sleep(0.001)  # let the consumer block on the empty queue
+        t.handled.clear()
+        t.put(time.perf_counter())
+        t.handled.wait()
+        latencies.append(t.latency)
+    t.stop()
+    t.join()
+    return statistics.median(latencies) * 1e6
+
+
+def stop_latency(qcls, n):
+    latencies = []
+    for _ in range(n):
+        t = QueueEventLoopThread(queue=qcls())
+        t.start()
+        time.sleep(0.001)  # let the consumer block on the empty queue
+        t0 = time.perf_counter()
+        t.stop()
+        t.join()
+        latencies.append(time.perf_counter() - t0)
+    return statistics.median(latencies) * 1e6
+
+
+class _SlowThread(QueueEventLoopThread):
+
+    def _handle_event(self, event):
+        time.sleep(0.0001)
+
+
+def overload(n, **kwargs):
+    """
+    :return: the max queue depth, and the number of events dropped (or rejected).
+    """
+    t = _SlowThread(**kwargs)
+    t.start()
+    max_depth = 0
+    lost = 0
+    for i in range(n):
+        try:
+            t.put(i, timeout=0.01)
+        except queue.Full:
+            lost += 1
+        max_depth = max(max_depth, t.qsize())
+    stats = getattr(t.queue, 'stats', None)
+    if stats is not None:
+        lost += stats.dropped
+    t.stop()
+    t.join()
+    return max_depth, lost
+
+
+class _ControlThread(_SlowThread):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = None
+        self.handled = threading.Event()
+
+    def _handle_event(self, event):
+        if isinstance(event, tuple):
+            self.latency = time.perf_counter() - event[1]
+            self.handled.set()
+        else:
+            super()._handle_event(event)
+
+
+class _PriorityControlThread(_ControlThread, PriorityEventLoopThread):
+    pass
+
+
+def control_latency(backlog, priority=False):
+    """ :return: the number of msecs until a control event put behind a backlog is handled """
+    if priority:
+        t = _PriorityControlThread(num_priorities=2)
+
+        def put_control():
+            t.put(('control', time.perf_counter()), priority=0)
+    else:
+        t = _ControlThread()
+
+        def put_control():
+            t.put(('control', time.perf_counter()))
+    t.start()
+    for i in range(backlog):
+        t.put(i)
+    put_control()
+    t.handled.wait()
+    t.stop()
+    t.join()
+    return t.latency * 1e3
+
+
+class _BurstThread(_SlowThread):
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.count = 0
+        self.done = threading.Event()
+
+    def _handle_event(self, event):
+        if event[0] is None:
+            self.done.set()
+        else:
+            self.count += 1
+            super()._handle_event(event)
+
+
+class _CoalescingBurstThread(_BurstThread, CoalescingEventLoopThread):
+
+    def _get_event_key(self, event):
+        return event[0]
+
+
+def burst(n, num_keys, coalescing=False):
+    """
+    :return: the number of events handled, and the number of msecs it took to handle a burst
+        of ``n`` (key, value) events over ``num_keys`` keys.
+    """
+    t = _CoalescingBurstThread() if coalescing else _BurstThread()
+    t.start()
+    t0 = time.perf_counter()
+    for i in range(n):
+        t.put((i % num_keys, i))
+    t.put((None, None))
+    t.done.wait()
+    elapsed = time.perf_counter() - t0
+    t.stop()
+    t.join()
+    return t.count, elapsed * 1e3
+
+
+OVERLOAD_CASES = [
+    ('unbounded', {}),
+    ('block', dict(capacity=1000, overflow_policy='block')),
+    ('drop', dict(capacity=1000, overflow_policy='drop')),
+    ('drop_oldest', dict(capacity=1000, overflow_policy='drop_oldest')),
+    ('raise', dict(capacity=1000, overflow_policy='raise')),
+]
+
+
+DEFAULT_N = 200000
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency-n', type=int, default=200,
+                        help='number of samples for latency measurements')
+    parser.add_argument('--overload-n', type=int, default=20000,
+                        help='number of events to put, for overload measurements')
+    parser.add_argument('--backlog', type=int, default=2000,
+                        help='number of data events queued ahead of a control event')
+    parser.add_argument('--burst-n', type=int, default=5000,
+                        help='number of events in a burst, for coalescing measurements')
+    parser.add_argument('--burst-keys', type=int, default=100,
+                        help='number of distinct keys in a burst')
+
+
+def run(args):
+    overloads = [
+        (label, overload(args.overload_n, **kwargs)) for label, kwargs in OVERLOAD_CASES]
+    bursts = [
+        (label, burst(args.burst_n, args.burst_keys, coalescing))
+        for label, coalescing in [('FIFO', False), ('CoalescingEventLoopThread', True)]]
+    return [
+        Section('queues throughput', 'events/sec', [
+            (qcls.__name__, throughput(qcls, args.n)) for qcls in QUEUE_TYPES
+        ]),
+        Section('queues wake-up latency (median)', 'usec', [
+            (qcls.__name__, wakeup_latency(qcls, args.latency_n)) for qcls in QUEUE_TYPES
+        ]),
+        Section('queues stop latency (median)', 'usec', [
+            (qcls.__name__, stop_latency(qcls, args.latency_n)) for qcls in QUEUE_TYPES
+        ]),
+        Section('queues overload: max depth', 'events', [
+            (label, max_depth) for label, (max_depth, _) in overloads
+        ]),
+        Section('queues overload: dropped or rejected', 'events', [
+            (label, lost) for label, (_, lost) in overloads
+        ]),
+        Section('queues control event latency, behind %d events' % args.backlog, 'msec', [
+            ('FIFO', control_latency(args.backlog)),
+            ('PriorityEventLoopThread', control_latency(args.backlog, priority=True)),
+        ]),
+        Section('queues burst of %d events over %d keys: events handled' % (
+            args.burst_n, args.burst_keys), 'events', [
+            (label, count) for label, (count, _) in bursts
+        ]),
+        Section('queues burst of %d events over %d keys: time to handle' % (
+            args.burst_n, args.burst_keys), 'msec', [
+            (label, elapsed) for label, (_, elapsed) in bursts
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
@@ -0,0 +1,53 @@
+"""
+Benchmark: cost of a single stop-check (``_stop_if_requested``), in the common "not stopped"
+case.
+
+"before" is the previous implementation of ``_stop_if_requested``, i.e. ``_sleep(0)``.
+"""
+
+from merethread.samples import IdleTaskThread, IdleTimeoutTaskThread
+
+from .common import Section, measure_cost, main
+
+
+################################################################################
+
+def _sleep0(t):
+    return lambda: t._sleep(0)
+
+
+def started_expiring(**kwargs):
+    t = IdleTimeoutTaskThread(expiry=3600, **kwargs)
+    t._on_enter()  # sets the expiry, without starting the thread
+    return t
+
+
+DEFAULT_N = 1000000
+
+
+def run(args):
+    task = IdleTaskThread()
+    expiring = started_expiring()
+    benchmarks = [
+        ('TaskThread: before (_sleep(0))', _sleep0(task)),
+        ('TaskThread: _stop_if_requested', task._stop_if_requested),
+        ('TaskThread: every=100', IdleTaskThread(stop_check_every=100)._stop_if_requested),
+        ('TaskThread: interval=1ms',
+            IdleTaskThread(stop_check_interval=0.001)._stop_if_requested),
+        ('TimeoutTaskThread: before (_sleep(0))', _sleep0(expiring)),
+        ('TimeoutTaskThread: _stop_if_requested', expiring._stop_if_requested),
+        ('TimeoutTaskThread: _stop_if_requested (no deadline scheduler)',
+            started_expiring(deadline_scheduler=False)._stop_if_requested),
+        ('TimeoutTaskThread: every=100',
+            started_expiring(stop_check_every=100)._stop_if_requested),
+        ('TimeoutTaskThread: interval=1ms',
+            started_expiring(stop_check_interval=0.001)._stop_if_requested),
+    ]
+    return [Section('stop_check', 'ns/check', [
+        (label, measure_cost(func, args.n, scale=1e9)) for label, func in benchmarks
+    ])]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
@@ -0,0 +1,113 @@
+"""
+Benchmark: producing many rows in a task, returned as a list by a ``TaskThread`` vs. streamed
+by a ``StreamingTaskThread`` -- the time until the consumer gets the first row, the total time,
+and the peak memory allocated.
+"""
+
+import time
+import tracemalloc
+
+from merethread import TaskThread, StreamingTaskThread
+
+from .common import Section, main
+
+
+################################################################################
+
+def make_row(i):
+    return (i, 'row %d' % i, float(i))
+
+
+class _ListTaskThread(TaskThread):
+
+    def __init__(self, n, **kwargs):
+        super().__init__(**kwargs)
+        self.n = n
+
+    def _main(self):
+        rows = []
+        for i in range(self.n):
+            self._stop_if_requested()
+            rows.append(make_row(i))
+        return rows
+
+
+class _RowsStreamingTaskThread(StreamingTaskThread):
+
+    def __init__(self, n, **kwargs):
+        super().__init__(**kwargs)
+        self.n = n
+
+    def _main(self):
+        for i in range(self.n):
+            yield make_row(i)
+
+
+def consume_list(n):
+    t = _ListTaskThread(n)
+    t.start()
+    for row in t.future.result():
+        yield row
+
+
+def consume_stream(n, buffer_size):
+    t = _RowsStreamingTaskThread(n, buffer_size=buffer_size)
+    t.start()
+    yield from t.iter_results()
+
+
+def measure_times(rows):
+    """ :return: the number of msecs until the first row, and the total number of msecs """
+    t0 = time.perf_counter()
+    first = None
+    for _ in rows:
+        if first is None:
+            first = time.perf_counter() - t0
+    total = time.perf_counter() - t0
+    return first * 1e3, total * 1e3
+
+
+def measure_peak_memory(rows):
+    """ :return: the peak memory allocated (traced) while consuming the rows, in MB """
+    # (measured separately from the times, which tracing slows down)
+    tracemalloc.start()
+    for _ in rows:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+################################################################################
+
+DEFAULT_N = 200000
+
+
+def add_arguments(parser):
+    parser.add_argument('--buffer-size', type=int, default=1000,
+                        help='the buffer size of the StreamingTaskThread')
+
+
+def run(args):
+    n = args.n
+    cases = [
+        ('TaskThread (list)', lambda: consume_list(n)),
+        ('StreamingTaskThread', lambda: consume_stream(n, args.buffer_size)),
+    ]
+    times = [(label, measure_times(rows())) for label, rows in cases]
+    return [
+        Section('streaming %d rows: first row' % n, 'msec', [
+            (label, first) for label, (first, _) in times
+        ]),
+        Section('streaming %d rows: all rows' % n, 'msec', [
+            (label, total) for label, (_, total) in times
+        ]),
+        Section('streaming %d rows: peak memory' % n, 'MB', [
+            (label, measure_peak_memory(rows())) for label, rows in cases
+        ]),
+    ]
+
+
+if __name__ == '__main__':
+    import sys
+    main(sys.modules[__name__])
@@ -0,0 +1,146 @@
+"""
+Common definitions for the various benchmarks in this package.
+
+Each ``bench_*`` module defines:
+
+- ``DEFAULT_N``: the default number of operations to run.
+- ``run(args)``: runs the benchmarks, and returns a list of ``Section``s.
+- ``add_arguments(parser)`` (optional): adds module-specific command-line arguments.
+"""
+
+import sys
+import time
+import json
+import logging
+import argparse
+import platform
+import datetime
+import statistics
+from collections import namedtuple
+
+from merethread.version import __version_string__
+
+
+################################################################################
+
+Section = namedtuple('Section', 'name unit results')
+Section.__doc__ = """
+Results of a group of related benchmarks.
+
+:param results: a list of ``(label, value)`` pairs.
+"""
+
+
+################################################################################
+# measuring
+
+def measure_rate(func, n):
+    """
+    Call ``func()`` ``n`` times, and return the number of calls per second.
+    """
+    t0 = time.perf_counter()
+    for _ in range(n):
+        func()
+    elapsed = time.perf_counter() - t0
+    return n / elapsed
+
+
+def measure_batch_rate(func, n):
+    """
+    Call ``func(n)`` once (which is expected to perform ``n`` operations), and return the number
+    of operations per second.
+    """
+    t0 = time.perf_counter()
+    func(n)
+    elapsed = time.perf_counter() - t0
+    return n / elapsed
+
+
+def measure_cost(func, n, scale=1e6):
+    """
+    Call ``func()`` ``n`` times, and return the average time per call, in microseconds (by
+    default).
+    """
+    t0 = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - t0) / n * scale
+
+
+def measure_median_latency(func, n, scale=1e6):
+    """
+    Call ``func()`` ``n`` times.  ``func`` returns a latency in seconds.  Return the median
+    latency, in microseconds (by default).
+    """
+    return statistics.median(func() for _ in range(n)) * scale
+
+
+################################################################################
+# running and reporting
+
+def get_arg_parser(description, n=10000):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('-n', type=int, default=n, help='number of operations to run')
+    parser.add_argument('--json', action='store_true', help='emit results as JSON')
+    parser.add_argument('--log', action='store_true',
+                        help='keep INFO logging enabled (disabled by default, to avoid '
+                             'measuring the cost of writing log messages)')
+    return parser
+
+
+def parse_args(parser, argv=None):
+    args = parser.parse_args(argv)
+    if not args.log:
+        logging.disable(logging.INFO)
+    return args
+
+
+def get_metadata():
+    return {
+        'merethread_version': __version_string__,
+        'python_version': platform.python_version(),
+        'python_implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'time': datetime.datetime.utcnow().isoformat(),
+    }
+
+
+def to_json_obj(sections):
+    return {
+        'meta': get_metadata(),
+        'benchmarks': [
+            {'benchmark': s.name, 'unit': s.unit, 'results': dict(s.results)}
+            for s in sections
+        ],
+    }
+
+
+def report(sections, as_json=False, stream=None):
+    """
+    Report benchmark results, either as text or as JSON.
+    """
+    if stream is None:
+        stream = sys.stdout
+    if as_json:
+        json.dump(to_json_obj(sections), stream, indent=2)
+        stream.write('\n')
+        return
+    for section in sections:
+        stream.write('# %s (%s)\n' % (section.name, section.unit))
+        width = max(len(label) for label, _ in section.results)
+        for label, value in section.results:
+            stream.write('%-*s %14.1f\n' % (width, label, value))
+
+
+def main(module):
+    """
+    The main function of a ``bench_*`` module run as a script.
+    """
+    parser = get_arg_parser(module.__doc__, n=module.DEFAULT_N)
+    if hasattr(module, 'add_arguments'):
+        module.add_arguments(parser)
+    args = parse_args(parser)
+    report(module.run(args), as_json=args.json)
+
+
+################################################################################
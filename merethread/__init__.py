@@ -6,7 +6,12 @@ For details, see the docs.
 """
 
 from .thread import Thread, ThreadStatus
-from .daemon import DaemonThread, EventLoopThread
-from .task import TaskThread, FunctionThread
+from .daemon import (
+    DaemonThread, EventLoopThread, QueueEventLoopThread, PriorityEventLoopThread,
+    CoalescingEventLoopThread, PeriodicDaemonThread)
+from .task import TaskThread, FunctionThread, StreamingTaskThread
+from .pool import TaskPoolExecutor, PoolTask
 
 Thread, ThreadStatus, DaemonThread, EventLoopThread, TaskThread, FunctionThread  # pyflakes
+QueueEventLoopThread, TaskPoolExecutor, PoolTask, PeriodicDaemonThread  # pyflakes
+PriorityEventLoopThread, CoalescingEventLoopThread, StreamingTaskThread  # pyflakes
@@ -0,0 +1,185 @@
+"""
+Definitions of asyncio-based thread types: daemon threads which run an asyncio event-loop.
+"""
+
+import asyncio
+import time
+
+from .daemon import DaemonThread
+
+
+################################################################################
+
+def new_event_loop(use_uvloop=True):
+    """
+    Create a new asyncio event-loop.
+
+    :param use_uvloop: if True, and `uvloop <https://pypi.org/project/uvloop/>`_ is installed,
+        a uvloop loop is created.  Else, a default asyncio loop is created.
+    """
+    if use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            pass
+        else:
+            return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+class AsyncioEventLoopThread(DaemonThread):
+    """
+    A DaemonThread_ which runs an asyncio event-loop.
+
+    Coroutines can be scheduled to run in the loop from any thread, using ``submit``, and
+    callbacks using ``call_soon``.
+
+    When the thread is requested to stop, the loop is stopped, the tasks still pending are
+    cancelled, and the loop is closed.  Shutting down the loop takes no longer than
+    ``stop_timeout`` seconds (tasks which did not finish by then are abandoned).
+
+    Exceptions which are not handled by the tasks (reported to the loop's exception handler) are
+    passed to the ``_on_error`` hook.
+
+    While running, the thread keeps track of the *loop lag*: how late a callback scheduled to
+    run every ``lag_interval`` seconds actually runs.  High lag means some callback or coroutine
+    blocks the loop.
+    """
+
+    stop_timeout = 5.
+    lag_interval = 1.
+
+    def __init__(self, *, loop=None, use_uvloop=True, stop_timeout=None, lag_interval=None,
+                 **kwargs):
+        """
+        :param loop: the asyncio loop to run.  If not passed, a new loop is created, using
+            ``new_event_loop``.
+        :param use_uvloop: passed to ``new_event_loop``.
+        :param stop_timeout: max number of seconds to wait for pending tasks to finish after
+            cancelling them, when stopping.
+        :param lag_interval: interval (seconds) of measuring loop lag.  If 0, lag is not
+            measured.
+        """
+        super().__init__(**kwargs)
+        if loop is None:
+            loop = new_event_loop(use_uvloop=use_uvloop)
+        self.loop = loop
+        if stop_timeout is not None:
+            self.stop_timeout = stop_timeout
+        if lag_interval is not None:
+            self.lag_interval = lag_interval
+        self.loop_lag = None
+        self.max_loop_lag = None
+        self._lag_task = None
+
+    ################################################################################
+    # interface
+
+    def submit(self, coro):
+        """
+        Schedule a coroutine to run in the loop.  Can be called from any thread.
+
+        :return: a `concurrent.futures.Future`_ of the coroutine's result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        """
+        Schedule a callback to be called in the loop.  Can be called from any thread.
+
+        :return: an ``asyncio.Handle``, which can be used for cancelling the callback.
+        """
+        return self.loop.call_soon_threadsafe(callback, *args)
+
+    def num_pending_tasks(self):
+        """
+        The number of tasks scheduled in the loop which are not done yet (not including the
+        internal lag-measuring task).
+        """
+        if self.loop.is_closed():
+            return 0
+        # note: asyncio.all_tasks() is safe to call from other threads, as it retries if the
+        # (weak) set of tasks changes while iterating.
+        return len(asyncio.all_tasks(self.loop) - {self._lag_task})
+
+    ################################################################################
+    # main
+
+    def _main(self):
+        loop = self.loop
+        asyncio.set_event_loop(loop)
+        loop.set_exception_handler(self._loop_exception_handler)
+        try:
+            self._main_init()
+            if self.lag_interval:
+                self._lag_task = loop.create_task(self._measure_lag())
+            loop.run_forever()
+        finally:
+            try:
+                self._main_destroy()
+            finally:
+                self._shutdown_loop()
+                asyncio.set_event_loop(None)
+
+    def _request_stop(self, reason=None):
+        super()._request_stop(reason=reason)
+        try:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        except RuntimeError:
+            pass  # loop already closed
+
+    def _handle_stop_before_start(self):
+        super()._handle_stop_before_start()
+        self.loop.close()
+
+    def _shutdown_loop(self):
+        loop = self.loop
+        deadline = time.monotonic() + self.stop_timeout
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            _, pending = loop.run_until_complete(asyncio.wait(tasks, timeout=self.stop_timeout))
+            if pending:
+                self.logger.warning('%d tasks did not finish within %s seconds',
+                                    len(pending), self.stop_timeout)
+        remaining = max(0, deadline - time.monotonic())
+        try:
+            loop.run_until_complete(asyncio.wait_for(loop.shutdown_asyncgens(), remaining))
+            if hasattr(loop, 'shutdown_default_executor'):
+                remaining = max(0, deadline - time.monotonic())
+                loop.run_until_complete(
+                    asyncio.wait_for(loop.shutdown_default_executor(), remaining))
+        except asyncio.TimeoutError:
+            self.logger.warning('loop shutdown did not finish within %s seconds',
+                                self.stop_timeout)
+        finally:
+            loop.close()
+
+    ################################################################################
+    # loop lag and errors
+
+    async def _measure_lag(self):
+        interval = self.lag_interval
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            lag = max(0., time.monotonic() - expected)
+            self.loop_lag = lag
+            if self.max_loop_lag is None or lag > self.max_loop_lag:
+                self.max_loop_lag = lag
+
+    def _loop_exception_handler(self, loop, context):
+        e = context.get('exception')
+        if e is None:
+            self.logger.error('%s', context.get('message'))
+            return
+        try:
+            self._on_error(e)
+        except Exception as e2:
+            # can't abort from the exception handler, so stopping instead
+            self.logger.exception('error handler failed, stopping', exc_info=e2)
+            self.stop(reason='error')
+
+
+################################################################################
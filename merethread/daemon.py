@@ -3,7 +3,12 @@ Definitions of daemon-thread types: perpetual threads which are meant
 to run for as long as the process is alive.
 """
 
+import time
+import random
 from .thread import Thread, _ThreadStop
+from .misc import monotonic_ns
+from .queues import (
+    DequeEventQueue, BoundedEventQueue, PriorityEventQueue, CoalescingEventQueue)
 
 
 ################################################################################
@@ -21,15 +26,36 @@ class DaemonThread(Thread):
 
     Using the ``target`` argument is not supported.  The function to run in the daemon
     thread is defined by overriding the ``_main`` method.
+
+    If ``stall_timeout`` is set, the iterations of the main loop are monitored by a
+    ``StallWatchdog`` (see ``merethread.watchdog``), and ``_on_stall`` is called when an
+    iteration takes longer than ``stall_timeout`` seconds.
     """
 
-    def __init__(self, *, daemon=True, **kwargs):
+    # max number of seconds an iteration of the main loop is expected to take.  If None, stalls
+    # are not monitored.  Can also be passed to the constructor.
+    stall_timeout = None
+
+    def __init__(self, *, daemon=True, stall_timeout=None, watchdog=None, **kwargs):
+        """
+        :param stall_timeout: see ``stall_timeout`` above.
+        :param watchdog: the ``StallWatchdog`` to use.  Defaults to ``get_default_watchdog()``.
+        """
         super().__init__(
             daemon=daemon,
             target=None, args=(), kwargs={},  # caller must not pass these, raises if passed
             **kwargs
         )
         self._is_premature_exit = False
+        if stall_timeout is not None:
+            self.stall_timeout = stall_timeout
+        self._watchdog = watchdog
+        self._is_watched = False
+        self._iteration_start_ns = None  # when the current iteration started (if watched)
+        self._stall_reported_ns = None
+        self._stall_timeout_ns = None
+        if self.stall_timeout is not None:
+            self._stall_timeout_ns = int(self.stall_timeout * 1e9)
 
     ################################################################################
     # abstract daemon implementation methods
@@ -42,17 +68,55 @@ class DaemonThread(Thread):
         i.e. should not return or raise an exception before ``stop`` is called.
         """
         self._main_init()
+        # note: checking the event directly (lock-free), as this thread is obviously alive
+        is_stopping = self._stopping_event.is_set
+        metrics = self._metrics
+        watchdog = self._get_watchdog()
+        self._is_watched = watchdog is not None
+        if metrics is None and watchdog is None:
+            main_iteration = self._main_iteration
+        else:
+            main_iteration = self._instrumented_main_iteration
+        if watchdog is not None:
+            watchdog.add_thread(self)
         try:
-            while not self.is_stopping():
+            while not is_stopping():
                 try:
-                    self._main_iteration()
+                    main_iteration()
                 except _ThreadStop:
                     raise
                 except Exception as e:
+                    if metrics is not None:
+                        metrics.record_error()
                     self._on_error(e)
         finally:
+            if watchdog is not None:
+                watchdog.remove_thread(self)
             self._main_destroy()
 
+    def _get_watchdog(self):
+        if self.stall_timeout is None:
+            return None
+        if self._watchdog is None:
+            # imported here to avoid a circular import (the watchdog is a daemon thread)
+            from .watchdog import get_default_watchdog
+            self._watchdog = get_default_watchdog()
+        return self._watchdog
+
+    def _instrumented_main_iteration(self):
+        # used instead of _main_iteration when collecting metrics or monitoring stalls
+        watched = self._is_watched
+        t0 = time.perf_counter()
+        if watched:
+            self._iteration_start_ns = monotonic_ns()
+        try:
+            self._main_iteration()
+        finally:
+            if watched:
+                self._iteration_start_ns = None
+            if self._metrics is not None:
+                self._metrics.record_iteration(time.perf_counter() - t0)
+
     def _main_iteration(self):
         """
         A
@@ -81,6 +145,18 @@ class DaemonThread(Thread):
         """
         self.logger.exception('error', exc_info=e)
 
+    def _on_stall(self, duration, stacktrace):
+        """
+        A hook called when an iteration of the main loop stalls (takes longer than
+        ``stall_timeout`` seconds).  Called once per stalled iteration.
+
+        :note: this is called in the watchdog thread, while this thread is (still) stalled.
+
+        :param duration: number of seconds the iteration has been running.
+        :param stacktrace: the stack-trace of this thread, when the stall was detected.
+        """
+        self.logger.warning('iteration stalled for %.1f seconds:%s', duration, stacktrace)
+
     def _on_abort(self, e):
         self.logger.exception('aborted due to an error', exc_info=e)
 
@@ -160,6 +236,18 @@ class EventLoopThread(DaemonThread):
         raise NotImplementedError('_read_next_event() not defined for %s' %
                                   self.__class__.__name__)
 
+    def _read_next_event_within(self, timeout):
+        """
+        Same as ``_read_next_event``, but returns None if no event is read within ``timeout``
+        seconds.  Used by BatchEventLoopThread_ while a batch fills up, so the batch is flushed
+        on time.
+
+        The default implementation calls ``_read_next_event`` (ignoring ``timeout``), which is
+        fine for readers which "yield" control after a short while.  Readers which block for
+        longer should override it.
+        """
+        return self._read_next_event()
+
     def _handle_event(self, event):
         """
         Handle the event.
@@ -196,5 +284,630 @@ class EventLoopThread(DaemonThread):
         except Exception as e:
             self._on_event_error(event, e)
 
+    def _instrumented_main_iteration(self):
+        # same as _main_iteration, also collecting metrics and/or monitoring stalls.  Only the
+        # handling of the event is monitored for stalls, as waiting for events is not a stall.
+        if type(self)._main_iteration is not EventLoopThread._main_iteration:
+            # _main_iteration is overridden, so it can only be instrumented as a whole
+            return super()._instrumented_main_iteration()
+        metrics = self._metrics
+        watched = self._is_watched
+        perf_counter = time.perf_counter
+        t0 = perf_counter()
+        event = self._read_next_event()
+        if event is None:
+            if metrics is not None:
+                metrics.record_idle_read(perf_counter() - t0)
+            return
+        if watched:
+            self._iteration_start_ns = monotonic_ns()
+        t1 = perf_counter()
+        failed = False
+        try:
+            self._handle_event(event)
+        except _ThreadStop:
+            raise
+        except Exception as e:
+            failed = True
+            self._on_event_error(event, e)
+        finally:
+            t2 = perf_counter()
+            if watched:
+                self._iteration_start_ns = None
+        if metrics is not None:
+            metrics.record_event(t2 - t1, failed, t2 - t0)
+
+
+class BatchEventLoopThread(EventLoopThread):
+    """
+    An EventLoopThread_ which reads and handles events in batches, for reducing the per-event
+    overhead of the main-loop (e.g. for high-rate ingestion, or for handling events in bulk).
+
+    The ``_main_iteration`` method is broken down to these operations:
+
+    - ``_read_next_events`` -- reads a batch of events.  By default, implemented by calling
+      ``_read_next_event`` repeatedly.  Subclasses can override it for reading a batch more
+      efficiently.
+    - ``_handle_events`` -- handles a batch of events.  By default, implemented by calling
+      ``_handle_event`` for each event.  Subclasses can override it for handling the batch in
+      bulk (e.g. a single bulk DB insert).
+    - ``_on_event_error`` -- called for each event which failed to be handled.
+    - ``_on_batch_error`` -- called when ``_handle_events`` raises.
+
+    A batch is flushed (passed to ``_handle_events``) when it reaches ``batch_size`` events, or
+    ``batch_max_wait`` seconds after its first event was read, whichever comes first.  After the
+    first event of a batch, events are read using ``_read_next_event_within``, so a reader which
+    blocks (e.g. of a QueueEventLoopThread_) does not hold a partial batch for longer.
+    Checking if the thread should stop is done once per batch.
+    """
+
+    def __init__(self, *, batch_size=100, batch_max_wait=0.1, **kwargs):
+        """
+        :param batch_size: max number of events in a batch.
+        :param batch_max_wait: max number of seconds to wait for a batch to fill up, counting
+            from the time its first event was read.
+        """
+        super().__init__(**kwargs)
+        if batch_size < 1:
+            raise ValueError('Invalid batch_size: %r' % batch_size)
+        self.batch_size = batch_size
+        self.batch_max_wait = batch_max_wait
+
+    ################################################################################
+    # abstract and customizable methods
+
+    def _read_next_events(self, max_n, max_wait):
+        """
+        Generate the next batch of events to handle. This method is blocking.
+
+        Returns a list of at most ``max_n`` events, which is passed to ``_handle_events``.
+        Returning an empty list serves for "yielding" control back to the main-loop (same as
+        ``_read_next_event`` returning None).
+
+        The default implementation calls ``_read_next_event`` (and then
+        ``_read_next_event_within``) repeatedly, until ``max_n`` events are read, ``max_wait``
+        seconds have passed since the first event was read, or the thread is requested to stop.
+        If ``_read_next_event`` returns None before any event is read, an empty batch is
+        returned.
+
+        If this method raises an exception, ``_on_error`` is called to handle it, and the events
+        read so far are lost.
+        """
+        # note: attribute lookups are hoisted out of the loop, as it runs per event
+        read_next_event = self._read_next_event
+        read_next_event_within = self._read_next_event_within
+        if type(self)._read_next_event_within is EventLoopThread._read_next_event_within:
+            read_next_event_within = None  # (it ignores the timeout, so not computing it)
+        is_stopping = self._stopping_event.is_set
+        now = time.monotonic
+        batch = []
+        flush_time = None
+        for _ in range(max_n):
+            if flush_time is None or read_next_event_within is None:
+                event = read_next_event()
+            else:
+                # not waiting past the flush time
+                event = read_next_event_within(max(0., flush_time - now()))
+            if event is not None:
+                batch.append(event)
+                if flush_time is None:
+                    flush_time = now() + max_wait
+            elif not batch:
+                break
+            if is_stopping() or now() >= flush_time:
+                break
+        return batch
+
+    def _handle_events(self, batch):
+        """
+        Handle a batch of events.
+
+        The default implementation calls ``_handle_event`` for each event, and ``_on_event_error``
+        for each event which fails.
+
+        Subclasses handling the batch in bulk can attribute errors to specific events by calling
+        ``_on_event_error`` directly.  If this method raises an exception, ``_on_batch_error`` is
+        called to handle it.
+
+        :param batch: the (non-empty) list of events returned from the last call to
+            ``_read_next_events``.
+        """
+        handle_event = self._handle_event
+        for event in batch:
+            try:
+                handle_event(event)
+            except _ThreadStop:
+                raise
+            except Exception as e:
+                self._on_event_error(event, e)
+
+    def _on_batch_error(self, batch, e):
+        """
+        Called when ``_handle_events`` raises an exception.
+
+        The batch failed as a whole, so by default, the error is attributed to every event in the
+        batch, by calling ``_on_event_error`` for each of them.
+
+        If this method raises an exception, ``_on_error`` is called to handle it.
+        """
+        for event in batch:
+            self._on_event_error(event, e)
+
+    ################################################################################
+    # abstract event loop implementation (private)
+
+    def _main_iteration(self):
+        # read a batch of events:
+        batch = self._read_next_events(self.batch_size, self.batch_max_wait)
+        if not batch:
+            return
+        # handle the batch:
+        try:
+            self._handle_events(batch)
+        except _ThreadStop:
+            raise
+        except Exception as e:
+            self._on_batch_error(batch, e)
+
+    def _instrumented_main_iteration(self):
+        # same as _main_iteration, also collecting metrics and/or monitoring stalls (of handling
+        # the batch only)
+        if type(self)._main_iteration is not BatchEventLoopThread._main_iteration:
+            # _main_iteration is overridden, so it can only be instrumented as a whole
+            return DaemonThread._instrumented_main_iteration(self)
+        metrics = self._metrics
+        watched = self._is_watched
+        t0 = time.perf_counter()
+        batch = self._read_next_events(self.batch_size, self.batch_max_wait)
+        if not batch:
+            if metrics is not None:
+                metrics.record_idle_read(time.perf_counter() - t0)
+            return
+        if watched:
+            self._iteration_start_ns = monotonic_ns()
+        try:
+            self._handle_events(batch)
+        except _ThreadStop:
+            raise
+        except Exception as e:
+            self._on_batch_error(batch, e)
+        finally:
+            if watched:
+                self._iteration_start_ns = None
+        if metrics is not None:
+            metrics.record_batch(len(batch), time.perf_counter() - t0)
+
+
+class QueueEventLoopThread(EventLoopThread):
+    """
+    An EventLoopThread_ which handles events put in its input queue by producers, using the
+    ``put`` and ``put_nowait`` methods.
+
+    The consumer (this thread) blocks on the queue while it is empty, with no polling: when the
+    thread is requested to stop, the queue is woken up, so the thread stops immediately.
+
+    The queue backend can be chosen by passing the ``queue`` argument, or by overriding the
+    ``Queue`` class attribute.  See the ``merethread.queues`` module for the available backends.
+
+    By default, the queue is unbounded.  Setting ``capacity`` makes it a ``BoundedEventQueue``,
+    which handles overflows according to ``overflow_policy``, and calls the ``_on_high_water``
+    and ``_on_low_water`` hooks when it crosses its water marks (and the ``_on_event_evicted``
+    hook for events dropped by the ``'drop_oldest'`` policy).
+
+    Events still in the queue when the thread stops are not handled.
+
+    A concrete subclass only needs to override ``_handle_event``.
+    """
+
+    Queue = DequeEventQueue
+
+    # if set, the input queue is a BoundedEventQueue with this capacity, and the following
+    # options apply (see BoundedEventQueue).  Can also be passed to the constructor.
+    capacity = None
+    # what to do with an event put in a full queue: 'block', 'drop', 'drop_oldest' or 'raise'.
+    # Can also be passed to the constructor.
+    overflow_policy = 'block'
+    # the default timeout of a blocking put.  Can also be passed to the constructor.
+    put_timeout = None
+    # the water marks of the queue.  Can also be passed to the constructor.
+    high_water_mark = None
+    low_water_mark = None
+
+    def __init__(self, *, queue=None, capacity=None, overflow_policy=None, put_timeout=None,
+                 high_water_mark=None, low_water_mark=None, **kwargs):
+        """
+        :param queue: the event-queue to read events from.  If not passed, one is created
+            using ``_create_queue()``.
+        :param capacity: see ``capacity`` above.
+        :param overflow_policy: see ``overflow_policy`` above.
+        :param put_timeout: see ``put_timeout`` above.
+        :param high_water_mark: see ``high_water_mark`` above.
+        :param low_water_mark: see ``low_water_mark`` above.
+        """
+        super().__init__(**kwargs)
+        if capacity is not None:
+            self.capacity = capacity
+        if overflow_policy is not None:
+            self.overflow_policy = overflow_policy
+        if put_timeout is not None:
+            self.put_timeout = put_timeout
+        if high_water_mark is not None:
+            self.high_water_mark = high_water_mark
+        if low_water_mark is not None:
+            self.low_water_mark = low_water_mark
+        if queue is None:
+            queue = self._create_queue()
+        self.queue = queue
+
+    def _create_queue(self):
+        """
+        Create the input queue, if not passed to the constructor: a new ``self.Queue()``, or a
+        ``BoundedEventQueue`` if ``capacity`` is set.
+        """
+        if self.capacity is not None:
+            return BoundedEventQueue(
+                self.capacity, self.overflow_policy, put_timeout=self.put_timeout,
+                high_water_mark=self.high_water_mark, low_water_mark=self.low_water_mark,
+                on_high_water=self._on_high_water, on_low_water=self._on_low_water,
+                on_evict=self._on_event_evicted,
+                metrics=self._metrics)
+        return self.Queue()
+
+    ################################################################################
+    # producer interface
+
+    def put(self, event, block=True, timeout=None):
+        """
+        Put an event in the input queue.  Can be called from any thread.
+
+        ``block`` and ``timeout`` are only relevant for bounded queues.
+
+        :return: whether the event was queued (False if it was dropped, by the overflow policy
+            of a bounded queue).
+        :raise queue.Full: if a bounded queue is full (depending on its overflow policy).
+        """
+        if event is None:
+            raise ValueError('None is not a valid event')
+        return self.queue.put(event, block, timeout)
+
+    def put_nowait(self, event):
+        if event is None:
+            raise ValueError('None is not a valid event')
+        return self.queue.put_nowait(event)
+
+    def qsize(self):
+        """ The number of events waiting in the input queue. """
+        return self.queue.qsize()
+
+    def is_overloaded(self):
+        """
+        Has the input queue reached its high water mark (and not yet fallen back to the low
+        water mark)?  Producers can use this for throttling themselves.  Always False for
+        unbounded queues.
+        """
+        is_overloaded = getattr(self.queue, 'is_overloaded', None)
+        return is_overloaded is not None and is_overloaded()
+
+    ################################################################################
+    # hooks
+
+    def _on_high_water(self):
+        """
+        A hook called when the (bounded) input queue reaches its high water mark.
+
+        :note: this is called in the producer thread which put the event.
+        """
+        self.logger.warning('input queue overloaded: %d events queued', self.queue.qsize())
+
+    def _on_low_water(self):
+        """
+        A hook called when the (bounded) input queue falls back to its low water mark, after
+        reaching its high water mark.
+
+        :note: this is called in this thread, after reading an event.
+        """
+        self.logger.info('input queue no longer overloaded: %d events queued',
+                         self.queue.qsize())
+
+    def _on_event_evicted(self, event):
+        """
+        A hook called with an event dropped from the (bounded) input queue by the
+        ``'drop_oldest'`` policy, to make room for a newer event.  Does nothing by default.
+
+        :note: this is called in the producer thread which put the newer event.
+        """
+
+    ################################################################################
+    # event loop implementation
+
+    def _read_next_event(self):
+        # blocks until an event is available, or until woken up by _request_stop
+        return self.queue.get()
+
+    def _read_next_event_within(self, timeout):
+        return self.queue.get(timeout)
+
+    def _request_stop(self, reason=None):
+        super()._request_stop(reason=reason)
+        self.queue.wakeup()
+
+
+class PriorityEventLoopThread(QueueEventLoopThread):
+    """
+    A QueueEventLoopThread_ which handles events by priority: producers pass a ``priority`` to
+    ``put``, from ``0`` (the highest) to ``num_priorities - 1`` (the lowest, and the default).
+
+    Events of higher priority are handled first, e.g. control events are not delayed by a
+    backlog of data events.  To prevent starvation, a priority level which has been passed
+    over ``starvation_limit`` times in a row is served next (see ``PriorityEventQueue``).
+
+    The depth of each priority level, and the time its events waited in the queue, are
+    available using ``priority_stats()``.
+    """
+
+    Queue = PriorityEventQueue
+
+    # the number of priority levels.  Can also be passed to the constructor.
+    num_priorities = 3
+    # the max number of times in a row a (non-empty) priority level is passed over.  Can also be
+    # passed to the constructor.
+    starvation_limit = 100
+
+    def __init__(self, *, num_priorities=None, starvation_limit=None, **kwargs):
+        """
+        :param num_priorities: see ``num_priorities`` above.
+        :param starvation_limit: see ``starvation_limit`` above.
+        """
+        if num_priorities is not None:
+            self.num_priorities = num_priorities
+        if starvation_limit is not None:
+            self.starvation_limit = starvation_limit
+        super().__init__(**kwargs)
+
+    def _create_queue(self):
+        return self.Queue(self.num_priorities, starvation_limit=self.starvation_limit)
+
+    def put(self, event, block=True, timeout=None, *, priority=None):
+        """
+        Put an event in the input queue, with the given ``priority`` (by default, the lowest).
+        Can be called from any thread.
+        """
+        if event is None:
+            raise ValueError('None is not a valid event')
+        return self.queue.put(event, block, timeout, priority=priority)
+
+    def put_nowait(self, event, *, priority=None):
+        if event is None:
+            raise ValueError('None is not a valid event')
+        return self.queue.put_nowait(event, priority=priority)
+
+    def priority_stats(self):
+        """
+        :return: a list of ``PriorityStats`` snapshots, one per priority level.
+        """
+        return self.queue.get_stats()
+
+
+class CoalescingEventLoopThread(QueueEventLoopThread):
+    """
+    A QueueEventLoopThread_ for "latest value wins" events (e.g. price updates, or cache
+    invalidations): an event put while another event with the same key is still in the queue is
+    merged into it, so a burst of events is handled with work proportional to the number of
+    distinct keys, not to the number of events.
+
+    The key of an event is extracted using ``_get_event_key`` (by default, the event itself), and
+    events are merged using ``_merge_events`` (by default, the newer event replaces the pending
+    one).  Both can also be passed to the constructor, as ``key`` and ``merge``.  A merged event
+    keeps the place of the pending event in the queue.  See ``CoalescingEventQueue``.
+
+    The number of events put and coalesced is available using ``coalescing_stats()`` (and in the
+    metrics, if enabled).
+    """
+
+    Queue = CoalescingEventQueue
+
+    def __init__(self, *, key=None, merge=None, **kwargs):
+        """
+        :param key: a function for extracting the key of an event.  If not passed,
+            ``_get_event_key`` is used.
+        :param merge: a function for merging an event into the pending event with the same key.
+            If not passed, ``_merge_events`` is used.
+        """
+        if key is not None:
+            self._get_event_key = key
+        if merge is not None:
+            self._merge_events = merge
+        super().__init__(**kwargs)
+
+    def _create_queue(self):
+        merge = self._merge_events
+        if getattr(merge, '__func__', None) is CoalescingEventLoopThread._merge_events:
+            merge = None  # last wins, without the call
+        return self.Queue(self._get_event_key, merge, metrics=self._metrics)
+
+    def _get_event_key(self, event):
+        """
+        Extract the key of the event.  Events with the same key are coalesced.
+        By default, the event itself is used as the key.
+        """
+        return event
+
+    def _merge_events(self, pending_event, event):
+        """
+        Merge an event into the pending event with the same key, and return the merged event.
+        Called by the producer, with the lock of the queue held.
+        By default, the newer event is returned (last wins).
+        """
+        return event
+
+    def coalescing_stats(self):
+        """
+        :return: a ``CoalescingStats`` snapshot.
+        """
+        return self.queue.get_stats()
+
+
+################################################################################
+
+class TickStats:
+    """
+    Statistics of the ticks of a ``PeriodicDaemonThread``: the number of ticks run and missed,
+    and how late the ticks ran (in seconds, relative to their scheduled times).
+    """
+
+    def __init__(self):
+        self.ticks = 0
+        self.missed = 0
+        self.lateness_sum = 0.
+        self.lateness_max = 0.
+        self.lateness_last = None
+
+    def record(self, lateness, missed=0):
+        self.ticks += 1
+        self.missed += missed
+        self.lateness_sum += lateness
+        if lateness > self.lateness_max:
+            self.lateness_max = lateness
+        self.lateness_last = lateness
+
+    @property
+    def lateness_mean(self):
+        if not self.ticks:
+            return None
+        return self.lateness_sum / self.ticks
+
+    def __repr__(self):
+        return '<%s ticks=%d missed=%d lateness_mean=%s lateness_max=%.6f>' % (
+            self.__class__.__name__, self.ticks, self.missed,
+            '%.6f' % self.lateness_mean if self.ticks else None, self.lateness_max)
+
+
+class PeriodicDaemonThread(DaemonThread):
+    """
+    A daemon thread which calls ``_on_tick`` periodically, at fixed times: the n-th tick is
+    scheduled ``n * period`` seconds after the thread starts (on the monotonic clock), regardless
+    of how long the ticks take, so the schedule doesn't drift.
+
+    A tick which runs a full period (or more) late, e.g. because the previous tick took too
+    long, misses the ticks scheduled in the meantime.  These are handled according to
+    ``missed_tick_policy``:
+
+     - ``'skip'``: the missed ticks are dropped, and the schedule resumes at the next scheduled
+       time.
+     - ``'catch_up'``: the missed ticks are run one after the other, until back on schedule.
+     - ``'coalesce'``: the missed ticks are run as a single tick (``_on_tick`` is passed the
+       number of ticks it stands for), and the schedule resumes at the next scheduled time.
+
+    ``jitter`` shifts the whole schedule by a random number of seconds (between 0 and
+    ``jitter``), chosen once, in order to spread the ticks of many threads with the same period.
+
+    The lateness of the ticks is recorded in ``tick_stats`` (a ``TickStats``), and in the
+    thread's metrics, if enabled.
+    """
+
+    MISSED_TICK_POLICIES = ('skip', 'catch_up', 'coalesce')
+
+    # number of seconds between ticks.  Can also be passed to the constructor.
+    period = None
+    # one of MISSED_TICK_POLICIES.  Can also be passed to the constructor.
+    missed_tick_policy = 'skip'
+    # max number of seconds to shift the schedule by.  Can also be passed to the constructor.
+    jitter = 0.
+
+    def __init__(self, *, period=None, missed_tick_policy=None, jitter=None, **kwargs):
+        """
+        :param period: see ``period`` above.
+        :param missed_tick_policy: see ``missed_tick_policy`` above.
+        :param jitter: see ``jitter`` above.
+        """
+        super().__init__(**kwargs)
+        if period is not None:
+            self.period = period
+        if missed_tick_policy is not None:
+            self.missed_tick_policy = missed_tick_policy
+        if jitter is not None:
+            self.jitter = jitter
+        if self.period is None or self.period <= 0:
+            raise ValueError('Invalid period: %r' % self.period)
+        if self.missed_tick_policy not in self.MISSED_TICK_POLICIES:
+            raise ValueError('Invalid missed_tick_policy: %r' % self.missed_tick_policy)
+        if self.jitter < 0:
+            raise ValueError('Invalid jitter: %r' % self.jitter)
+        self._period_ns = int(self.period * 1e9)
+        self._next_tick_ns = None  # the scheduled time of the next tick
+        self.tick_stats = TickStats()
+
+    ################################################################################
+    # abstract periodic implementation methods
+
+    def _on_tick(self, ticks):
+        """
+        The periodic work.  Concrete ``PeriodicDaemonThread`` subclasses must override this
+        method.
+
+        Exceptions raised from this method are passed to ``_on_error``, and the schedule
+        continues.
+
+        :param ticks: the number of scheduled ticks this call stands for: 1, unless missed ticks
+            are coalesced.
+        """
+        raise NotImplementedError('_on_tick() not defined for %s' % self.__class__.__name__)
+
+    ################################################################################
+    # periodic implementation (private)
+
+    def _main_iteration(self):
+        ticks, _, _ = self._wait_for_tick()
+        self._on_tick(ticks)
+
+    def _instrumented_main_iteration(self):
+        # same as _main_iteration, also collecting metrics and/or monitoring stalls.  Only the
+        # tick is monitored for stalls, as waiting for it is not a stall.
+        if type(self)._main_iteration is not PeriodicDaemonThread._main_iteration:
+            # _main_iteration is overridden, so it can only be instrumented as a whole
+            return super()._instrumented_main_iteration()
+        ticks, lateness, missed = self._wait_for_tick()
+        watched = self._is_watched
+        if watched:
+            self._iteration_start_ns = monotonic_ns()
+        t0 = time.perf_counter()
+        try:
+            self._on_tick(ticks)
+        finally:
+            if watched:
+                self._iteration_start_ns = None
+            if self._metrics is not None:
+                self._metrics.record_tick(lateness, missed, time.perf_counter() - t0)
+
+    def _wait_for_tick(self):
+        """
+        Sleep until the next tick is due, and advance the schedule, according to
+        ``missed_tick_policy``.
+
+        :return: a ``(ticks, lateness, missed)`` tuple: the number of ticks to run as one, the
+            lateness of the tick (seconds), and the number of ticks missed.
+        """
+        period_ns = self._period_ns
+        if self._next_tick_ns is None:
+            offset_ns = int(random.uniform(0, self.jitter) * 1e9) if self.jitter else 0
+            self._next_tick_ns = monotonic_ns() + period_ns + offset_ns
+        delay_ns = self._next_tick_ns - monotonic_ns()
+        if delay_ns > 0:
+            self._sleep(delay_ns / 1e9)
+        lateness_ns = monotonic_ns() - self._next_tick_ns
+        missed = lateness_ns // period_ns  # later ticks whose scheduled time also passed
+        policy = self.missed_tick_policy
+        if missed <= 0 or policy == 'catch_up':
+            # on schedule, or catching up: run the ticks one at a time
+            missed = 0
+            ticks = 1
+            self._next_tick_ns += period_ns
+        else:
+            ticks = missed + 1 if policy == 'coalesce' else 1
+            self._next_tick_ns += (missed + 1) * period_ns
+        lateness = lateness_ns / 1e9
+        self.tick_stats.record(lateness, missed)
+        return ticks, lateness, missed
+
 
 ################################################################################
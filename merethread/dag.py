@@ -0,0 +1,409 @@
+"""
+Running a dependency graph (DAG) of tasks: each task is started as soon as all its upstream
+tasks succeed, and is passed their results.
+
+    graph = TaskGraph(max_concurrency=4)
+    graph.add('load', LoadTaskThread)
+    graph.add('clean', CleanTaskThread, deps=['load'])
+    graph.add('stats', StatsTaskThread, deps=['load'])
+    graph.add('report', ReportTaskThread, deps=['clean', 'stats'])
+    graph.run()
+    print(graph.format_report())
+
+Each node is added with a *factory*: a callable (e.g. a ``TaskThread`` subclass) which is called
+with the results of the upstream nodes (in the order of ``deps``), and returns the (not yet
+started) ``TaskThread`` to run.
+
+No thread blocks waiting for its upstream tasks: the graph is driven by the done-callbacks of the
+futures of the tasks.  The callbacks only update the state of the graph, and hand the nodes which
+became ready to a dispatcher thread (one per graph), which creates and starts their tasks, so
+setting up downstream tasks does not add to the runtime (or profile) of the task which finished.
+At most ``max_concurrency`` tasks run at the same time, the other ready nodes waiting in order of
+readiness.
+
+When a node fails (its task aborts, or is cancelled), its whole downstream subgraph is cancelled
+(these tasks are never created).  Independent branches keep running.
+
+After the graph is done, ``critical_path()`` returns the chain of nodes which determined its
+wall-clock time, and ``format_report()`` reports the times of the nodes (including the time they
+waited for a free slot).
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import CancelledError
+
+from .daemon import QueueEventLoopThread
+from .misc import monotonic_ns
+
+
+################################################################################
+
+class _GraphDispatcherThread(QueueEventLoopThread):
+    """ Creates and starts the tasks of the nodes of a ``TaskGraph`` which became ready """
+
+    logger_mode = 'class'
+
+    def __init__(self, graph, **kwargs):
+        super().__init__(**kwargs)
+        self.graph = graph
+
+    def _handle_event(self, nodes):
+        self.graph._start_nodes(nodes)
+
+
+class GraphNode:
+    """
+    A node of a ``TaskGraph``.
+
+    - ``status``: one of ``STATUSES``.
+    - ``task``: the task, once created.
+    - ``result`` and ``exception``: the outcome of the task.  For a node cancelled because an
+      upstream node failed, ``exception`` is a ``CancelledError``.
+    - ``ready_ns``, ``start_ns`` and ``end_ns``: (monotonic) times the node became ready (all
+      its upstream nodes succeeded), was started, and finished.
+    """
+
+    STATUSES = ('pending', 'ready', 'running', 'succeeded', 'failed', 'cancelled')
+
+    def __init__(self, name, factory, deps):
+        self.name = name
+        self.factory = factory
+        self.deps = tuple(deps)
+        self.dependents = []
+        self.status = 'pending'
+        self.task = None
+        self.result = None
+        self.exception = None
+        self.ready_ns = None
+        self.start_ns = None
+        self.end_ns = None
+        self._num_waiting = len(self.deps)  # upstream nodes not yet succeeded
+
+    @property
+    def runtime(self):
+        """ The ``Runtime`` of the task (None if the task was not created). """
+        if self.task is not None:
+            return self.task.runtime
+
+    @property
+    def queued_ns(self):
+        """ The time the node waited for a free slot, after becoming ready. """
+        if self.start_ns is not None:
+            return self.start_ns - self.ready_ns
+
+    @property
+    def duration_ns(self):
+        """ The time from starting the task until it finished. """
+        if self.end_ns is not None and self.start_ns is not None:
+            return self.end_ns - self.start_ns
+
+    def is_done(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def __repr__(self):
+        return '<%s %s [%s]>' % (self.__class__.__name__, self.name, self.status)
+
+
+class TaskGraph:
+    """
+    A dependency graph of tasks.  See the module docstring.
+    """
+
+    def __init__(self, max_concurrency=None):
+        """
+        :param max_concurrency: the max number of tasks running at the same time.  None for no
+            limit.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError('Invalid max_concurrency: %r' % max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.nodes = {}  # name -> GraphNode, in the order added
+        self._ready = deque()  # ready nodes, waiting for a free slot
+        self._num_running = 0
+        self._num_done = 0
+        self._started = False
+        self._cancel_reason = None  # set by cancel()
+        self._lock = threading.Lock()
+        self._done_event = threading.Event()
+        self._dispatcher = None  # started by start()
+
+    def add(self, name, factory, deps=()):
+        """
+        Add a node.  The upstream nodes (``deps``) can be added later, until the graph is
+        started.
+
+        :param factory: called with the results of the ``deps``, returns the task to run.
+        :return: the ``GraphNode``.
+        """
+        if self._started:
+            raise RuntimeError('cannot add nodes after the graph is started')
+        if name in self.nodes:
+            raise ValueError('Duplicate node: %r' % name)
+        node = self.nodes[name] = GraphNode(name, factory, deps)
+        return node
+
+    ################################################################################
+    # running
+
+    def start(self):
+        """
+        Start the tasks of the nodes which have no upstream nodes.  Returns immediately.
+
+        :raise ValueError: if a node depends on a missing node, or the graph has a cycle.
+        """
+        with self._lock:
+            if self._started:
+                raise RuntimeError('the graph is already started')
+            self._validate()
+            self._started = True
+            now = monotonic_ns()
+            for node in self.nodes.values():
+                for dep in node.deps:
+                    self.nodes[dep].dependents.append(node)
+            for node in self.nodes.values():
+                if not node.deps:
+                    self._set_ready(node, now)
+            if not self.nodes:
+                self._done_event.set()
+            else:
+                self._dispatcher = _GraphDispatcherThread(self, daemon=True)
+                self._dispatcher.start()
+            to_start = self._take_startable()
+        self._start_nodes(to_start)
+
+    def wait(self, timeout=None):
+        """
+        Wait for all nodes to be done.
+
+        :return: whether all nodes are done.
+        """
+        if not self._done_event.wait(timeout):
+            return False
+        # (making sure the tasks have exited, so their runtimes are final)
+        for node in self.nodes.values():
+            if node.task is not None and node.task.is_started():
+                node.task.join()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        return True
+
+    def run(self, timeout=None):
+        """
+        Start the graph, and wait for all nodes to be done.
+
+        :return: whether all nodes are done.
+        """
+        self.start()
+        return self.wait(timeout)
+
+    def cancel(self, reason=None):
+        """
+        Cancel the graph: the running tasks are cancelled, and the nodes not started yet are
+        cancelled without running.
+        """
+        if reason is None:
+            reason = 'graph cancelled'
+        with self._lock:
+            self._cancel_reason = reason
+            now = monotonic_ns()
+            running = [node for node in self.nodes.values() if node.status == 'running']
+            for node in self.nodes.values():
+                if node.status in ('pending', 'ready'):
+                    self._set_done(node, 'cancelled', None, CancelledError(reason), now)
+            self._ready.clear()
+        for node in running:
+            # (a node whose task is not created yet is cancelled by _start_nodes)
+            if node.task is not None:
+                node.task.cancel(reason)
+
+    def is_done(self):
+        return self._done_event.is_set()
+
+    ################################################################################
+    # outcome
+
+    @property
+    def results(self):
+        """ A dict mapping the names of the nodes which succeeded to their results. """
+        return {
+            name: node.result for name, node in self.nodes.items()
+            if node.status == 'succeeded'}
+
+    def failed_nodes(self):
+        """ The nodes which failed (not including nodes cancelled due to an upstream failure). """
+        return [node for node in self.nodes.values() if node.status == 'failed']
+
+    def reraise(self):
+        """
+        If any node failed, raise the exception of the first node to fail, in this current
+        (caller) thread.
+        """
+        failed = sorted(self.failed_nodes(), key=lambda node: node.end_ns)
+        if failed:
+            raise failed[0].exception
+
+    def critical_path(self):
+        """
+        The chain of nodes which determined the wall-clock time of the graph: the node which
+        finished last, the upstream node which finished last before it (i.e. the one which made
+        it ready), and so on.
+
+        :return: a list of ``GraphNode``s, from the first to run to the last.
+        """
+        ran = [node for node in self.nodes.values() if node.end_ns is not None]
+        if not ran:
+            return []
+        node = max(ran, key=lambda node: node.end_ns)
+        path = [node]
+        while node.deps:
+            node = max(
+                (self.nodes[dep] for dep in node.deps), key=lambda node: node.end_ns or 0)
+            path.append(node)
+        path.reverse()
+        return path
+
+    def format_report(self):
+        """
+        :return: a human-readable report of the nodes (in order of starting): their status, the
+            time they waited for a free slot, and their duration.  Nodes on the critical path
+            are marked with a ``*``.
+        """
+        critical = set(node.name for node in self.critical_path())
+        nodes = sorted(
+            self.nodes.values(),
+            key=lambda node: (node.start_ns is None, node.start_ns or 0))
+        lines = []
+        for node in nodes:
+            queued = node.queued_ns
+            duration = node.duration_ns
+            lines.append('%s %-24s %-10s queued %9s  ran %9s' % (
+                '*' if node.name in critical else ' ',
+                node.name,
+                node.status,
+                '-' if queued is None else '%.1fms' % (queued / 1e6),
+                '-' if duration is None else '%.1fms' % (duration / 1e6),
+            ))
+        return '\n'.join(lines)
+
+    ################################################################################
+    # implementation
+
+    def _validate(self):
+        for node in self.nodes.values():
+            for dep in node.deps:
+                if dep not in self.nodes:
+                    raise ValueError('Node %r depends on a missing node: %r' % (node.name, dep))
+        # detecting cycles (Kahn's algorithm: a cycle leaves nodes which never become ready)
+        num_waiting = {name: len(node.deps) for name, node in self.nodes.items()}
+        dependents = {name: [] for name in self.nodes}
+        for node in self.nodes.values():
+            for dep in node.deps:
+                dependents[dep].append(node.name)
+        ready = [name for name, n in num_waiting.items() if n == 0]
+        num_visited = 0
+        while ready:
+            name = ready.pop()
+            num_visited += 1
+            for dependent in dependents[name]:
+                num_waiting[dependent] -= 1
+                if num_waiting[dependent] == 0:
+                    ready.append(dependent)
+        if num_visited != len(self.nodes):
+            cycle = sorted(name for name, n in num_waiting.items() if n > 0)
+            raise ValueError('The graph has a cycle, among: %s' % ', '.join(cycle))
+
+    def _set_ready(self, node, now):
+        # called with the lock held
+        node.status = 'ready'
+        node.ready_ns = now
+        self._ready.append(node)
+
+    def _take_startable(self):
+        """
+        Take the ready nodes which can be started (there are free slots for them), and mark them
+        as running.  Called with the lock held.
+        """
+        nodes = []
+        while self._ready and (
+                self.max_concurrency is None or self._num_running < self.max_concurrency):
+            node = self._ready.popleft()
+            node.status = 'running'
+            self._num_running += 1
+            nodes.append(node)
+        return nodes
+
+    def _start_nodes(self, nodes):
+        # called without the lock held (creating and starting tasks can take a while), by the
+        # caller of start(), and then by the dispatcher thread
+        for node in nodes:
+            try:
+                args = [self.nodes[dep].result for dep in node.deps]
+                task = node.factory(*args)
+                node.task = task
+                node.start_ns = monotonic_ns()
+                task.future.add_done_callback(
+                    lambda fut, node=node: self._on_task_done(node, fut))
+                if self._cancel_reason is not None:
+                    # cancel() was called while creating the task: it aborts once started
+                    task.cancel(self._cancel_reason)
+                task.start()
+            except Exception as e:
+                self._on_node_done(node, 'failed', None, e)
+
+    def _on_task_done(self, node, fut):
+        # called in the thread of the task which finished (still running, so the work done here
+        # counts in its runtime: starting the next tasks is left to the dispatcher thread)
+        e = fut.exception()
+        if e is None:
+            self._on_node_done(node, 'succeeded', fut.result(), None)
+        elif isinstance(e, CancelledError):
+            self._on_node_done(node, 'cancelled', None, e)
+        else:
+            self._on_node_done(node, 'failed', None, e)
+
+    def _on_node_done(self, node, status, result, exception):
+        with self._lock:
+            if node.is_done():
+                return  # (cancelled by cancel(), before starting)
+            now = monotonic_ns()
+            self._num_running -= 1
+            self._set_done(node, status, result, exception, now)
+            if status == 'succeeded':
+                for dependent in node.dependents:
+                    dependent._num_waiting -= 1
+                    if dependent._num_waiting == 0 and dependent.status == 'pending':
+                        self._set_ready(dependent, now)
+            else:
+                self._cancel_downstream(node, now)
+            to_start = self._take_startable()
+        if to_start:
+            self._dispatcher.put(to_start)
+
+    def _cancel_downstream(self, node, now):
+        # called with the lock held
+        reason = 'upstream node %r %s' % (node.name, node.status)
+        stack = list(node.dependents)
+        while stack:
+            dependent = stack.pop()
+            if dependent.is_done():
+                continue
+            # (downstream nodes are never running or ready: an upstream node has not succeeded)
+            self._set_done(dependent, 'cancelled', None, CancelledError(reason), now)
+            stack.extend(dependent.dependents)
+
+    def _set_done(self, node, status, result, exception, now):
+        # called with the lock held
+        node.status = status
+        node.result = result
+        node.exception = exception
+        node.end_ns = now if node.start_ns is not None else None
+        self._num_done += 1
+        if self._num_done == len(self.nodes):
+            self._done_event.set()
+            if self._dispatcher is not None:
+                # (nothing left to start)
+                self._dispatcher.stop()
+
+
+################################################################################
@@ -0,0 +1,176 @@
+"""
+A shared deadline scheduler, for enforcing the expiry of many tasks cheaply.
+
+A ``DeadlineScheduler`` is a daemon thread which owns the deadlines of all the expiring tasks
+(``LimitedTimeTaskThread``, ``TimeoutTaskThread``, and their pool-task counterparts) registered
+with it, and marks each task as expired when its time is up.  The tasks then only need to check
+a flag in ``_stop_if_requested``, instead of reading the clock.
+
+Deadlines are kept in a hashed timer wheel: adding and removing a deadline is O(1), and each
+tick only processes the deadlines which fall in the current slot.  Deadlines are fired at most
+``resolution`` seconds late.
+"""
+
+import threading
+
+from .daemon import DaemonThread
+from .misc import monotonic_ns
+
+
+################################################################################
+
+class DeadlineHandle:
+    """
+    A deadline added to a ``DeadlineScheduler``.  Used for removing it.
+    """
+
+    __slots__ = ('deadline_ns', 'callback', '_slot')
+
+    def __init__(self, deadline_ns, callback):
+        self.deadline_ns = deadline_ns
+        self.callback = callback
+        self._slot = None
+
+    def __repr__(self):
+        return '<%s %d>' % (self.__class__.__name__, self.deadline_ns)
+
+
+class DeadlineScheduler(DaemonThread):
+    """
+    A daemon thread which calls callbacks when their deadlines arrive.
+
+    Deadlines are in ``monotonic_ns`` time.  Callbacks are called in the scheduler thread, so
+    they should be quick (e.g. set a flag).
+    """
+
+    resolution = 0.01
+    num_slots = 1024
+
+    def __init__(self, *, resolution=None, num_slots=None, **kwargs):
+        """
+        :param resolution: number of seconds per tick of the wheel.  Deadlines are fired at most
+            this late.
+        :param num_slots: number of slots in the wheel.
+        """
+        super().__init__(**kwargs)
+        if resolution is not None:
+            self.resolution = resolution
+        if num_slots is not None:
+            self.num_slots = num_slots
+        if self.resolution <= 0:
+            raise ValueError('Invalid resolution: %r' % self.resolution)
+        self._tick_ns = int(self.resolution * 1e9)
+        self._slots = [set() for _ in range(self.num_slots)]
+        self._size = 0
+        self._next_tick = None  # the next tick to process (once it has elapsed)
+        self._cond = threading.Condition()
+
+    ################################################################################
+    # interface
+
+    def add(self, deadline_ns, callback):
+        """
+        Schedule ``callback()`` to be called at ``deadline_ns`` (``monotonic_ns`` time).
+        Deadlines which already passed are fired on the next tick.
+
+        :return: a ``DeadlineHandle``, for passing to ``remove``.
+        """
+        handle = DeadlineHandle(deadline_ns, callback)
+        tick = deadline_ns // self._tick_ns
+        with self._cond:
+            if self._next_tick is None:
+                self._next_tick = monotonic_ns() // self._tick_ns
+            # a deadline before the next tick is processed on the next tick
+            slot = max(tick, self._next_tick) % self.num_slots
+            handle._slot = slot
+            self._slots[slot].add(handle)
+            self._size += 1
+            if self._size == 1:
+                self._cond.notify()
+        return handle
+
+    def remove(self, handle):
+        """
+        Remove a deadline, if it hasn't been fired yet.
+
+        :return: whether the deadline was removed (False if already fired, or removed).
+        """
+        with self._cond:
+            slot = self._slots[handle._slot]
+            if handle not in slot:
+                return False
+            slot.remove(handle)
+            self._size -= 1
+            return True
+
+    def __len__(self):
+        """ the number of pending deadlines """
+        return self._size
+
+    ################################################################################
+    # main
+
+    def _main_iteration(self):
+        with self._cond:
+            while not self._size:
+                if self._stopping_event.is_set():
+                    return
+                self._cond.wait()
+        self._fire(self._pop_due())
+        # sleep until the next tick elapses:
+        self._sleep(max(0., ((self._next_tick + 1) * self._tick_ns - monotonic_ns()) / 1e9))
+
+    def _pop_due(self):
+        now = monotonic_ns()
+        cur_tick = now // self._tick_ns
+        due = []
+        with self._cond:
+            # processing the ticks which have fully elapsed:
+            if cur_tick - self._next_tick > self.num_slots:
+                # fell behind by a full revolution (or more): check all slots once
+                ticks = range(cur_tick - self.num_slots, cur_tick)
+            else:
+                ticks = range(self._next_tick, cur_tick)
+            for tick in ticks:
+                slot = self._slots[tick % self.num_slots]
+                if not slot:
+                    continue
+                # the slot can also contain deadlines of future revolutions of the wheel:
+                slot_due = [handle for handle in slot if handle.deadline_ns <= now]
+                slot.difference_update(slot_due)
+                due.extend(slot_due)
+            self._size -= len(due)
+            self._next_tick = cur_tick
+        return due
+
+    def _fire(self, due):
+        for handle in due:
+            try:
+                handle.callback()
+            except Exception as e:
+                self.logger.exception('error in deadline callback %s', handle.callback, exc_info=e)
+
+    def _request_stop(self, reason=None):
+        super()._request_stop(reason=reason)
+        with self._cond:
+            self._cond.notify()
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_deadline_scheduler():
+    """
+    The ``DeadlineScheduler`` used by expiring tasks by default (created and started on first
+    use).
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = DeadlineScheduler(name='DeadlineScheduler')
+            _default_scheduler.start()
+        return _default_scheduler
+
+
+################################################################################
@@ -0,0 +1,461 @@
+"""
+Definitions of green (cooperative) tasks: many tasks multiplexed on a single scheduler thread,
+while keeping the *merethread* task interface.
+
+A ``GreenTask`` is a ``PoolTask`` whose ``_main`` is a generator (or a coroutine), which yields
+(or awaits) the value returned by ``_sleep`` or ``_stop_if_requested``.  This is where the task
+gives up control, and where it is stopped if cancelled or expired::
+
+    class PollingTask(GreenTask):
+        def _main(self):
+            while not self.is_ready():
+                yield self._sleep(1)
+            return self.fetch()
+
+    class AsyncPollingTask(GreenTask):
+        async def _main(self):
+            while not self.is_ready():
+                await self._sleep(1)
+            return self.fetch()
+
+A ``GreenTaskScheduler`` (a single daemon thread) runs the submitted tasks, taking turns.
+A sleeping task costs no more than its objects (no OS thread, no stack), so a single scheduler
+can run many thousands of mostly-sleeping tasks.  The tasks must not block: anything which
+takes long between two yields delays all other tasks of the scheduler.
+"""
+
+import heapq
+import inspect
+import itertools
+import threading
+import traceback
+import types
+from collections import deque
+
+from .thread import _ThreadStop
+from .daemon import DaemonThread
+from .task import _ExpiringTaskMixin
+from .pool import PoolTask
+from .misc import monotonic_ns
+
+
+################################################################################
+# Yielded values
+
+class _Sleep:
+    """
+    The value yielded (or awaited) by a green task, in order to sleep (``timeout=0`` for just
+    giving up control, or None for sleeping until cancelled).
+    """
+
+    __slots__ = ('timeout',)
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def __await__(self):
+        yield self
+
+
+_CHECKPOINT = _Sleep(0)
+
+
+def sleep(timeout=None):
+    """
+    The green-task equivalent of ``time.sleep``, for task functions which have no access to the
+    task (see ``GreenTaskScheduler.submit``).  Yield (or await) the returned value.
+    """
+    return _Sleep(timeout)
+
+
+def checkpoint():
+    """
+    Give up control, letting other tasks run.  Yield (or await) the returned value.
+    """
+    return _CHECKPOINT
+
+
+################################################################################
+# Tasks
+
+class GreenTask(PoolTask):
+    """
+    A task which runs on a ``GreenTaskScheduler``.
+
+    Same as a ``PoolTask``, except ``_main`` should be a generator function (or a coroutine
+    function), which yields (or awaits) ``self._sleep(...)`` and ``self._stop_if_requested()``.
+    If ``_main`` returns a plain value, the task completes immediately with that value.
+
+    Instead of calling ``start()``, pass the task to ``GreenTaskScheduler.submit_task()``.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._green_coro = None
+        self._green_seq = 0  # invalidates the entries of a sleep which ended early
+        self._green_waiting = False  # sleeping, i.e. not in the ready queue
+
+    ################################################################################
+    # main
+
+    @types.coroutine
+    def _green_run(self, scheduler):
+        """
+        The same as ``PoolTask._run``, as a coroutine, driven by the scheduler.
+        """
+        self._worker = scheduler
+        self._is_started = True
+        try:
+            with self._runtime:
+
+                result = None
+                exception = None
+
+                try:
+
+                    self._set_future_running()
+
+                    # pre-start checks
+                    if not self._stopping_event.is_set():
+                        # starting
+                        self._on_enter()
+                        # main
+                        result = self._main()
+                        if inspect.isgenerator(result) or inspect.iscoroutine(result):
+                            result = yield from result
+                    else:
+                        # task cancelled before we got a chance to start running
+                        self._handle_stop_before_start()
+
+                except _ThreadStop as e:
+                    # stop has been requested
+                    try:
+                        result = self._on_thread_stop(e)  # may raise or not
+                    except Exception as e2:
+                        exception = e2
+
+                except Exception as e:
+                    exception = e
+
+                finally:
+                    self._set_outcome(result, exception)
+        finally:
+            self._worker = None
+            self._green_coro = None
+            self._done_event.set()
+
+    def _green_check(self):
+        """
+        Called by the scheduler before resuming the task.
+
+        :return: the ``_ThreadStop`` to raise in the task, if it should stop, else None.
+        """
+        try:
+            self._check_stop_requested()
+        except _ThreadStop as e:
+            return e
+        return None
+
+    def _green_wake_ns(self, timeout):
+        """
+        :return: when to resume a task sleeping for ``timeout`` seconds (``monotonic_ns`` time),
+            or None for not resuming until cancelled.
+        """
+        if timeout is None:
+            return None
+        return monotonic_ns() + int(timeout * 1e9)
+
+    ################################################################################
+    # stopping
+
+    def _request_stop(self, reason=None):
+        super()._request_stop(reason=reason)
+        scheduler = self._worker
+        if scheduler is not None:
+            scheduler._wake(self)
+
+    def _stop_if_requested(self):
+        """
+        Raises `_ThreadStop`_ if the task has been cancelled.  Same as in Thread_.
+
+        :return: a value to yield (or await), for giving up control.
+        """
+        super()._stop_if_requested()
+        return _CHECKPOINT
+
+    def _sleep(self, timeout=None):
+        """
+        Sleep for ``timeout`` seconds (or indefinitely, if None), or until the task is cancelled.
+        Yield (or await) the returned value.
+
+        :raise _ThreadStop: if the task is cancelled prior to sleeping.  If cancelled while
+            sleeping, it is raised by the ``yield``.
+        """
+        if self._stopping_event.is_set():
+            raise _ThreadStop()
+        return _Sleep(timeout)
+
+    ################################################################################
+    # introspection
+
+    def get_current_stacktrace(self):
+        """
+        :return: a multiline string capturing the current stack-trace of the task (where it is
+            suspended), or None if not running.
+        """
+        coro = self._green_coro
+        if coro is None:
+            return None
+        frames = []
+        while coro is not None:
+            frame = getattr(coro, 'gi_frame', None) or getattr(coro, 'cr_frame', None)
+            if frame is not None:
+                frames.append((frame, frame.f_lineno))
+            coro = getattr(coro, 'gi_yieldfrom', None) or getattr(coro, 'cr_await', None)
+        return ''.join(traceback.format_list(traceback.StackSummary.extract(frames)))
+
+
+class FunctionGreenTask(GreenTask):
+    """
+    A ``GreenTask`` for running a given generator function (or coroutine function), the green
+    equivalent of ``FunctionThread``.
+
+    The function has no access to the task, so it should yield (or await) the module-level
+    ``sleep()`` and ``checkpoint()``.  The task is cancelled (and expires) at these points, same
+    as at ``_sleep`` and ``_stop_if_requested``.
+    """
+
+    def __init__(self, target, args=(), kwargs=None, *, name=None, **kw):
+        if name is None:
+            try:
+                name = target.__name__
+            except Exception:
+                name = str(target)
+        super().__init__(name=name, **kw)
+        self._target = target
+        self._args = args
+        self._kwargs = kwargs if kwargs is not None else {}
+
+    def _main(self):
+        try:
+            return self._target(*self._args, **self._kwargs)
+        finally:
+            # Avoid a refcycle if running a function with an argument that points to the task.
+            del self._target, self._args, self._kwargs
+
+
+class _ExpiringGreenTask(_ExpiringTaskMixin, GreenTask):
+    """
+    An abstract green task with a predefined expiry.
+    See `_ExpiringTaskMixin`_ for the supported ``expiry`` values.
+
+    The scheduler wakes the task when it expires, so the expiry is enforced without a
+    ``DeadlineScheduler``.
+    """
+
+    deadline_scheduler = False
+
+    def _sleep(self, timeout=None):
+        # not sleeping here (as _ExpiringTaskMixin._sleep does): the scheduler resumes the task
+        # when it expires (see _green_wake_ns)
+        self._check_expiry()
+        return GreenTask._sleep(self, timeout)
+
+    def _green_wake_ns(self, timeout):
+        expiry_wake_ns = monotonic_ns() + (self._expiry_ns - self._now_ns())
+        wake_ns = super()._green_wake_ns(timeout)
+        if wake_ns is None or wake_ns > expiry_wake_ns:
+            return expiry_wake_ns
+        return wake_ns
+
+
+class LimitedTimeGreenTask(_ExpiringGreenTask):
+    """
+    The green equivalent of ``LimitedTimeTaskThread``.
+    """
+
+    def _on_expiry(self):
+        return None
+
+
+class TimeoutGreenTask(_ExpiringGreenTask):
+    """
+    The green equivalent of ``TimeoutTaskThread``.
+    """
+
+    def _on_expiry(self):
+        raise TimeoutError()
+
+    def is_timed_out(self):
+        return self.is_expired()
+
+
+################################################################################
+# Scheduler
+
+class GreenTaskScheduler(DaemonThread):
+    """
+    A daemon thread running ``GreenTask``s, taking turns.
+
+    Tasks which are ready to run are resumed in order of arrival, one step (up to their next
+    yield) at a time.  Sleeping tasks are kept in a heap, and resumed when their sleep ends,
+    or immediately when cancelled.
+
+    When the scheduler is stopped, the tasks still running are cancelled, and the scheduler
+    exits once they finish.
+    """
+
+    FunctionTask = FunctionGreenTask
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._ready = deque()
+        self._sleeping = []  # a heap of (wake_ns, seq, green_seq, task)
+        self._seq = itertools.count()  # for breaking ties in the heap
+        self._incoming = deque()  # tasks submitted or woken, by other threads
+        self._tasks = set()  # tasks not done yet
+        self._cond = threading.Condition()
+
+    ################################################################################
+    # interface
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule a generator function (or a coroutine function) to run, as a
+        ``FunctionGreenTask``.
+
+        :return: the task's future.
+        """
+        return self.submit_task(self.FunctionTask(fn, args=args, kwargs=kwargs))
+
+    def submit_task(self, task):
+        """
+        Schedule a ``GreenTask`` to run.
+
+        :return: the task's future.
+        """
+        with self._cond:
+            if self._stopping_event.is_set():
+                raise RuntimeError('cannot schedule new tasks after stop')
+            task._set_submitted()
+            self._incoming.append(task)
+            self._cond.notify()
+        return task.future
+
+    def num_tasks(self):
+        """ the number of tasks submitted and not done yet """
+        with self._cond:
+            return len(self._tasks) + len(self._incoming)
+
+    def _wake(self, task):
+        # called (from any thread) when a task is cancelled
+        with self._cond:
+            self._incoming.append(task)
+            self._cond.notify()
+
+    def _request_stop(self, reason=None):
+        super()._request_stop(reason=reason)
+        with self._cond:
+            self._cond.notify()
+
+    ################################################################################
+    # main
+
+    def _main_iteration(self):
+        self._wait()
+        self._run_ready()
+
+    def _main_destroy(self):
+        # cancel the tasks still running, and let them finish
+        with self._cond:
+            self._accept_incoming()
+        for task in list(self._tasks):
+            task.cancel(reason='scheduler stopped')
+        while self._tasks:
+            with self._cond:
+                self._accept_incoming()
+            # not waiting for sleeps to end (the tasks are cancelled):
+            for task in self._tasks:
+                if task._green_waiting:
+                    self._make_ready(task)
+            self._sleeping = []
+            self._run_ready()
+        super()._main_destroy()
+
+    def _wait(self):
+        # wait until a task is ready, a sleep ends, or a task is submitted or woken
+        with self._cond:
+            if not self._ready and not self._incoming and not self._stopping_event.is_set():
+                timeout = None
+                if self._sleeping:
+                    timeout = max(0., (self._sleeping[0][0] - monotonic_ns()) / 1e9)
+                self._cond.wait(timeout)
+            self._accept_incoming()
+        # move the tasks whose sleep ended to the ready queue:
+        now = monotonic_ns()
+        sleeping = self._sleeping
+        while sleeping and sleeping[0][0] <= now:
+            _, _, green_seq, task = heapq.heappop(sleeping)
+            if green_seq == task._green_seq:
+                self._make_ready(task)
+
+    def _accept_incoming(self):
+        # called with the lock held
+        incoming = self._incoming
+        while incoming:
+            task = incoming.popleft()
+            if task._green_coro is None:
+                if task._is_started:
+                    continue  # done
+                # a new task
+                task._green_coro = task._green_run(self)
+                self._tasks.add(task)
+                self._ready.append(task)
+            elif task._green_waiting:
+                # woken (cancelled) while sleeping
+                self._make_ready(task)
+
+    def _make_ready(self, task):
+        task._green_seq += 1  # invalidates its entry in the heap, if any
+        task._green_waiting = False
+        self._ready.append(task)
+
+    def _run_ready(self):
+        # one step of each task ready to run (tasks which become ready run in the next round)
+        ready = self._ready
+        for _ in range(len(ready)):
+            self._step(ready.popleft())
+
+    def _step(self, task):
+        coro = task._green_coro
+        if coro is None:
+            return  # already done
+        try:
+            if not task._is_started:
+                value = coro.send(None)
+            else:
+                error = task._green_check()
+                value = coro.send(None) if error is None else coro.throw(error)
+            while not isinstance(value, _Sleep):
+                # not something a green task may yield: raising it in the task
+                value = coro.throw(TypeError(
+                    'green tasks should only yield _sleep() or _stop_if_requested(), got: %r' %
+                    (value,)))
+        except StopIteration:
+            self._tasks.discard(task)
+            return
+        except BaseException:
+            # an error in the task's hooks (errors in _main are the task's outcome)
+            self._tasks.discard(task)
+            raise
+        timeout = value.timeout
+        if timeout is not None and timeout <= 0:
+            self._ready.append(task)
+            return
+        task._green_waiting = True
+        wake_ns = task._green_wake_ns(timeout)
+        if wake_ns is not None:
+            heapq.heappush(self._sleeping, (wake_ns, next(self._seq), task._green_seq, task))
+
+
+################################################################################
@@ -0,0 +1,267 @@
+"""
+Definitions of thread-group types: a set of threads which are managed as a single unit.
+"""
+
+import time
+import threading
+from concurrent.futures import Future
+import lo99ing
+
+from .daemon import QueueEventLoopThread
+
+
+################################################################################
+
+class _ShardWorkerThread(QueueEventLoopThread):
+    """
+    A worker (shard) of a ``ShardedEventLoopGroup``, delegating event handling to the group.
+    """
+
+    def __init__(self, group, shard, **kwargs):
+        super().__init__(**kwargs)
+        self.group = group
+        self.shard = shard
+
+    def _handle_event(self, item):
+        key, event = item
+        try:
+            self.group._handle_event(event)
+        finally:
+            self.group._on_event_done(key)
+
+    def _on_event_error(self, item, e):
+        key, event = item
+        self.group._on_event_error(event, e)
+
+    def _on_event_evicted(self, item):
+        key, event = item
+        self.group._on_event_done(key)
+
+
+class ShardedEventLoopGroup:
+    """
+    A group of ``QueueEventLoopThread`` workers (shards), for handling events concurrently, while
+    preserving the order of events with the same key.
+
+    Each event put in the group is routed to a single shard, according to a *key* extracted
+    from it (e.g. an account id).  All events with the same key are handled by the same worker,
+    in the order they were put.  Events with different keys are handled concurrently.
+
+    A concrete group is a subclass of ``ShardedEventLoopGroup`` which overrides ``_handle_event``
+    (and optionally ``_get_event_key`` and ``_on_event_error``).  These are called in the worker
+    threads, so they must be thread-safe with respect to each other.
+
+    By default, keys are assigned to shards by hashing.  If ``rebalance=True``, keys are
+    assigned dynamically instead: a key is assigned to the least-loaded shard when an event is put
+    while no events with the same key are pending, and stays assigned to it for as long as it has
+    pending events.  This keeps hot shards from accumulating idle keys, while still preserving
+    per-key order.  Events dropped by the overflow policy of a bounded worker queue no longer
+    count as pending.
+
+    The group supports the thread life-cycle interface (``start``, ``stop``, ``join``,
+    ``future``), applied to all workers.
+    """
+
+    Worker = _ShardWorkerThread
+
+    def __init__(self, num_shards, *, key=None, rebalance=False, name=None, logger=None,
+                 **worker_kwargs):
+        """
+        :param num_shards: number of worker threads.
+        :param key: a function for extracting the key of an event.  If not passed,
+            ``_get_event_key`` is used.
+        :param rebalance: assign keys to shards dynamically, instead of by hashing.
+        :param name: used as a prefix for worker thread names.
+        :param worker_kwargs: extra kwargs to pass to the worker threads (e.g. ``capacity``).
+            Each worker creates its own queue: to choose the queue backend, override the
+            ``Queue`` class attribute of the ``Worker`` class.
+        """
+        if num_shards < 1:
+            raise ValueError('Invalid num_shards: %r' % num_shards)
+        if 'queue' in worker_kwargs:
+            # a single queue would be shared by all workers, breaking the per-key order
+            raise ValueError('queue cannot be passed to the workers of %s (set the Queue '
+                             'attribute of its Worker class, or pass capacity instead)'
+                             % type(self).__name__)
+        if key is not None:
+            self._get_event_key = key
+        if name is None:
+            name = type(self).__name__
+        self.name = name
+        if logger is None:
+            logger = lo99ing.get_logger(name)
+        self.logger = logger
+        self.rebalance = rebalance
+        self._workers = [
+            self._create_worker(shard, name='%s-%d' % (name, shard), **worker_kwargs)
+            for shard in range(num_shards)
+        ]
+        # key -> [shard, num pending events].  Only used if rebalance=True.
+        self._assignments = {}
+        self._lock = threading.Lock()
+        self._future = None
+
+    def _create_worker(self, shard, **kwargs):
+        return self.Worker(self, shard, **kwargs)
+
+    ################################################################################
+    # abstract and customizable methods
+
+    def _get_event_key(self, event):
+        """
+        Extract the key of the event, which determines which shard handles it.
+        By default, the event itself is used as the key.
+        """
+        return event
+
+    def _handle_event(self, event):
+        """
+        Handle the event.  Called in the worker thread the event is routed to.
+        """
+        raise NotImplementedError('_handle_event() not defined for %s' % self.__class__.__name__)
+
+    def _on_event_error(self, event, e):
+        """
+        Called when ``_handle_event`` raises an exception.  Called in the worker thread.
+
+        If this method raises an exception, the worker's ``_on_error`` is called to handle it.
+        """
+        self.logger.exception('error handling event: %s', event, exc_info=e)
+
+    ################################################################################
+    # producer interface
+
+    def put(self, event, block=True, timeout=None):
+        """
+        Put an event in the queue of the shard its key is mapped to.  Can be called from
+        any thread.
+
+        :return: whether the event was queued (False if it was dropped, by the overflow policy
+            of a bounded worker queue).
+        """
+        key = self._get_event_key(event)
+        if not self.rebalance:
+            return self._workers[hash(key) % len(self._workers)].put((key, event), block, timeout)
+        shard = self._acquire_shard(key)
+        try:
+            queued = self._workers[shard].put((key, event), block, timeout)
+        except BaseException:
+            self._on_event_done(key)
+            raise
+        if not queued:
+            self._on_event_done(key)
+        return queued
+
+    def put_nowait(self, event):
+        return self.put(event, block=False)
+
+    def shard_of(self, key):
+        """
+        The index of the shard events with the given key are routed to (currently).
+        """
+        if self.rebalance:
+            with self._lock:
+                assignment = self._assignments.get(key)
+            if assignment is not None:
+                return assignment[0]
+            return None
+        return hash(key) % len(self._workers)
+
+    def qsizes(self):
+        """
+        A list of the number of events waiting in the queue of each shard.
+        """
+        return [worker.qsize() for worker in self._workers]
+
+    def _acquire_shard(self, key):
+        with self._lock:
+            assignment = self._assignments.get(key)
+            if assignment is None:
+                # the key is idle, so it can go to any shard.  choosing the least-loaded one.
+                shard = min(range(len(self._workers)), key=lambda i: self._workers[i].qsize())
+                assignment = self._assignments[key] = [shard, 0]
+            assignment[1] += 1
+            return assignment[0]
+
+    def _on_event_done(self, key):
+        if not self.rebalance:
+            return
+        with self._lock:
+            assignment = self._assignments[key]
+            assignment[1] -= 1
+            if assignment[1] == 0:
+                del self._assignments[key]
+
+    ################################################################################
+    # life-cycle
+
+    @property
+    def workers(self):
+        return tuple(self._workers)
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+
+    def stop(self, reason=None):
+        """
+        Signal all workers to stop.  Events still pending in the queues are not handled.
+        """
+        for worker in self._workers:
+            worker.stop(reason=reason)
+
+    def join(self, timeout=None):
+        """
+        Wait for all workers to finish.
+
+        :return: False iff returned due to a timeout.
+        """
+        end_time = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            remaining = None if end_time is None else max(0, end_time - time.monotonic())
+            if not worker.join(remaining):
+                return False
+        return True
+
+    def is_alive(self):
+        return any(worker.is_alive() for worker in self._workers)
+
+    @property
+    def future(self):
+        """
+        A ``Future`` which is done when all workers are done.
+
+        If any of the workers aborted, the future's exception is set to the exception of the
+        first of them.  Else, its result is set to None.
+        """
+        with self._lock:
+            if self._future is None:
+                self._future = self._create_future()
+            return self._future
+
+    def _create_future(self):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        pending = [len(self._workers)]
+        lock = threading.Lock()
+
+        def on_worker_done(_):
+            with lock:
+                pending[0] -= 1
+                if pending[0]:
+                    return
+            for worker in self._workers:
+                if worker.exception is not None:
+                    future.set_exception(worker.exception)
+                    return
+            future.set_result(None)
+
+        for worker in self._workers:
+            worker.future.add_done_callback(on_worker_done)
+        return future
+
+    def __repr__(self):
+        return '<%s %s [%d shards]>' % (self.__class__.__name__, self.name, len(self._workers))
+
+
+################################################################################
@@ -0,0 +1,246 @@
+"""
+Logging utilities: loggers shared per thread class, and an off-thread logging pipeline.
+
+Loggers
+-------
+By default, each thread gets a logger named after the thread (``logger_mode='name'``).  With
+many short-lived threads (or tasks) with unique names, this creates a logger per thread, and
+loggers are never freed.  With ``logger_mode='class'``, all threads of a class share a single
+logger, named after the class, and each thread logs through a ``ThreadLoggerAdapter``, which
+adds the thread name to the messages (and as the ``thread_name`` attribute of the records).
+Either way, the logger is only created when the thread first logs.
+
+Off-thread logging
+------------------
+A ``LogWriterThread`` moves the formatting and I/O of log records off the threads which log:
+``install()`` replaces the handlers of a logger (the root logger, by default) with a
+``LogQueueHandler``, which only puts the records in a bounded queue, and the writer thread
+passes them to the original handlers.  When the queue is full, records are handled according
+to the ``drop_policy``, and the number of records dropped is reported (by the writer thread).
+
+:note: records are queued as-is, and their messages are formatted in the writer thread, so the
+    arguments of a log call should not be modified after the call.
+"""
+
+import logging
+import queue
+import threading
+import lo99ing
+
+from .thread import LOGGER_MODES
+from .daemon import QueueEventLoopThread
+from .queues import RingBufferEventQueue
+
+LOGGER_MODES  # pyflakes
+
+
+################################################################################
+# Loggers
+
+class ThreadLoggerAdapter(logging.LoggerAdapter):
+    """
+    A ``LoggerAdapter`` for logging through a logger shared by many threads: adds the thread
+    name to the messages, and as the ``thread_name`` attribute of the records.
+    """
+
+    def __init__(self, logger, thread_name):
+        super().__init__(logger, {'thread_name': thread_name})
+        self.thread_name = thread_name
+        self._prefix = '%s: ' % thread_name.replace('%', '%%')
+
+    def process(self, msg, kwargs):
+        extra = kwargs.get('extra')
+        kwargs['extra'] = self.extra if extra is None else dict(self.extra, **extra)
+        return self._prefix + str(msg), kwargs
+
+
+_class_loggers = {}  # class -> logger
+_class_loggers_lock = threading.Lock()
+
+
+def get_class_logger(cls):
+    """
+    :return: the logger shared by the threads of class ``cls`` (created on first use).
+    """
+    logger = _class_loggers.get(cls)
+    if logger is None:
+        with _class_loggers_lock:
+            logger = _class_loggers.get(cls)
+            if logger is None:
+                logger = _class_loggers[cls] = lo99ing.get_logger(cls.__name__)
+    return logger
+
+
+def get_thread_logger(thread, logger_name=None, logger_mode='name'):
+    """
+    Create the logger of a thread (or a task).
+
+    :param logger_name: if passed, the logger with this name is used.
+    :param logger_mode: see ``LOGGER_MODES`` and the module docstring.
+    """
+    if logger_name is not None:
+        return lo99ing.get_logger(logger_name)
+    if logger_mode == 'name':
+        return lo99ing.get_logger('%s' % thread.name)
+    elif logger_mode == 'class':
+        return ThreadLoggerAdapter(get_class_logger(type(thread)), '%s' % thread.name)
+    else:
+        raise ValueError('Invalid logger_mode: %r' % logger_mode)
+
+
+################################################################################
+# Off-thread logging
+
+class LogQueueHandler(logging.Handler):
+    """
+    A logging handler which passes the records to a ``LogWriterThread``.
+    """
+
+    def __init__(self, writer, level=logging.NOTSET):
+        super().__init__(level=level)
+        self.writer = writer
+
+    def emit(self, record):
+        self.writer.enqueue(record)
+
+    def handle(self, record):
+        # skipping Handler.handle, which takes the handler's lock: the queue is thread-safe
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+
+class LogWriterThread(QueueEventLoopThread):
+    """
+    A daemon thread which passes log records, queued by a ``LogQueueHandler``, to the actual
+    handlers.  See the module docstring.
+
+    When stopped, it handles the records already queued before exiting.
+    """
+
+    DROP_POLICIES = ('drop', 'drop_oldest', 'block')
+
+    # max number of records queued.  Can also be passed to the constructor.
+    capacity = 10000
+    # what to do with a record when the queue is full: 'drop' it, drop the oldest record queued
+    # ('drop_oldest'), or 'block' until there is room.  Can also be passed to the constructor.
+    drop_policy = 'drop'
+
+    def __init__(self, handlers=(), *, capacity=None, drop_policy=None, **kwargs):
+        """
+        :param handlers: the handlers to pass the records to.  ``install()`` adds the handlers of
+            the logger it is installed on.
+        :param capacity: see ``capacity`` above.
+        :param drop_policy: see ``drop_policy`` above.
+        """
+        if capacity is not None:
+            self.capacity = capacity
+        if drop_policy is not None:
+            self.drop_policy = drop_policy
+        if self.drop_policy not in self.DROP_POLICIES:
+            raise ValueError('Invalid drop_policy: %r' % self.drop_policy)
+        super().__init__(queue=RingBufferEventQueue(self.capacity), **kwargs)
+        self.handlers = list(handlers)
+        self.num_dropped = 0
+        self._num_dropped_reported = 0
+        self._drop_lock = threading.Lock()
+        self._installed = None  # (logger, handler, original_handlers) while installed
+
+    ################################################################################
+    # interface
+
+    def install(self, logger=None):
+        """
+        Move the handlers of ``logger`` (the root logger, by default) to this thread, replacing
+        them with a ``LogQueueHandler``.  Starts the thread, if not started.
+
+        :return: self
+        """
+        if self._installed is not None:
+            raise RuntimeError('%s is already installed' % self.name)
+        if logger is None:
+            logger = logging.getLogger()
+        handler = LogQueueHandler(self)
+        original_handlers = list(logger.handlers)
+        self.handlers.extend(original_handlers)
+        for h in original_handlers:
+            logger.removeHandler(h)
+        logger.addHandler(handler)
+        self._installed = (logger, handler, original_handlers)
+        if not self.is_started():
+            self.start()
+        return self
+
+    def uninstall(self, timeout=None):
+        """
+        Restore the handlers of the logger ``install()`` was called on, and stop the thread
+        (after handling the records already queued).
+        """
+        if self._installed is not None:
+            logger, handler, original_handlers = self._installed
+            self._installed = None
+            logger.removeHandler(handler)
+            for h in original_handlers:
+                logger.addHandler(h)
+        self.stop()
+        if self.is_started():
+            self.join(timeout)
+
+    def enqueue(self, record):
+        """
+        Queue a record, according to the ``drop_policy``.
+
+        :return: whether the record was queued.
+        """
+        q = self.queue
+        if self.drop_policy == 'drop_oldest':
+            # (making room atomically, and keeping a pending wake-up of the writer thread, which
+            # a get() could consume, making the writer miss a stop)
+            if q.put_drop_oldest(record):
+                with self._drop_lock:
+                    self.num_dropped += 1
+            return True
+        # (never blocking the writer thread itself, which is the one making room)
+        block = self.drop_policy == 'block' and threading.get_ident() != self.ident
+        try:
+            q.put(record, block=block)
+            return True
+        except queue.Full:
+            pass
+        with self._drop_lock:
+            self.num_dropped += 1
+        return False
+
+    ################################################################################
+    # event loop implementation
+
+    def _handle_event(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        if self.num_dropped != self._num_dropped_reported:
+            self._report_dropped()
+
+    def _report_dropped(self):
+        num_dropped = self.num_dropped
+        n = num_dropped - self._num_dropped_reported
+        self._num_dropped_reported = num_dropped
+        record = logging.LogRecord(
+            self.name, logging.WARNING, __file__, 0,
+            'log queue full: dropped %d records', (n,), None)
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _main_destroy(self):
+        # handle the records already queued
+        while True:
+            record = self.queue.get(timeout=0)
+            if record is None:
+                break
+            self._handle_event(record)
+        super()._main_destroy()
+
+
+################################################################################
@@ -0,0 +1,485 @@
+"""
+Metrics of threads, aggregated per thread class, and exported in the Prometheus text format.
+
+Metrics are disabled by default, and cost (next to) nothing when disabled.  They are enabled
+per thread class by setting the ``metrics`` class attribute, or per thread by passing the
+``metrics`` argument, to either True (using the default ``MetricsRegistry``) or a
+``MetricsRegistry``.  Setting ``Thread.metrics = True`` enables them for all threads.
+
+The following metrics are collected (labeled by the thread class):
+
+- all threads: outcomes (``result``, ``aborted``, ``cancelled``, ``expired``) and durations
+  (start to finish).
+- ``DaemonThread``: durations of ``_main_iteration``, and number of errors (``_on_error`` calls).
+- ``EventLoopThread``: number of events read, handled, and failed (``_on_event_error`` calls),
+  latency of ``_handle_event``, and number of idle reads (``_read_next_event`` returning None).
+  For ``BatchEventLoopThread``, only the number of events read and handled, and of idle reads.
+- ``PeriodicDaemonThread``: number of ticks run and missed, and lateness of ticks (relative to
+  their scheduled times).  The durations of ``_main_iteration`` are the durations of the ticks.
+- ``QueueEventLoopThread`` with a bounded queue (``capacity``): number of events dropped and
+  rejected, durations producers blocked on a full queue, and number of times the queue reached
+  its high water mark.
+- ``CoalescingEventLoopThread``: number of events coalesced (merged into pending events).
+
+The metrics can be exposed using ``MetricsHTTPServerThread`` (serving them over HTTP) or
+``MetricsFileWriterThread`` (writing them to a file periodically, e.g. for the textfile
+collector of the Prometheus node exporter).
+"""
+
+import os
+from bisect import bisect_left
+import threading
+from concurrent.futures import CancelledError
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from .daemon import DaemonThread
+
+
+################################################################################
+# Metric types
+
+class Counter:
+    """
+    A monotonically increasing count.
+
+    Not thread-safe on its own: it is updated under the lock of the ``ThreadClassMetrics`` it
+    belongs to (which allows updating several metrics under a single lock acquisition).
+    """
+
+    def __init__(self, value=0):
+        self.value = value
+
+    def inc(self, n=1):
+        self.value += n
+
+    def copy(self):
+        return Counter(self.value)
+
+
+class Histogram:
+    """
+    Counts of observed values, in buckets, Prometheus-style (cumulative upper bounds).
+
+    Not thread-safe on its own, same as ``Counter``.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # the last is the +Inf bucket
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative_counts(self):
+        """
+        :return: a list of ``(upper_bound, cumulative_count)`` pairs, the last one being
+            ``(inf, count)``.
+        """
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def copy(self):
+        h = Histogram(self.buckets)
+        h.counts = list(self.counts)
+        h.sum = self.sum
+        h.count = self.count
+        return h
+
+
+EVENT_LATENCY_BUCKETS = (.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5, 10)
+RUNTIME_BUCKETS = (.01, .1, 1, 10, 60, 600, 3600, 86400)
+
+
+################################################################################
+# Per-class metrics
+
+class ThreadClassMetrics:
+    """
+    The metrics of all threads of a single class.
+
+    The metrics are updated by the threads using the ``record_*`` methods, each of which takes
+    the lock once.  Use ``copy()`` for reading a consistent snapshot.
+    """
+
+    OUTCOMES = ('result', 'aborted', 'cancelled', 'expired')
+
+    _METRIC_ATTRS = (
+        'runtime', 'iteration_duration', 'errors', 'events_read', 'events_handled',
+        'event_errors', 'idle_reads', 'event_latency', 'ticks', 'missed_ticks', 'tick_lateness',
+        'dropped_events', 'rejected_events', 'producer_blocked', 'high_water_marks',
+        'coalesced_events')
+
+    def __init__(self, class_name):
+        self.class_name = class_name
+        self.outcomes = {outcome: Counter() for outcome in self.OUTCOMES}
+        self.runtime = Histogram(RUNTIME_BUCKETS)
+        self.iteration_duration = Histogram(EVENT_LATENCY_BUCKETS)
+        self.errors = Counter()
+        self.events_read = Counter()
+        self.events_handled = Counter()
+        self.event_errors = Counter()
+        self.idle_reads = Counter()
+        self.event_latency = Histogram(EVENT_LATENCY_BUCKETS)
+        self.ticks = Counter()
+        self.missed_ticks = Counter()
+        self.tick_lateness = Histogram(EVENT_LATENCY_BUCKETS)
+        self.dropped_events = Counter()
+        self.rejected_events = Counter()
+        self.producer_blocked = Histogram(EVENT_LATENCY_BUCKETS)
+        self.high_water_marks = Counter()
+        self.coalesced_events = Counter()
+        self._lock = threading.Lock()
+
+    def record_exit(self, thread, runtime_ns):
+        """
+        Record the outcome and duration of a thread (or task) which is finishing.
+        """
+        outcome = get_outcome(thread)
+        with self._lock:
+            self.outcomes[outcome].inc()
+            if runtime_ns is not None:
+                self.runtime.observe(runtime_ns / 1e9)
+
+    def record_iteration(self, duration):
+        with self._lock:
+            self.iteration_duration.observe(duration)
+
+    def record_error(self):
+        with self._lock:
+            self.errors.inc()
+
+    def record_idle_read(self, duration=None):
+        with self._lock:
+            self.idle_reads.inc()
+            if duration is not None:
+                self.iteration_duration.observe(duration)
+
+    def record_event(self, latency, failed, iteration_duration=None):
+        """
+        Record an event read and handled by an event-loop thread.
+        """
+        # this is called for every event, so the updates are inlined
+        with self._lock:
+            self.events_read.value += 1
+            self.events_handled.value += 1
+            if failed:
+                self.event_errors.value += 1
+            h = self.event_latency
+            h.counts[bisect_left(h.buckets, latency)] += 1
+            h.sum += latency
+            h.count += 1
+            if iteration_duration is not None:
+                h = self.iteration_duration
+                h.counts[bisect_left(h.buckets, iteration_duration)] += 1
+                h.sum += iteration_duration
+                h.count += 1
+
+    def record_batch(self, num_events, iteration_duration=None):
+        """
+        Record a batch of events read and handled by a batch event-loop thread.
+        """
+        with self._lock:
+            self.events_read.inc(num_events)
+            self.events_handled.inc(num_events)
+            if iteration_duration is not None:
+                self.iteration_duration.observe(iteration_duration)
+
+    def record_tick(self, lateness, missed, duration):
+        """
+        Record a tick run by a periodic thread.
+        """
+        with self._lock:
+            self.ticks.inc()
+            self.missed_ticks.inc(missed)
+            self.tick_lateness.observe(lateness)
+            self.iteration_duration.observe(duration)
+
+    def record_overflow(self, dropped=0, rejected=0, blocked_time=None, high_water=0):
+        """
+        Record an overflow of a bounded input queue (see ``merethread.queues.BoundedEventQueue``).
+        """
+        with self._lock:
+            self.dropped_events.inc(dropped)
+            self.rejected_events.inc(rejected)
+            if blocked_time is not None:
+                self.producer_blocked.observe(blocked_time)
+            self.high_water_marks.inc(high_water)
+
+    def record_coalesced(self, num_events=1):
+        """
+        Record events merged into pending events of a coalescing input queue (see
+        ``merethread.queues.CoalescingEventQueue``).
+        """
+        with self._lock:
+            self.coalesced_events.inc(num_events)
+
+    def copy(self):
+        """
+        :return: a snapshot of the metrics (a ``ThreadClassMetrics``).
+        """
+        other = ThreadClassMetrics(self.class_name)
+        with self._lock:
+            other.outcomes = {k: c.copy() for k, c in self.outcomes.items()}
+            for attr in self._METRIC_ATTRS:
+                setattr(other, attr, getattr(self, attr).copy())
+        return other
+
+
+def get_outcome(task):
+    """
+    The outcome of a thread (or task) which finished: one of ``ThreadClassMetrics.OUTCOMES``.
+    """
+    if getattr(task, '_expired', False):
+        return 'expired'
+    e = task.exception
+    if e is None:
+        return 'result'
+    if isinstance(e, CancelledError):
+        return 'cancelled'
+    return 'aborted'
+
+
+################################################################################
+# Registry
+
+class MetricsRegistry:
+    """
+    Holds the metrics of thread classes, and exports them in the Prometheus text format.
+    """
+
+    def __init__(self, prefix='merethread'):
+        self.prefix = prefix
+        self._classes = {}  # class name -> ThreadClassMetrics
+        self._lock = threading.Lock()
+
+    def get_class_metrics(self, cls):
+        """
+        :param cls: a thread class, or a class name.
+        :return: the ``ThreadClassMetrics`` of the class (created on first use).
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        with self._lock:
+            metrics = self._classes.get(cls)
+            if metrics is None:
+                metrics = self._classes[cls] = ThreadClassMetrics(cls)
+            return metrics
+
+    @property
+    def class_metrics(self):
+        """ a dict mapping class names to their ``ThreadClassMetrics`` """
+        with self._lock:
+            return dict(self._classes)
+
+    ################################################################################
+    # export
+
+    # (attribute, name, type, help)
+    _METRICS = [
+        ('outcomes', 'thread_outcomes_total', 'counter',
+            'Threads and tasks which finished, by outcome.'),
+        ('runtime', 'thread_runtime_seconds', 'histogram',
+            'Durations of threads and tasks, from start to finish.'),
+        ('iteration_duration', 'main_iteration_seconds', 'histogram',
+            'Durations of daemon-thread main-loop iterations.'),
+        ('errors', 'errors_total', 'counter',
+            'Errors handled by daemon threads (_on_error calls).'),
+        ('events_read', 'events_read_total', 'counter',
+            'Events read by event-loop threads.'),
+        ('events_handled', 'events_handled_total', 'counter',
+            'Events handled by event-loop threads (including failed ones).'),
+        ('event_errors', 'event_errors_total', 'counter',
+            'Events which failed to be handled (_on_event_error calls).'),
+        ('idle_reads', 'idle_reads_total', 'counter',
+            'Calls to _read_next_event which returned no event.'),
+        ('event_latency', 'event_handling_seconds', 'histogram',
+            'Durations of handling events.'),
+        ('ticks', 'ticks_total', 'counter',
+            'Ticks run by periodic threads.'),
+        ('missed_ticks', 'missed_ticks_total', 'counter',
+            'Ticks missed by periodic threads (skipped or coalesced).'),
+        ('tick_lateness', 'tick_lateness_seconds', 'histogram',
+            'Lateness of ticks of periodic threads, relative to their scheduled times.'),
+        ('dropped_events', 'dropped_events_total', 'counter',
+            'Events dropped by the overflow policies of bounded input queues.'),
+        ('rejected_events', 'rejected_events_total', 'counter',
+            'Events rejected by full bounded input queues (queue.Full raised to producers).'),
+        ('producer_blocked', 'producer_blocked_seconds', 'histogram',
+            'Durations producers blocked on full bounded input queues.'),
+        ('high_water_marks', 'high_water_marks_total', 'counter',
+            'Times bounded input queues reached their high water marks.'),
+        ('coalesced_events', 'coalesced_events_total', 'counter',
+            'Events merged into pending events with the same key, by coalescing input queues.'),
+    ]
+
+    def to_prometheus(self):
+        """
+        :return: the metrics, in the Prometheus text exposition format.
+        """
+        classes = sorted(
+            (name, metrics.copy()) for name, metrics in self.class_metrics.items())
+        lines = []
+        for attr, name, type, help in self._METRICS:
+            name = '%s_%s' % (self.prefix, name)
+            lines.append('# HELP %s %s' % (name, help))
+            lines.append('# TYPE %s %s' % (name, type))
+            for class_name, metrics in classes:
+                labels = 'thread_class="%s"' % _escape_label(class_name)
+                metric = getattr(metrics, attr)
+                if isinstance(metric, dict):
+                    for key, counter in sorted(metric.items()):
+                        lines.append('%s{%s,outcome="%s"} %d' % (name, labels, key, counter.value))
+                elif isinstance(metric, Histogram):
+                    for bound, count in metric.get_cumulative_counts():
+                        lines.append('%s_bucket{%s,le="%s"} %d' % (
+                            name, labels, _format_bound(bound), count))
+                    lines.append('%s_sum{%s} %r' % (name, labels, metric.sum))
+                    lines.append('%s_count{%s} %d' % (name, labels, metric.count))
+                else:
+                    lines.append('%s{%s} %d' % (name, labels, metric.value))
+        return '\n'.join(lines) + '\n'
+
+    def write_to_file(self, path):
+        """
+        Write the metrics to a file, atomically (readers never see a partially-written file).
+        """
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def _escape_label(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_bound(bound):
+    if bound == float('inf'):
+        return '+Inf'
+    return repr(float(bound))
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_default_metrics_registry():
+    """
+    The ``MetricsRegistry`` used by threads created with ``metrics=True``.
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = MetricsRegistry()
+        return _default_registry
+
+
+def get_class_metrics(thread, metrics):
+    """
+    Resolve the ``metrics`` option of a thread (or task) to its ``ThreadClassMetrics``, or None
+    if metrics are disabled.
+    """
+    if not metrics:
+        return None
+    if metrics is True:
+        metrics = get_default_metrics_registry()
+    return metrics.get_class_metrics(type(thread))
+
+
+################################################################################
+# Exporters
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.registry.to_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # no access log
+
+
+class MetricsHTTPServerThread(DaemonThread):
+    """
+    A daemon thread serving the metrics of a ``MetricsRegistry`` over HTTP (at ``/metrics``),
+    for scraping by Prometheus.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, *, host='127.0.0.1', port=9464, registry=None, **kwargs):
+        """
+        :param port: the port to listen on.  If 0, an arbitrary free port is used (see
+            ``server_address``).
+        :param registry: defaults to ``get_default_metrics_registry()``.
+        """
+        super().__init__(**kwargs)
+        if registry is None:
+            registry = get_default_metrics_registry()
+        self._server = HTTPServer((host, port), _MetricsRequestHandler)
+        self._server.timeout = self.poll_interval
+        self._server.registry = registry
+
+    @property
+    def server_address(self):
+        """ the ``(host, port)`` the server listens on """
+        return self._server.server_address
+
+    def _main_iteration(self):
+        # returns after handling a request, or after poll_interval with no requests
+        self._server.handle_request()
+
+    def _main_destroy(self):
+        self._server.server_close()
+
+    def _handle_stop_before_start(self):
+        super()._handle_stop_before_start()
+        self._server.server_close()
+
+
+class MetricsFileWriterThread(DaemonThread):
+    """
+    A daemon thread writing the metrics of a ``MetricsRegistry`` to a file periodically (and
+    when stopping), e.g. for the textfile collector of the Prometheus node exporter.
+    """
+
+    interval = 15.
+
+    def __init__(self, path, *, interval=None, registry=None, **kwargs):
+        """
+        :param path: the file to write to.
+        :param interval: number of seconds between writes.
+        :param registry: defaults to ``get_default_metrics_registry()``.
+        """
+        super().__init__(**kwargs)
+        if registry is None:
+            registry = get_default_metrics_registry()
+        self.path = path
+        if interval is not None:
+            self.interval = interval
+        self.registry = registry
+
+    def _main_iteration(self):
+        self.registry.write_to_file(self.path)
+        self._sleep(self.interval)
+
+    def _main_destroy(self):
+        self.registry.write_to_file(self.path)
+
+
+################################################################################
@@ -3,37 +3,108 @@ Miscellaneous tools used in this package.
 """
 
 import sys
+import time
+import threading
 import traceback
 import datetime
 import cProfile
 
 
+################################################################################
+# clocks
+
+monotonic_ns = time.monotonic_ns
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def timedelta_to_ns(td):
+    """ convert a timedelta to integer nanoseconds """
+    return td // _MICROSECOND * 1000
+
+
+def ns_to_timedelta(ns):
+    """ convert integer nanoseconds to a timedelta (truncated to microseconds) """
+    return datetime.timedelta(microseconds=ns // 1000)
+
+
+def get_clock_ns(clock=None):
+    """
+    Get a function returning the current time in integer nanoseconds, used for measuring
+    durations and enforcing deadlines.
+
+    :param clock: if None, the monotonic clock is used (``time.monotonic_ns``), which is not
+        affected by system clock adjustments.  Else, a custom clock (a function returning a
+        ``datetime``, or a number of seconds), which is converted to nanoseconds.
+    """
+    if clock is None:
+        return monotonic_ns
+
+    def clock_ns():
+        t = clock()
+        if isinstance(t, datetime.datetime):
+            return timedelta_to_ns(t.replace(tzinfo=None) - _EPOCH)
+        return int(t * 1e9)
+
+    return clock_ns
+
+
 ################################################################################
 
 class Runtime:
     """
     A context-manager which records block-execution start-time and end-time.
+
+    Start and end times are recorded twice: as timestamps of ``clock`` (``start`` and ``end``,
+    wall-clock ``datetime`` by default), which are meant for display, and as integer
+    nanoseconds (``start_ns`` and ``end_ns``), which are used for durations.  By default, the
+    latter are read from the monotonic clock, so durations are not affected by system clock
+    adjustments.  If a custom ``clock`` is passed, both are read from it.
+
+    Times can also be passed explicitly to ``set_start`` and ``set_end`` (as ``clock``
+    timestamps), in which case the nanoseconds are derived from them.
     """
 
+    __slots__ = ('clock', 'clock_ns', 'start', 'end', 'start_ns', 'end_ns')
+
     def __init__(self, clock=None):
+        self.clock_ns = get_clock_ns(clock)
         if clock is None:
             clock = datetime.datetime.now
         self.clock = clock
         self.start = None
         self.end = None
+        self.start_ns = None
+        self.end_ns = None
 
     def set_start(self, t=None):
         if t is None:
-            t = self.now()
-        self.start = t
+            self.start = self.now()
+            self.start_ns = self.clock_ns()
+        else:
+            # (as many nanoseconds before now as t is before now)
+            self.start = t
+            self.start_ns = self.clock_ns() - self._delta_to_ns(self.now() - t)
         self.end = None
+        self.end_ns = None
 
     def set_end(self, t=None):
         if not self.is_started:
             raise RuntimeError('not started')
         if t is None:
-            t = self.now()
-        self.end = t
+            self.end = self.now()
+            self.end_ns = self.clock_ns()
+        else:
+            self.end = t
+            self.end_ns = self.start_ns + self._delta_to_ns(t - self.start)
+
+    @staticmethod
+    def _delta_to_ns(delta):
+        # the difference of two clock timestamps: a timedelta, or a number of seconds
+        if isinstance(delta, datetime.timedelta):
+            return timedelta_to_ns(delta)
+        return int(delta * 1e9)
 
     @property
     def is_started(self):
@@ -47,7 +118,13 @@ class Runtime:
     def total(self):
         """ end minus start, as timedetla """
         if self.is_ended:
-            return self.end - self.start
+            return ns_to_timedelta(self.end_ns - self.start_ns)
+
+    @property
+    def total_ns(self):
+        """ same as ``total``, but in integer nanoseconds """
+        if self.is_ended:
+            return self.end_ns - self.start_ns
 
     @property
     def total_seconds(self):
@@ -59,6 +136,9 @@ class Runtime:
     def now(self):
         return self.clock()
 
+    def now_ns(self):
+        return self.clock_ns()
+
     def __repr__(self):
         return '<%s %s>' % (self.__class__.__name__, self)
 
@@ -74,7 +154,6 @@ class Runtime:
 
     def __enter__(self):
         self.set_start()
-        self.end = None
         return self
 
     def __exit__(self, type, value, tb):
@@ -83,13 +162,79 @@ class Runtime:
 
 ################################################################################
 
-def get_currnet_stacktrace(thread):
+class StopCheckThrottle:
+    """
+    Amortizes the cost of frequent stop-checks (``_stop_if_requested``), by only performing the
+    actual check once every so many calls.
+
+    After each actual check, the caller calls ``next_skip()`` for getting the number of calls to
+    skip before the next check.  The caller is responsible for counting down the skipped calls,
+    which keeps the skipped calls as cheap as possible.
+
+    - ``every``: perform the check once every ``every`` calls.
+    - ``interval``: perform the check (approximately) once every ``interval`` seconds.  This is
+      done without reading the clock on skipped calls: the number of calls to skip is adjusted
+      on each check, according to the call rate measured since the previous check.  In this
+      mode, ``every`` (if passed) is the max number of calls between checks.
+    """
+
+    # when adjusting to the call rate, the number of calls between checks grows by at most
+    # this factor per check, so a burst of fast calls doesn't delay the checks by too much
+    MAX_GROWTH = 2
+
+    def __init__(self, every=None, interval=None, clock=time.perf_counter):
+        if every is not None and every < 1:
+            raise ValueError('Invalid stop-check every: %r' % every)
+        if interval is not None and interval <= 0:
+            raise ValueError('Invalid stop-check interval: %r' % interval)
+        if every is None and interval is None:
+            raise ValueError('Either every or interval must be passed')
+        self.every = every
+        self.interval = interval
+        self.clock = clock
+        self.period = 1 if interval is not None else every  # number of calls between checks
+        self._last_check_time = None
+
+    def next_skip(self):
+        """
+        :return: the number of calls to skip before the next check.
+        """
+        if self.interval is not None:
+            self._adjust_period()
+        return self.period - 1
+
+    def _adjust_period(self):
+        now = self.clock()
+        last = self._last_check_time
+        self._last_check_time = now
+        if last is None:
+            return
+        elapsed = now - last
+        period = self.period
+        if elapsed > 0:
+            new_period = int(round(period * self.interval / elapsed))
+        else:
+            new_period = period * self.MAX_GROWTH
+        new_period = max(1, min(new_period, period * self.MAX_GROWTH))
+        if self.every is not None:
+            new_period = min(new_period, self.every)
+        self.period = new_period
+
+
+################################################################################
+
+def get_currnet_stacktrace(thread, frames=None):
     """
     Returns a multiline string capturing the current stack-trace of the given thread.
 
+    :param frames: a snapshot of ``sys._current_frames()`` to use (when capturing the
+        stack-traces of several threads).  If not passed, a snapshot is taken.
+
     Based on: https://stackoverflow.com/a/2569696
     """
-    cur_frame = sys._current_frames().get(thread.ident)
+    if frames is None:
+        frames = sys._current_frames()
+    cur_frame = frames.get(thread.ident)
     if cur_frame is None:
         return None
     code = []
@@ -149,6 +294,8 @@ class ProfileContext:
 class NoopContext:
     """ A context manager which does nothing. """
 
+    __slots__ = ()
+
     def __enter__(self):
         pass
 
@@ -156,4 +303,55 @@ class NoopContext:
         return False
 
 
+NOOP_CONTEXT = NoopContext()  # it is stateless, so it can be shared
+
+
+################################################################################
+
+_lazy_event_lock = threading.Lock()
+
+
+class LazyEvent:
+    """
+    A lightweight replacement for ``threading.Event``, for events which are mostly checked
+    (``is_set()``), and rarely waited on.
+
+    A ``threading.Event`` allocates a ``Condition`` and two locks.  A ``LazyEvent`` is a flag,
+    and only allocates a ``threading.Event`` when first waited on (with a nonzero timeout).
+    ``clear()`` is not supported.
+    """
+
+    __slots__ = ('_flag', '_event')
+
+    def __init__(self):
+        self._flag = False
+        self._event = None
+
+    def is_set(self):
+        return self._flag
+
+    def set(self):
+        self._flag = True
+        # (the flag is set before reading _event, and wait() re-checks the flag after creating
+        # the event, so a concurrent waiter is never missed)
+        event = self._event
+        if event is not None:
+            event.set()
+
+    def wait(self, timeout=None):
+        if self._flag:
+            return True
+        if timeout is not None and timeout <= 0:
+            return False
+        event = self._event
+        if event is None:
+            with _lazy_event_lock:
+                event = self._event
+                if event is None:
+                    event = self._event = threading.Event()
+            if self._flag:
+                return True
+        return event.wait(timeout)
+
+
 ################################################################################
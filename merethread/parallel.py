@@ -0,0 +1,240 @@
+"""
+Parallel map: applying a function to the items of an iterable concurrently, on the worker
+threads of a ``TaskPoolExecutor``, and streaming the results::
+
+    for result in parallel_map(process_line, open('huge.txt'), max_workers=8):
+        ...
+
+The items are passed to ``PoolTask``s in chunks, and:
+
+- The input is consumed lazily, and at most ``2 * max_workers`` chunks are in flight (waiting,
+  running, or done and not yet consumed), so memory does not grow with the size of the input.
+- At most ``max_workers`` chunks run at the same time, even on a shared executor with more
+  workers: the other chunks wait here (not in the executor), and are submitted as running chunks
+  finish.
+- Results are yielded in input order, or as they complete (``imap_unordered``).
+- Unless ``chunk_size`` is passed, chunks are sized automatically: starting with single items,
+  chunks grow until they take about ``CHUNK_DURATION`` seconds, amortizing the per-task
+  overhead over many small items.
+- ``timeout`` applies to the whole map, with ``TimeoutTaskThread`` semantics: the tasks abort
+  with a ``TimeoutError`` when the deadline passes, and so does the iteration.
+- Fail-fast: when an item raises (or on timeout, or if the consumer stops iterating), the
+  remaining work is cancelled, and the error is raised to the consumer.
+
+The function itself is not interrupted: tasks check for cancellation and expiry between items.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from .pool import PoolTask, TimeoutPoolTask, TaskPoolExecutor
+
+
+################################################################################
+
+# automatic chunking: the number of seconds a chunk should take, and the max chunk size
+CHUNK_DURATION = 0.01
+MAX_CHUNK_SIZE = 1024
+
+
+def parallel_map(func, iterable, *, ordered=True, max_workers=None, chunk_size=None,
+                 timeout=None, executor=None):
+    """
+    Apply ``func`` to the items of ``iterable`` in parallel.  See the module docstring.
+
+    :param ordered: if True, results are yielded in input order.  Else, as they complete.
+    :param max_workers: the max number of chunks running concurrently.  Defaults to the number
+        of workers of the executor.
+    :param chunk_size: the number of items per task.  If not passed, chunks are sized
+        automatically.
+    :param timeout: the max number of seconds for the whole map.
+    :param executor: the ``TaskPoolExecutor`` to run the tasks on.  If not passed, a new one
+        is created (with ``max_workers`` workers), and shut down when the iteration ends.
+    :return: an iterator over the results.
+    """
+    if max_workers is not None and max_workers < 1:
+        raise ValueError('Invalid max_workers: %r' % max_workers)
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError('Invalid chunk_size: %r' % chunk_size)
+    return iter(_ParallelMap(
+        func, iterable, ordered, max_workers, chunk_size, timeout, executor))
+
+
+def imap_unordered(func, iterable, **kwargs):
+    """
+    Same as ``parallel_map(..., ordered=False)``: results are yielded as they complete.
+    """
+    return parallel_map(func, iterable, ordered=False, **kwargs)
+
+
+################################################################################
+
+class _MapChunkTask(PoolTask):
+    """ A task which applies a function to a chunk of items """
+
+    logger_mode = 'class'
+
+    def __init__(self, *, func, items, **kwargs):
+        super().__init__(**kwargs)
+        self.func = func
+        self.items = items
+        self.elapsed = None  # the number of seconds it took to process the items
+
+    def _main(self):
+        t0 = time.perf_counter()
+        func = self.func
+        results = []
+        for item in self.items:
+            self._stop_if_requested()
+            results.append(func(item))
+        self.elapsed = time.perf_counter() - t0
+        return results
+
+
+class _TimeoutMapChunkTask(TimeoutPoolTask, _MapChunkTask):
+    """
+    A chunk task of a map with a timeout.  Its ``expiry`` is the deadline of the map, on the
+    ``time.monotonic`` clock, so all chunks share it, whenever they start.
+    """
+
+    def _calc_expiry(self, expiry_raw):
+        # converting the deadline to the time remaining (the clock of the task is monotonic too)
+        return super()._calc_expiry(max(0., expiry_raw - time.monotonic()))
+
+
+class _ParallelMap:
+
+    def __init__(self, func, iterable, ordered, max_workers, chunk_size, timeout, executor):
+        self.func = func
+        self.items = iter(iterable)
+        self.ordered = ordered
+        self.executor = executor
+        self.own_executor = executor is None
+        if self.own_executor:
+            self.executor = TaskPoolExecutor(max_workers, name='parallel_map')
+        if max_workers is None:
+            max_workers = len(self.executor.workers)
+        self.max_workers = max_workers
+        self.max_pending = 2 * max_workers
+        self.adaptive = chunk_size is None
+        self.chunk_size = 1 if self.adaptive else chunk_size
+        self.deadline = None
+        if timeout is not None:
+            self.deadline = time.monotonic() + timeout
+        self.pending = deque() if ordered else set()  # futures of the chunks in flight
+        self.exhausted = False
+        # chunks waiting to be submitted (when fewer than max_workers chunks are running)
+        self.waiting = deque()
+        self.num_running = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        completed = False
+        try:
+            self._submit_chunks()
+            while self.pending:
+                fut = self._wait_next()
+                results = fut.result()  # raises the error of the chunk, if it failed
+                if self.adaptive:
+                    self._adapt_chunk_size(fut.thread)
+                self._submit_chunks()
+                yield from results
+            completed = True
+        finally:
+            with self.lock:
+                self.closed = True
+                self.waiting.clear()
+            if not completed:
+                # fail fast: error, timeout, or the consumer stopped iterating
+                for fut in self.pending:
+                    if not fut.cancel():
+                        fut.thread.cancel()  # already running
+            if self.own_executor:
+                self.executor.shutdown(wait=completed)
+
+    def _submit_chunks(self):
+        while not self.exhausted and len(self.pending) < self.max_pending:
+            chunk = list(itertools.islice(self.items, self.chunk_size))
+            if not chunk:
+                self.exhausted = True
+                break
+            if self.deadline is None:
+                task = _MapChunkTask(func=self.func, items=chunk)
+            else:
+                task = _TimeoutMapChunkTask(func=self.func, items=chunk, expiry=self.deadline)
+            fut = task.future
+            if self.ordered:
+                self.pending.append(fut)
+            else:
+                self.pending.add(fut)
+            with self.lock:
+                self.waiting.append(task)
+        self._submit_waiting()
+
+    def _submit_waiting(self):
+        """
+        Submit waiting chunks to the executor, up to ``max_workers`` running chunks.  Called by
+        the consumer, and by the worker threads when chunks are done.
+        """
+        with self.lock:
+            tasks = []
+            while self.waiting and not self.closed and self.num_running < self.max_workers:
+                tasks.append(self.waiting.popleft())
+                self.num_running += 1
+        for task in tasks:
+            task.future.add_done_callback(self._on_chunk_done)
+            try:
+                self.executor.submit_task(task)
+            except RuntimeError:
+                # the (shared) executor was shut down: the chunk fails with a CancelledError
+                task.future.cancel()
+
+    def _on_chunk_done(self, fut):
+        with self.lock:
+            self.num_running -= 1
+        self._submit_waiting()
+
+    def _wait_next(self):
+        """
+        Wait for the next chunk to be done (the oldest one, if ordered).
+
+        :return: its future.
+        :raise: the error of any chunk which failed (not only the next one), or ``TimeoutError``
+            if the deadline passes first.
+        """
+        if not self.ordered:
+            fut = self._wait_any(self.pending).pop()
+            self.pending.remove(fut)
+            return fut
+        head = self.pending[0]
+        while not head.done():
+            # waiting for any chunk, so a failure of a later chunk is raised immediately
+            for fut in self._wait_any([fut for fut in self.pending if not fut.done()]):
+                if not fut.cancelled() and fut.exception() is not None:
+                    fut.result()  # raise
+        return self.pending.popleft()
+
+    def _wait_any(self, futures):
+        timeout = None
+        if self.deadline is not None:
+            timeout = max(0, self.deadline - time.monotonic())
+        done, _ = wait(futures, timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError('parallel_map timed out')
+        return done
+
+    def _adapt_chunk_size(self, task):
+        if not task.elapsed:
+            # too quick to measure
+            size = self.chunk_size * 2
+        else:
+            size = int(CHUNK_DURATION * len(task.items) / task.elapsed)
+        # (growing gradually, so a few quick items don't make a huge chunk)
+        self.chunk_size = max(1, min(MAX_CHUNK_SIZE, size, self.chunk_size * 2))
+
+
+################################################################################
@@ -0,0 +1,501 @@
+"""
+Definitions of a task-pool executor: running tasks on a fixed set of reused worker threads,
+while keeping the *merethread* task interface.
+
+Starting a ``TaskThread`` per task means paying for the creation of an OS thread per task.
+A ``TaskPoolExecutor`` keeps a fixed set of long-lived worker threads instead, and runs
+``PoolTask``s on them.  A ``PoolTask`` is not a thread, but it supports the same contract as a
+``TaskThread``: a ``future``, ``cancel()``, cooperative stopping using ``_sleep`` and
+``_stop_if_requested``, expiry, and the ``result``, ``exception`` and ``runtime`` attributes.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Executor, CancelledError
+
+from .thread import ThreadStatus, ThreadFuture, _ThreadStop, _ThreadCoreMixin
+from .daemon import EventLoopThread
+from .task import _ExpiringTaskMixin
+from .misc import Runtime, LazyEvent
+
+
+################################################################################
+# Misc classes
+
+class PoolTaskFuture(ThreadFuture):
+    """
+    The ThreadFuture_ of a ``PoolTask``.
+
+    Unlike a plain ``ThreadFuture``, this future supports ``cancel()``, as required by the
+    ``Executor`` interface (e.g. ``Executor.map`` cancels the remaining futures on error).
+    Like ``Future.cancel()``, it only cancels pending tasks.  To abort a running task, cancel
+    the task itself: ``future.thread.cancel()``.
+    """
+
+    def cancel(self):
+        """
+        Cancel the task, if it is still pending.
+
+        If the task is still pending, the future and the task are cancelled, and True is
+        returned.  Else, the task is not affected, and False is returned.
+        """
+        if not super(ThreadFuture, self).cancel():
+            return False
+        self.thread.cancel()
+        return True
+
+
+_STOP_WORKER = object()
+
+
+################################################################################
+# Tasks
+
+class PoolTask(_ThreadCoreMixin):
+    """
+    A task which runs on one of the worker threads of a ``TaskPoolExecutor``.
+
+    The interface mirrors that of ``TaskThread``: subclasses override ``_main``, which should
+    call ``_stop_if_requested`` or ``_sleep`` often, and the task can be cancelled by calling the
+    ``cancel`` method.  When a ``PoolTask`` is cancelled successfully, it aborts with a
+    `CancelledError`_.
+
+    Instead of calling ``start()``, pass the task to ``TaskPoolExecutor.submit_task()``.
+    """
+
+    Future = PoolTaskFuture
+    Runtime = Runtime
+
+    ################################################################################
+    # constructor
+
+    def __init__(self, *, name=None, logger=None, logger_name=None, logger_mode=None, clock=None,
+                 stop_check_every=None, stop_check_interval=None, metrics=None):
+        """
+        :param name: the name of the task.  Defaults to the name of the class.
+
+        The other options are the same as in Thread_.
+        """
+        if name is None:
+            name = type(self).__name__
+        self.name = name
+        self._init_core(logger, logger_name, logger_mode, clock,
+                        stop_check_every, stop_check_interval, metrics)
+
+        self._done_event = LazyEvent()
+        self._is_submitted = False
+        self._is_started = False
+        self._worker = None
+
+        self._result = None
+        self._exception = None
+        self._runtime = self.Runtime(clock=clock)
+
+    ################################################################################
+    # main
+
+    def _run(self, worker=None):
+        """
+        The basic task main logic, same as ``Thread.run``.
+
+        Called by the worker thread running the task.  DO NOT OVERRIDE THIS METHOD.
+        You should override ``_main`` instead.
+        """
+        self._worker = worker
+        self._is_started = True
+        try:
+            with self._runtime:
+
+                result = None
+                exception = None
+
+                try:
+
+                    self._set_future_running()
+                    fut = self._future
+                    if fut is not None and fut.cancelled():
+                        # the future was cancelled right before the task started, and
+                        # PoolTaskFuture.cancel has not cancelled the task yet
+                        self.cancel()
+
+                    # pre-start checks
+                    if not self._stopping_event.is_set():
+                        # starting
+                        self._on_enter()
+                        # main
+                        result = self._main()
+                    else:
+                        # task cancelled before we got a chance to start running
+                        self._handle_stop_before_start()
+
+                except _ThreadStop as e:
+                    # stop has been requested
+                    try:
+                        result = self._on_thread_stop(e)  # may raise or not
+                    except Exception as e2:
+                        exception = e2
+
+                except Exception as e:
+                    exception = e
+
+                finally:
+                    self._set_outcome(result, exception)
+        finally:
+            self._worker = None
+            self._done_event.set()
+
+    def _set_outcome(self, result, exception):
+        # set self._result and self._exception
+        if exception is not None:
+            self._exception = exception
+            self._on_abort(self._exception)
+        else:
+            self._result = result
+
+        # set self.future with the result/exception:
+        self._set_future_done()
+
+        if self._metrics is not None:
+            runtime = self._runtime
+            self._metrics.record_exit(self, runtime.now_ns() - runtime.start_ns)
+
+        # other cleanups:
+        self._on_exit()
+
+    def _main(self):
+        """
+        Method representing the task's activity.
+        """
+        raise NotImplementedError('_main() not defined for %s' % self.__class__.__name__)
+
+    def _set_submitted(self):
+        if self._is_submitted:
+            raise RuntimeError('tasks can only be submitted once')
+        self._is_submitted = True
+
+    ################################################################################
+    # stopping
+
+    def cancel(self, reason=None):
+        """
+        Signal the task should be cancelled, and abort execution.
+
+        Same as ``TaskThread.cancel()``.
+        """
+        if self.is_stopped() or self._stopping_event.is_set():
+            return
+        if reason is None:
+            reason = 'cancelled'
+        self._request_stop(reason=reason)
+
+    ################################################################################
+    # state
+
+    def is_alive(self):
+        """
+        Is the task currently running on a worker thread?
+        """
+        return self._is_started and not self._done_event.is_set()
+
+    def is_started(self):
+        return self._is_started
+
+    def is_stopped(self):
+        return self._done_event.is_set()
+
+    def is_aborted(self):
+        return self._exception is not None and self.is_stopped()
+
+    def is_cancelled(self):
+        return self.is_stopped() and self._stopping_event.is_set()
+
+    def status(self):
+        """
+        A `ThreadStatus`_ representing the current status of the task.
+        """
+        stopping = self._stopping_event.is_set()
+        if self.is_cancelled():
+            return ThreadStatus.cancelled
+        elif not self.is_started():
+            return ThreadStatus.stopped_before_starting if stopping else ThreadStatus.not_started
+        elif self.is_alive():
+            return ThreadStatus.stopping if stopping else ThreadStatus.running
+        elif self.is_aborted():
+            return ThreadStatus.aborted
+        else:
+            return ThreadStatus.stopped
+
+    ################################################################################
+    # hooks
+
+    def _on_enter(self):
+        self.logger.info('starting')
+
+    def _on_exit(self):
+        self.logger.info('done')
+
+    def _on_abort(self, e):
+        if isinstance(e, CancelledError):
+            self.logger.info('task cancelled')
+        else:
+            self.logger.info('aborted due to an error: %s', e)
+
+    def _on_thread_stop(self, e):
+        self.logger.info('stopping')
+        raise CancelledError() from e  # raise to invoke task-abort logic
+
+    def _handle_stop_before_start(self):
+        self.logger.info('not starting, stop already requested')
+        raise _ThreadStop()  # raise to invoke self._on_thread_stop
+
+    ################################################################################
+    # introspection
+
+    @property
+    def worker(self):
+        """
+        The worker thread currently running the task, or None if not running.
+        """
+        return self._worker
+
+    @property
+    def runtime(self):
+        return self._runtime
+
+    def get_current_stacktrace(self):
+        """
+        :return: a multiline string capturing the current stack-trace of the worker thread
+            running this task, or None if not running.
+        """
+        worker = self._worker
+        if worker is None:
+            return None
+        return worker.get_current_stacktrace()
+
+    ################################################################################
+    # other
+
+    @property
+    def result(self):
+        return self._result
+
+    @property
+    def exception(self):
+        return self._exception
+
+    def reraise(self, suppress_cancelled=False):
+        """
+        If the task aborted with an error, raise it in this current (caller) thread.
+        :param suppress_cancelled: if task aborted due to cancelling, will not raise.
+        """
+        if self._exception is not None:
+            if suppress_cancelled and isinstance(self._exception, CancelledError):
+                return
+            raise self._exception
+
+    def join(self, timeout=None):
+        """
+        Wait until the task finishes.
+
+        :return: False iff returned due to a timeout.
+        """
+        return self._done_event.wait(timeout)
+
+    def __repr__(self):
+        status = self.status().value
+        if self._stop_reason is not None and status != str(self._stop_reason):
+            status += ' (%s)' % self._stop_reason
+        if self.is_stopped():
+            status += ', %s' % self.runtime
+        return '<%s %s [%s]>' % (self.__class__.__name__, self.name, status)
+
+
+class FunctionPoolTask(PoolTask):
+    """
+    A ``PoolTask`` for running a given function, the pool equivalent of ``FunctionThread``.
+
+    Like ``FunctionThread``, it is not well-behaved: it can only be cancelled before it starts
+    running.
+    """
+
+    def __init__(self, target, args=(), kwargs=None, *, name=None, **kw):
+        if name is None:
+            try:
+                name = target.__name__
+            except Exception:
+                name = str(target)
+        super().__init__(name=name, **kw)
+        self._target = target
+        self._args = args
+        self._kwargs = kwargs if kwargs is not None else {}
+
+    def _main(self):
+        try:
+            return self._target(*self._args, **self._kwargs)
+        finally:
+            # Avoid a refcycle if running a function with an argument that points to the task.
+            del self._target, self._args, self._kwargs
+
+    def cancel(self, reason=None):
+        if self.is_alive():
+            # unlike FunctionThread.cancel, don't raise, so all pool tasks can be cancelled alike
+            return
+        return super().cancel(reason=reason)
+
+
+class _ExpiringPoolTask(_ExpiringTaskMixin, PoolTask):
+    """
+    An abstract pool task with a predefined expiry.
+    See `_ExpiringTaskMixin`_ for the supported ``expiry`` values.
+    """
+    pass
+
+
+class LimitedTimePoolTask(_ExpiringPoolTask):
+    """
+    The pool equivalent of ``LimitedTimeTaskThread``.
+    """
+
+    def _on_expiry(self):
+        return None
+
+
+class TimeoutPoolTask(_ExpiringPoolTask):
+    """
+    The pool equivalent of ``TimeoutTaskThread``.
+    """
+
+    def _on_expiry(self):
+        raise TimeoutError()
+
+    def is_timed_out(self):
+        return self.is_expired()
+
+
+################################################################################
+# Executor
+
+class _PoolWorkerThread(EventLoopThread):
+    """
+    A worker thread of a ``TaskPoolExecutor``, running the tasks read from the pool's queue.
+    """
+
+    def __init__(self, task_queue, **kwargs):
+        super().__init__(**kwargs)
+        self._task_queue = task_queue
+
+    def _read_next_event(self):
+        # blocking with no timeout is fine: the executor wakes the worker when shutting down
+        return self._task_queue.get()
+
+    def _handle_event(self, task):
+        if task is _STOP_WORKER:
+            self.stop(reason='shutdown')
+        else:
+            task._run(worker=self)
+
+
+class TaskPoolExecutor(Executor):
+    """
+    A `concurrent.futures.Executor`_ running ``PoolTask``s on a fixed set of long-lived worker
+    threads.
+
+    Use ``submit_task`` for submitting ``PoolTask``s, or the standard ``submit`` (and ``map``)
+    for submitting plain functions (which are wrapped in ``FunctionPoolTask``s).
+    The futures returned are ``PoolTaskFuture``s, and the task can be accessed using the
+    ``thread`` attribute of the future.
+
+    Worker threads are started on first submit.  On ``shutdown``, the workers first run all
+    tasks already submitted, and then exit.
+    """
+
+    Worker = _PoolWorkerThread
+    FunctionTask = FunctionPoolTask
+
+    def __init__(self, max_workers=None, *, name=None):
+        """
+        :param max_workers: number of worker threads.  Defaults to the same value as
+            ``ThreadPoolExecutor``'s default.
+        :param name: used as a prefix for worker thread names.
+        """
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        if max_workers <= 0:
+            raise ValueError('max_workers must be greater than 0')
+        if name is None:
+            name = type(self).__name__
+        self.name = name
+        self._queue = queue.SimpleQueue()
+        self._workers = [
+            self.Worker(self._queue, name='%s-%d' % (name, i))
+            for i in range(max_workers)
+        ]
+        self._is_shutdown = False
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self):
+        return tuple(self._workers)
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_task(self.FunctionTask(fn, args=args, kwargs=kwargs))
+
+    def submit_task(self, task):
+        """
+        Schedule a ``PoolTask`` to run.
+
+        :return: the task's future.
+        """
+        with self._lock:
+            if self._is_shutdown:
+                raise RuntimeError('cannot schedule new tasks after shutdown')
+            task._set_submitted()
+            self._start_workers()
+            self._queue.put(task)
+        return task.future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """
+        Signal the executor to free its resources once the submitted tasks are done.
+
+        :param wait: if True, wait for all worker threads to exit.
+        :param cancel_futures: if True, cancel all pending tasks (and their futures, same as
+            ``ThreadPoolExecutor``).  Running tasks are not cancelled.  Cancelled tasks still
+            pass through a worker, so their state is finalized like a ``TaskThread`` cancelled
+            before starting.
+        """
+        with self._lock:
+            if not self._is_shutdown:
+                self._is_shutdown = True
+                if cancel_futures:
+                    self._cancel_pending()
+                for _ in self._workers:
+                    self._queue.put(_STOP_WORKER)
+        if wait:
+            for worker in self._workers:
+                if worker.is_started():
+                    worker.join()
+
+    def is_shutdown(self):
+        return self._is_shutdown
+
+    def _start_workers(self):
+        for worker in self._workers:
+            if not worker.is_started():
+                worker.start()
+
+    def _cancel_pending(self):
+        pending = []
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for task in pending:
+            task.cancel(reason='shutdown')
+            task.future.cancel()
+            self._queue.put(task)
+
+
+################################################################################
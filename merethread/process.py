@@ -0,0 +1,369 @@
+"""
+Definitions of process-backed task-thread types: task threads which run their task in a child
+process, for running CPU-bound tasks in parallel (escaping the GIL).
+
+A ``ProcessTaskThread`` is a thread, supporting the full ``TaskThread`` interface, but its
+``_main`` is run in a worker process taken from a reusable ``ProcessPool``.  The thread itself
+only supervises the worker process: it waits for the result, and stops the worker process when
+the task is cancelled or expires.
+"""
+
+import os
+import signal
+import threading
+import multiprocessing
+
+from .thread import _ThreadStop
+from .task import TaskThread, FunctionThread
+from .misc import LazyEvent
+
+
+################################################################################
+# Worker processes
+
+_current_task = None
+
+
+def _on_sigterm(signum, frame):
+    # request the current task to stop.  A well-behaved task will stop shortly, and the worker
+    # process can then be reused.
+    task = _current_task
+    if task is not None:
+        task._stopping_event.set()
+
+
+def _process_worker_main(conn):
+    """
+    The main function of a worker process: runs the tasks received over ``conn``, and sends
+    back their outcome, until receiving None (or until the parent process exits).
+    """
+    global _current_task
+    signal.signal(signal.SIGTERM, _on_sigterm)
+    # interrupting is handled by the parent process, by cancelling the task
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        _current_task = task
+        try:
+            outcome = _run_task(task)
+        finally:
+            _current_task = None
+        try:
+            conn.send(outcome)
+        except Exception as e:
+            # probably the result or the exception can't be pickled
+            conn.send(('error', RuntimeError('failed sending task outcome: %r' % e)))
+
+
+def _run_task(task):
+    try:
+        return ('result', task._process_main())
+    except _ThreadStop as e:
+        return ('stopped', isinstance(e, getattr(task, '_Expired', ())))
+    except Exception as e:
+        return ('error', e)
+
+
+class _ProcessWorker:
+    """
+    A handle of a worker process of a ``ProcessPool``, used by the parent process.
+    """
+
+    def __init__(self, mp_context):
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(
+            target=_process_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def send(self, task):
+        self.conn.send(task)
+
+    def poll(self, timeout):
+        return self.conn.poll(timeout)
+
+    def recv(self):
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            raise RuntimeError('worker process %s died (exitcode=%s)' % (
+                self.pid, self.process.exitcode))
+
+    def signal(self, signum):
+        try:
+            os.kill(self.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ProcessPool:
+    """
+    A pool of reusable worker processes, used for running ``ProcessTaskThread``s.
+
+    Worker processes are started on demand, up to ``max_processes``.  A worker process is used by
+    a single task at a time, and returned to the pool when the task is done, unless it had to be
+    killed.
+    """
+
+    def __init__(self, max_processes=None, mp_context=None):
+        """
+        :param max_processes: max number of worker processes. Defaults to the number of CPUs.
+        :param mp_context: a ``multiprocessing`` context, used for starting the processes.
+        """
+        if max_processes is None:
+            max_processes = os.cpu_count() or 1
+        if max_processes < 1:
+            raise ValueError('Invalid max_processes: %r' % max_processes)
+        if mp_context is None:
+            mp_context = multiprocessing.get_context()
+        self.max_processes = max_processes
+        self._mp_context = mp_context
+        self._idle = []
+        self._num_processes = 0
+        self._is_shutdown = False
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        Take a worker process from the pool, starting a new one if needed.
+
+        :return: the worker, or None if no worker became available before ``timeout``.
+        """
+        with self._cond:
+            if self._is_shutdown:
+                raise RuntimeError('cannot acquire worker processes after shutdown')
+            if not self._cond.wait_for(
+                    lambda: self._idle or self._num_processes < self.max_processes, timeout):
+                return None
+            if self._idle:
+                return self._idle.pop()
+            self._num_processes += 1
+        try:
+            return _ProcessWorker(self._mp_context)
+        except BaseException:
+            with self._cond:
+                self._num_processes -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, worker, healthy=True):
+        """
+        Return a worker process to the pool.  If ``healthy`` is false, the process is killed.
+        """
+        with self._cond:
+            if healthy and not self._is_shutdown:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+            self._num_processes -= 1
+            self._cond.notify()
+        if healthy:
+            worker.close()
+        else:
+            worker.kill()
+
+    def shutdown(self):
+        """
+        Close the idle worker processes.  Busy worker processes are closed when released.
+        """
+        with self._cond:
+            self._is_shutdown = True
+            idle, self._idle = self._idle, []
+            self._num_processes -= len(idle)
+            self._cond.notify_all()
+        for worker in idle:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_process_pool():
+    """
+    The ``ProcessPool`` used by ``ProcessTaskThread``s by default (created on first use).
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ProcessPool()
+        return _default_pool
+
+
+################################################################################
+# Process-backed tasks
+
+class ProcessTaskThread(TaskThread):
+    """
+    A ``TaskThread`` which runs its task in a worker process, taken from a ``ProcessPool``.
+
+    ``ProcessTaskThread`` is used as a mixin, combined with an existing ``TaskThread`` subclass
+    which defines ``_main``, e.g.::
+
+        class ProcessSlowTaskThread(ProcessTaskThread, SlowTaskThread):
+            pass
+
+    The ``_main`` of the task class is run in the worker process, while this thread waits for
+    its outcome.  The task object is pickled for sending it to the worker process, so its class
+    must be importable, and its attributes picklable.  Likewise, the result (or exception) must
+    be picklable.  Other than ``_main``, all methods (e.g. the hooks) run in this thread.
+
+    Cancelling and expiry work as in the task class (e.g. with ``TimeoutTaskThread``
+    semantics), and are enforced on the worker process: it is sent a ``SIGTERM`` (which causes
+    ``_sleep`` and ``_stop_if_requested`` in the task to raise), and if the task does not stop
+    within ``grace_period`` seconds, the worker process is killed.
+    """
+
+    # state which is not sent to the worker process (thread internals, unpicklable):
+    _PROCESS_EXCLUDED_STATE = frozenset([
+        '_started', '_tstate_lock', '_stderr', '_invoke_excepthook', '_stopping_event',
+        '_profiler_ctx', '_future', '_process_pool', '_process_worker',
+        'metrics', '_metrics', 'deadline_scheduler', '_deadline_handle',
+    ])
+
+    grace_period = 1.
+    poll_interval = .05
+
+    def __init__(self, *args, process_pool=None, grace_period=None, **kwargs):
+        """
+        :param process_pool: the ``ProcessPool`` to take a worker process from.  Defaults to
+            ``get_default_process_pool()``.
+        :param grace_period: number of seconds to wait for the task to stop after signalling the
+            worker process, before killing it.
+        """
+        super().__init__(*args, **kwargs)
+        self._process_pool = process_pool
+        if grace_period is not None:
+            self.grace_period = grace_period
+        self._process_worker = None
+
+    ################################################################################
+    # main
+
+    def _main(self):
+        pool = self._process_pool
+        if pool is None:
+            pool = get_default_process_pool()
+        worker = None
+        while worker is None:
+            worker = pool.acquire(timeout=self.poll_interval)
+            if worker is None:
+                self._stop_if_requested()
+        self._process_worker = worker
+        healthy = False
+        try:
+            worker.send(self)
+            while not worker.poll(self.poll_interval):
+                self._stop_if_requested()
+            status, value = worker.recv()  # (raises if the worker process died)
+            healthy = True
+        except _ThreadStop:
+            healthy = self._stop_worker(worker)
+            raise
+        finally:
+            self._process_worker = None
+            pool.release(worker, healthy)
+
+        if status == 'result':
+            return value
+        elif status == 'error':
+            raise value
+        elif value:
+            raise self._Expired()
+        else:
+            raise _ThreadStop()
+
+    def _process_main(self):
+        # called in the worker process: run the task class's _main
+        return super()._main()
+
+    def _stop_worker(self, worker):
+        """
+        Stop the task running in the worker process: signal it, and kill it if it doesn't stop
+        within the grace period.
+
+        :return: whether the worker process can be reused.
+        """
+        worker.signal(signal.SIGTERM)
+        if worker.poll(self.grace_period):
+            try:
+                worker.recv()  # discard the outcome
+                return True
+            except RuntimeError:
+                return False
+        self.logger.info('task did not stop within %s seconds, killing worker process %s',
+                         self.grace_period, worker.pid)
+        return False
+
+    ################################################################################
+    # pickling (for sending the task to the worker process)
+
+    def __getstate__(self):
+        return {
+            k: v for k, v in self.__dict__.items()
+            if k not in self._PROCESS_EXCLUDED_STATE
+        }
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._stopping_event = LazyEvent()
+        self._future = None
+        self._metrics = None
+        self._deadline_handle = None  # in the worker, expiry is checked using the clock
+
+    ################################################################################
+    # other
+
+    @property
+    def process_pid(self):
+        """
+        The pid of the worker process currently running the task, or None.
+        """
+        worker = self._process_worker
+        if worker is None:
+            return None
+        return worker.pid
+
+
+class ProcessFunctionThread(ProcessTaskThread, FunctionThread):
+    """
+    A ``FunctionThread`` which runs its function in a worker process.
+
+    Unlike ``FunctionThread``, it can be cancelled while running, because the worker process can
+    be killed.  The function (and its arguments) must be picklable.
+    """
+
+    def cancel(self, reason=None):
+        return TaskThread.cancel(self, reason=reason)
+
+
+################################################################################
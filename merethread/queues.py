@@ -0,0 +1,728 @@
+"""
+Definitions of event-queue types, used as the input queues of ``QueueEventLoopThread``s.
+
+All event-queues support the same interface:
+
+- ``put(item, block=True, timeout=None)`` and ``put_nowait(item)``, for producers.  Return
+  whether the item was queued (False if it was dropped, by the overflow policy of a
+  ``BoundedEventQueue``).
+- ``get(timeout=None)``, for the consumer.  Blocks until an item is available, and returns it.
+  Returns None on timeout, or when woken up by ``wakeup()``.
+- ``wakeup()``: wakes up a consumer blocked in ``get()`` (or, if no consumer is currently blocked,
+  the next call to ``get()`` returns None immediately).  This is used for waking up the consumer
+  thread when it is requested to stop, without having to poll.
+- ``qsize()`` (and ``len()``): the number of items in the queue.
+
+``PriorityEventQueue.put`` also takes a ``priority``.  ``CoalescingEventQueue`` merges items
+with the same key, so ``qsize()`` counts distinct pending keys.
+
+None is used for signalling timeouts and wake-ups, so it is not a valid item.
+
+Bounded queues
+--------------
+A ``BoundedEventQueue`` keeps memory flat when producers outpace the consumer: when full, an
+item is handled according to its ``overflow_policy``.  High and low water marks let producers
+throttle themselves before the queue is full, and ``QueueStats`` make the overload visible.
+
+Coalescing queues
+-----------------
+A ``CoalescingEventQueue`` is for "latest value wins" events (e.g. price updates, or cache
+invalidations): an item put while another item with the same key is still pending is merged
+into the pending one (by default, it replaces it), so the consumer handles each pending key
+once, however many items were put for it.
+"""
+
+import collections
+import queue
+import threading
+import time
+
+
+################################################################################
+
+_WAKEUP = object()
+
+
+class SimpleEventQueue:
+    """
+    An unbounded event-queue based on ``queue.SimpleQueue``.
+
+    ``wakeup()`` is implemented by putting a sentinel in the queue, so a pending wake-up is only
+    seen after the items put before it.
+    """
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+
+    def put(self, item, block=True, timeout=None):
+        # unbounded, so never blocks.  block and timeout are accepted for compatibility.
+        self._queue.put(item)
+        return True
+
+    def put_nowait(self, item):
+        self._queue.put(item)
+        return True
+
+    def get(self, timeout=None):
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if item is _WAKEUP:
+            return None
+        return item
+
+    def wakeup(self):
+        self._queue.put(_WAKEUP)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def __len__(self):
+        return self.qsize()
+
+
+class DequeEventQueue:
+    """
+    An unbounded event-queue based on a ``collections.deque`` and a ``threading.Condition``.
+
+    Putting and getting items takes no lock in the common case: ``deque.append`` and
+    ``deque.popleft`` are atomic, and the condition is only used when the consumer has to block on
+    an empty queue.
+    """
+
+    def __init__(self):
+        self._items = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._num_waiting = 0
+        self._wakeup_pending = False
+
+    def put(self, item, block=True, timeout=None):
+        # unbounded, so never blocks.  block and timeout are accepted for compatibility.
+        self._items.append(item)
+        # only take the lock if a consumer might be waiting.  This is safe, because a consumer
+        # increments _num_waiting *before* checking if the deque is empty.
+        if self._num_waiting:
+            with self._cond:
+                self._cond.notify()
+        return True
+
+    def put_nowait(self, item):
+        return self.put(item)
+
+    def get(self, timeout=None):
+        try:
+            return self._items.popleft()
+        except IndexError:
+            pass
+        # empty -- wait for an item (or a wake-up)
+        with self._cond:
+            self._num_waiting += 1
+            try:
+                end_time = None if timeout is None else time.monotonic() + timeout
+                while True:
+                    try:
+                        return self._items.popleft()
+                    except IndexError:
+                        pass
+                    if self._wakeup_pending:
+                        self._wakeup_pending = False
+                        return None
+                    if end_time is None:
+                        self._cond.wait()
+                    else:
+                        remaining = end_time - time.monotonic()
+                        if remaining <= 0:
+                            return None
+                        self._cond.wait(remaining)
+            finally:
+                self._num_waiting -= 1
+
+    def wakeup(self):
+        with self._cond:
+            self._wakeup_pending = True
+            self._cond.notify_all()
+
+    def qsize(self):
+        return len(self._items)
+
+    def __len__(self):
+        return self.qsize()
+
+
+class RingBufferEventQueue:
+    """
+    A bounded event-queue based on a preallocated ring buffer.
+
+    The buffer is allocated once, and never grows.  When it is full, ``put`` blocks (or raises
+    ``queue.Full``, if ``block=False`` or if ``timeout`` expires).
+    """
+
+    def __init__(self, capacity=1024):
+        if capacity < 1:
+            raise ValueError('Invalid capacity: %r' % capacity)
+        self.capacity = capacity
+        self._buffer = [None] * capacity
+        self._head = 0  # index of next item to get
+        self._size = 0
+        lock = threading.Lock()
+        self._not_empty = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+        self._num_getters = 0
+        self._num_putters = 0
+        self._wakeup_pending = False
+
+    def put(self, item, block=True, timeout=None):
+        with self._not_full:
+            if self._size == self.capacity:
+                if not block:
+                    raise queue.Full
+                self._num_putters += 1
+                try:
+                    if not self._not_full.wait_for(
+                            lambda: self._size < self.capacity, timeout):
+                        raise queue.Full
+                finally:
+                    self._num_putters -= 1
+            self._buffer[(self._head + self._size) % self.capacity] = item
+            self._size += 1
+            # only notify if there are waiters (notify() is relatively costly)
+            if self._num_getters:
+                self._not_empty.notify()
+        return True
+
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+
+    def put_drop_oldest(self, item):
+        """
+        Put an item without blocking: if the queue is full, the oldest item is dropped, making
+        room for it.  Unlike making room using ``get``, this never consumes a pending
+        ``wakeup()``.
+
+        :return: whether an item was dropped.
+        """
+        with self._not_full:
+            dropped = self._size == self.capacity
+            if dropped:
+                self._drop_oldest()
+            self._buffer[(self._head + self._size) % self.capacity] = item
+            self._size += 1
+            if self._num_getters:
+                self._not_empty.notify()
+        return dropped
+
+    def _drop_oldest(self):
+        # called with the lock held, when the queue is not empty.  returns the dropped item.
+        head = self._head
+        item = self._buffer[head]
+        self._buffer[head] = None
+        self._head = (head + 1) % self.capacity
+        self._size -= 1
+        return item
+
+    def get(self, timeout=None):
+        with self._not_empty:
+            if not self._size:
+                self._num_getters += 1
+                try:
+                    if not self._not_empty.wait_for(
+                            lambda: self._size or self._wakeup_pending, timeout):
+                        return None
+                finally:
+                    self._num_getters -= 1
+                if not self._size:
+                    self._wakeup_pending = False
+                    return None
+            head = self._head
+            item = self._buffer[head]
+            self._buffer[head] = None  # don't keep a reference
+            self._head = (head + 1) % self.capacity
+            self._size -= 1
+            if self._num_putters:
+                self._not_full.notify()
+            return item
+
+    def wakeup(self):
+        with self._not_empty:
+            self._wakeup_pending = True
+            self._not_empty.notify_all()
+
+    def qsize(self):
+        return self._size
+
+    def __len__(self):
+        return self.qsize()
+
+
+################################################################################
+# Bounded queues
+
+class QueueStats:
+    """
+    Statistics of a ``BoundedEventQueue``.  Updated under the lock of the queue.
+
+    - ``queued``: the number of items queued.
+    - ``dropped``: the number of items dropped by the ``'drop'`` and ``'drop_oldest'`` policies.
+    - ``rejected``: the number of items not queued because ``put`` raised ``queue.Full``.
+    - ``blocked_puts`` and ``blocked_time``: the number of puts which blocked on a full queue,
+      and the total number of seconds they blocked.
+    - ``max_depth``: the max number of items the queue held.
+    - ``high_water_count``: the number of times the queue reached its high water mark.
+    """
+
+    __slots__ = (
+        'queued', 'dropped', 'rejected', 'blocked_puts', 'blocked_time', 'max_depth',
+        'high_water_count')
+
+    def __init__(self):
+        self.queued = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.blocked_puts = 0
+        self.blocked_time = 0.
+        self.max_depth = 0
+        self.high_water_count = 0
+
+    def copy(self):
+        other = QueueStats()
+        for attr in self.__slots__:
+            setattr(other, attr, getattr(self, attr))
+        return other
+
+    def __repr__(self):
+        return '<%s %s>' % (
+            self.__class__.__name__,
+            ' '.join('%s=%s' % (attr, getattr(self, attr)) for attr in self.__slots__))
+
+
+class BoundedEventQueue(RingBufferEventQueue):
+    """
+    A bounded event-queue (see ``RingBufferEventQueue``), with an overflow policy, water marks
+    and statistics.
+
+    When the queue is full, ``put`` handles the new item according to the ``overflow_policy``:
+
+    - ``'block'``: block until there is room, or until the timeout expires (``put_timeout``, if
+      ``put`` is not passed a timeout), and then raise ``queue.Full``.  With ``block=False``,
+      raise ``queue.Full`` immediately.
+    - ``'drop'``: drop the new item (``put`` returns False).
+    - ``'drop_oldest'``: drop the oldest item in the queue, making room for the new item, and
+      call ``on_evict(item)`` with the dropped item (by the producer, outside the lock).
+    - ``'raise'``: raise ``queue.Full``.
+
+    When the number of items reaches ``high_water_mark``, the queue is *overloaded*, and
+    ``on_high_water()`` is called, by the producer.  When it falls back to ``low_water_mark``,
+    ``on_low_water()`` is called, by the consumer.  Each is called once
+    per crossing, outside the lock of the queue.  Producers can also check ``is_overloaded()``.
+    """
+
+    OVERFLOW_POLICIES = ('block', 'drop', 'drop_oldest', 'raise')
+
+    def __init__(self, capacity=1024, overflow_policy='block', *, put_timeout=None,
+                 high_water_mark=None, low_water_mark=None,
+                 on_high_water=None, on_low_water=None, on_evict=None, metrics=None):
+        """
+        :param overflow_policy: see above.
+        :param put_timeout: the default timeout of a blocking ``put``, with the ``'block'`` policy.
+        :param high_water_mark: if passed, the number of items at which the queue is overloaded.
+        :param low_water_mark: the number of items at which the queue is no longer overloaded.
+            Defaults to half the high water mark.
+        :param on_evict: called with each item dropped by the ``'drop_oldest'`` policy.
+        :param metrics: a ``ThreadClassMetrics`` (see ``merethread.metrics``), for recording
+            overflows.  Only updated when the queue overflows, or reaches its high water mark.
+        """
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError('Invalid overflow_policy: %r' % overflow_policy)
+        if high_water_mark is not None:
+            if not 0 < high_water_mark <= capacity:
+                raise ValueError('Invalid high_water_mark: %r' % high_water_mark)
+            if low_water_mark is None:
+                low_water_mark = high_water_mark // 2
+            if not 0 <= low_water_mark < high_water_mark:
+                raise ValueError('Invalid low_water_mark: %r' % low_water_mark)
+        super().__init__(capacity)
+        self.overflow_policy = overflow_policy
+        self.put_timeout = put_timeout
+        self.high_water_mark = high_water_mark
+        self.low_water_mark = low_water_mark
+        self.on_high_water = on_high_water
+        self.on_low_water = on_low_water
+        self.on_evict = on_evict
+        self.metrics = metrics
+        self.stats = QueueStats()
+        self._overloaded = False
+
+    def put(self, item, block=True, timeout=None):
+        stats = self.stats
+        dropped = False
+        evicted = None
+        high_water = False
+        with self._not_full:
+            if self._size == self.capacity:
+                policy = self.overflow_policy
+                if policy == 'drop':
+                    stats.dropped += 1
+                    dropped = True
+                elif policy == 'drop_oldest':
+                    evicted = self._drop_oldest()
+                    stats.dropped += 1
+                    dropped = True
+                elif policy == 'block' and block:
+                    self._wait_not_full(self.put_timeout if timeout is None else timeout)
+                else:
+                    self._reject()
+            if self._size < self.capacity:
+                self._buffer[(self._head + self._size) % self.capacity] = item
+                self._size += 1
+                stats.queued += 1
+                if self._size > stats.max_depth:
+                    stats.max_depth = self._size
+                if self._num_getters:
+                    self._not_empty.notify()
+                hwm = self.high_water_mark
+                if hwm is not None and not self._overloaded and self._size >= hwm:
+                    self._overloaded = high_water = True
+                    stats.high_water_count += 1
+                queued = True
+            else:
+                queued = False  # dropped by the 'drop' policy
+        if dropped and self.metrics is not None:
+            self.metrics.record_overflow(dropped=1)
+        if evicted is not None and self.on_evict is not None:
+            self.on_evict(evicted)
+        if high_water:
+            if self.metrics is not None:
+                self.metrics.record_overflow(high_water=1)
+            if self.on_high_water is not None:
+                self.on_high_water()
+        return queued
+
+    def _wait_not_full(self, timeout):
+        # called with the lock held, when the queue is full
+        stats = self.stats
+        self._num_putters += 1
+        t0 = time.monotonic()
+        try:
+            has_room = self._not_full.wait_for(lambda: self._size < self.capacity, timeout)
+        finally:
+            self._num_putters -= 1
+            blocked_time = time.monotonic() - t0
+            stats.blocked_puts += 1
+            stats.blocked_time += blocked_time
+            if self.metrics is not None:
+                self.metrics.record_overflow(blocked_time=blocked_time)
+        if not has_room:
+            self._reject()
+
+    def _reject(self):
+        # called with the lock held
+        self.stats.rejected += 1
+        if self.metrics is not None:
+            self.metrics.record_overflow(rejected=1)
+        raise queue.Full
+
+    def get(self, timeout=None):
+        item = super().get(timeout)
+        if self._overloaded and self._size <= self.low_water_mark:
+            with self._not_empty:
+                low_water = self._overloaded and self._size <= self.low_water_mark
+                if low_water:
+                    self._overloaded = False
+            if low_water and self.on_low_water is not None:
+                self.on_low_water()
+        return item
+
+    def is_overloaded(self):
+        """
+        Has the queue reached its high water mark (and not yet fallen back to the low water
+        mark)?
+        """
+        return self._overloaded
+
+
+################################################################################
+# Priority queues
+
+class PriorityStats:
+    """
+    Statistics of a single priority level of a ``PriorityEventQueue``.  Updated under the lock
+    of the queue.
+
+    - ``depth``: the number of items currently queued.
+    - ``queued``: the number of items queued.
+    - ``dequeued``: the number of items taken out of the queue.
+    - ``wait_sum`` and ``wait_max``: the total and max number of seconds the items taken out of
+      the queue waited in it.
+    """
+
+    __slots__ = ('depth', 'queued', 'dequeued', 'wait_sum', 'wait_max')
+
+    def __init__(self):
+        self.depth = 0
+        self.queued = 0
+        self.dequeued = 0
+        self.wait_sum = 0.
+        self.wait_max = 0.
+
+    @property
+    def wait_mean(self):
+        if not self.dequeued:
+            return None
+        return self.wait_sum / self.dequeued
+
+    def copy(self):
+        other = PriorityStats()
+        for attr in self.__slots__:
+            setattr(other, attr, getattr(self, attr))
+        return other
+
+    def __repr__(self):
+        return '<%s %s>' % (
+            self.__class__.__name__,
+            ' '.join('%s=%s' % (attr, getattr(self, attr)) for attr in self.__slots__))
+
+
+class PriorityEventQueue:
+    """
+    An unbounded event-queue with priority levels: ``0`` (the highest) to
+    ``num_priorities - 1`` (the lowest, and the default).  ``put`` takes a ``priority``.
+
+    ``get`` returns the oldest item of the highest priority, with one exception, which prevents
+    starvation: when non-empty levels have been passed over ``starvation_limit`` times in a row,
+    the oldest item of the one passed over the most times (the higher priority, on ties) is
+    returned next.  This guarantees each non-empty level a share of the items, and bounds the
+    number of items taken before a high-priority item, regardless of the number of
+    lower-priority items queued.
+
+    Per-priority statistics (depth, and the time items waited) are kept in ``stats``.
+    """
+
+    def __init__(self, num_priorities=3, *, starvation_limit=100, clock=time.monotonic):
+        if num_priorities < 1:
+            raise ValueError('Invalid num_priorities: %r' % num_priorities)
+        if starvation_limit < 1:
+            raise ValueError('Invalid starvation_limit: %r' % starvation_limit)
+        self.num_priorities = num_priorities
+        self.starvation_limit = starvation_limit
+        self.clock = clock
+        self.stats = [PriorityStats() for _ in range(num_priorities)]
+        self._levels = [collections.deque() for _ in range(num_priorities)]  # of (time, item)
+        self._passed_over = [0] * num_priorities
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._num_getters = 0
+        self._wakeup_pending = False
+
+    def put(self, item, block=True, timeout=None, *, priority=None):
+        # unbounded, so never blocks.  block and timeout are accepted for compatibility.
+        if priority is None:
+            priority = self.num_priorities - 1
+        elif not 0 <= priority < self.num_priorities:
+            raise ValueError('Invalid priority: %r' % priority)
+        with self._cond:
+            self._levels[priority].append((self.clock(), item))
+            stats = self.stats[priority]
+            stats.depth += 1
+            stats.queued += 1
+            self._size += 1
+            if self._num_getters:
+                self._cond.notify()
+        return True
+
+    def put_nowait(self, item, *, priority=None):
+        return self.put(item, priority=priority)
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._size:
+                self._num_getters += 1
+                try:
+                    if not self._cond.wait_for(
+                            lambda: self._size or self._wakeup_pending, timeout):
+                        return None
+                finally:
+                    self._num_getters -= 1
+                if not self._size:
+                    self._wakeup_pending = False
+                    return None
+            priority = self._next_priority()
+            t, item = self._levels[priority].popleft()
+            wait = self.clock() - t
+            stats = self.stats[priority]
+            stats.depth -= 1
+            stats.dequeued += 1
+            stats.wait_sum += wait
+            if wait > stats.wait_max:
+                stats.wait_max = wait
+            self._size -= 1
+            return item
+
+    def _next_priority(self):
+        # called with the lock held, when the queue is not empty
+        levels = self._levels
+        passed_over = self._passed_over
+        chosen = None
+        max_passed_over = self.starvation_limit - 1
+        for priority, level in enumerate(levels):
+            if not level:
+                passed_over[priority] = 0
+            elif chosen is None:
+                chosen = priority
+                max_passed_over = max(max_passed_over, passed_over[priority])
+            elif passed_over[priority] > max_passed_over:
+                # starving, and passed over more than any higher level
+                chosen = priority
+                max_passed_over = passed_over[priority]
+        for priority, level in enumerate(levels):
+            if level and priority != chosen:
+                passed_over[priority] += 1
+        passed_over[chosen] = 0
+        return chosen
+
+    def wakeup(self):
+        with self._cond:
+            self._wakeup_pending = True
+            self._cond.notify_all()
+
+    def get_stats(self):
+        """
+        :return: a consistent snapshot of ``stats`` (a list of ``PriorityStats``).
+        """
+        with self._cond:
+            return [stats.copy() for stats in self.stats]
+
+    def qsize(self, priority=None):
+        """
+        :param priority: if passed, only items of this priority are counted.
+        """
+        if priority is None:
+            return self._size
+        return len(self._levels[priority])
+
+    def __len__(self):
+        return self.qsize()
+
+
+################################################################################
+# Coalescing queues
+
+class CoalescingStats:
+    """
+    Statistics of a ``CoalescingEventQueue``.  Updated under the lock of the queue.
+
+    - ``queued``: the number of items put.
+    - ``coalesced``: the number of items merged into a pending item with the same key.
+    - ``dequeued``: the number of (merged) items taken out of the queue.
+    """
+
+    __slots__ = ('queued', 'coalesced', 'dequeued')
+
+    def __init__(self):
+        self.queued = 0
+        self.coalesced = 0
+        self.dequeued = 0
+
+    def copy(self):
+        other = CoalescingStats()
+        for attr in self.__slots__:
+            setattr(other, attr, getattr(self, attr))
+        return other
+
+    def __repr__(self):
+        return '<%s %s>' % (
+            self.__class__.__name__,
+            ' '.join('%s=%s' % (attr, getattr(self, attr)) for attr in self.__slots__))
+
+
+class CoalescingEventQueue:
+    """
+    An unbounded event-queue which coalesces pending items with the same key.
+
+    The key of an item is ``key(item)`` (by default, the item itself).  When an item is put while
+    an item with the same key is pending, the pending item is replaced by
+    ``merge(pending_item, item)`` (by default, by the new item: last wins), and keeps its place in
+    the queue, so a frequently-updated key does not starve the others.  Items are otherwise
+    returned in the order their keys were first put.
+
+    ``merge`` is called with the lock of the queue held, so it should be quick, and must not use
+    the queue.
+    """
+
+    def __init__(self, key=None, merge=None, *, metrics=None):
+        """
+        :param key: a function for extracting the key of an item.  Keys must be hashable.
+        :param merge: a function for merging an item into the pending item with the same key,
+            returning the merged item.
+        :param metrics: a ``ThreadClassMetrics`` (see ``merethread.metrics``), for recording the
+            number of items coalesced.
+        """
+        self.key = key
+        self.merge = merge
+        self.metrics = metrics
+        self.stats = CoalescingStats()
+        self._items = collections.OrderedDict()  # key -> pending item
+        self._cond = threading.Condition(threading.Lock())
+        self._num_getters = 0
+        self._wakeup_pending = False
+
+    def put(self, item, block=True, timeout=None):
+        # unbounded, so never blocks.  block and timeout are accepted for compatibility.
+        key = item if self.key is None else self.key(item)
+        with self._cond:
+            stats = self.stats
+            stats.queued += 1
+            items = self._items
+            pending = items.get(key)
+            if pending is None:
+                items[key] = item
+                if self._num_getters:
+                    self._cond.notify()
+                return True
+            items[key] = item if self.merge is None else self.merge(pending, item)
+            stats.coalesced += 1
+        if self.metrics is not None:
+            self.metrics.record_coalesced()
+        return True
+
+    def put_nowait(self, item):
+        return self.put(item)
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._items:
+                self._num_getters += 1
+                try:
+                    if not self._cond.wait_for(
+                            lambda: self._items or self._wakeup_pending, timeout):
+                        return None
+                finally:
+                    self._num_getters -= 1
+                if not self._items:
+                    self._wakeup_pending = False
+                    return None
+            _, item = self._items.popitem(last=False)
+            self.stats.dequeued += 1
+            return item
+
+    def wakeup(self):
+        with self._cond:
+            self._wakeup_pending = True
+            self._cond.notify_all()
+
+    def get_stats(self):
+        """
+        :return: a consistent snapshot of ``stats`` (a ``CoalescingStats``).
+        """
+        with self._cond:
+            return self.stats.copy()
+
+    def qsize(self):
+        """ The number of pending items (i.e. of distinct pending keys). """
+        return len(self._items)
+
+    def __len__(self):
+        return self.qsize()
+
+
+################################################################################
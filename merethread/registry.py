@@ -0,0 +1,133 @@
+"""
+A process-wide registry of merethread threads, for introspection.
+
+Every ``Thread`` is registered when created.  The registry only holds weak references, so it
+never keeps threads alive.
+
+The main use is inspecting a live process (e.g. on an incident): finding threads by class, name
+or status (``get_threads``), and dumping the stacks of many threads at once (``dump_stacks``).
+Dumping takes a single snapshot of all stacks, and groups threads with identical stacks, so a
+pool of 500 idle workers shows up as one stack with a count of 500.
+"""
+
+import sys
+import itertools
+import linecache
+import threading
+import weakref
+from collections import OrderedDict
+
+
+################################################################################
+# registry
+
+_threads = weakref.WeakSet()
+_lock = threading.Lock()
+_seq = itertools.count()  # for ordering threads by creation
+
+
+def register_thread(thread):
+    """
+    Add a thread to the registry.  Called by ``Thread.__init__``.
+    """
+    with _lock:
+        thread._registry_seq = next(_seq)
+        _threads.add(thread)
+
+
+def get_threads(cls=None, name=None, status=None):
+    """
+    Get the registered threads, optionally filtered.  Threads which haven't started yet, and
+    threads which are done, are also included, as long as they are referenced elsewhere.
+
+    :param cls: only threads which are instances of this class (or, if a string, whose class
+        has this name).
+    :param name: only threads with this name.
+    :param status: only threads with this ``ThreadStatus`` (or one of these, if a collection).
+    :return: a list of threads, in order of creation.
+    """
+    with _lock:
+        threads = list(_threads)
+    if cls is not None:
+        if isinstance(cls, str):
+            threads = [t for t in threads if type(t).__name__ == cls]
+        else:
+            threads = [t for t in threads if isinstance(t, cls)]
+    if name is not None:
+        threads = [t for t in threads if t.name == name]
+    if status is not None:
+        statuses = status if isinstance(status, (set, frozenset, list, tuple)) else (status,)
+        threads = [t for t in threads if t.status() in statuses]
+    threads.sort(key=lambda t: t._registry_seq)
+    return threads
+
+
+def get_live_threads(cls=None, name=None):
+    """
+    Same as ``get_threads``, but only threads which are alive.
+    """
+    return [t for t in get_threads(cls=cls, name=name) if t.is_alive()]
+
+
+################################################################################
+# stack dumps
+
+def get_stack_groups(threads=None):
+    """
+    Take a single snapshot of the stacks of the given threads, and group together the threads
+    whose stacks are identical.
+
+    :param threads: defaults to all the live registered threads.  Can be any
+        ``threading.Thread`` objects (e.g. ``threading.enumerate()``).
+    :return: a list of ``(stack, threads)`` pairs, most common stack first.  ``stack`` is a
+        tuple of ``(filename, lineno, funcname)`` frames, outermost first.
+    """
+    if threads is None:
+        threads = get_live_threads()
+    frames = sys._current_frames()
+    groups = OrderedDict()
+    for t in threads:
+        frame = frames.get(t.ident)
+        if frame is None:
+            continue  # not running
+        groups.setdefault(_extract_stack(frame), []).append(t)
+    return sorted(groups.items(), key=lambda item: -len(item[1]))
+
+
+def dump_stacks(threads=None, file=None, max_names=5):
+    """
+    Dump the stacks of the given threads, grouping threads with identical stacks.
+
+    :param threads: same as in ``get_stack_groups``.
+    :param file: if passed, the dump is also written to this file object.
+    :param max_names: max number of thread names to list per group.
+    :return: the dump, as a multiline string.
+    """
+    lines = []
+    for stack, group in get_stack_groups(threads):
+        names = ', '.join(t.name for t in group[:max_names])
+        if len(group) > max_names:
+            names += ', ... (+%d more)' % (len(group) - max_names)
+        lines.append('\n# %d thread%s: %s' % (len(group), '' if len(group) == 1 else 's', names))
+        for filename, lineno, funcname in stack:
+            lines.append('File: "%s", line %d, in %s' % (filename, lineno, funcname))
+            line = linecache.getline(filename, lineno)
+            if line:
+                lines.append('  %s' % line.strip())
+    dump = '\n'.join(lines)
+    if file is not None:
+        file.write(dump + '\n')
+    return dump
+
+
+def _extract_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_filename, frame.f_lineno, code.co_name))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+################################################################################
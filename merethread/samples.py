@@ -6,8 +6,14 @@ Some of these are also used for unittesting.
 
 import time
 from .thread import Thread
-from .daemon import DaemonThread, EventLoopThread
-from .task import TaskThread, FunctionThread, LimitedTimeTaskThread, TimeoutTaskThread
+from .daemon import (
+    DaemonThread, EventLoopThread, BatchEventLoopThread, QueueEventLoopThread,
+    PriorityEventLoopThread, CoalescingEventLoopThread, PeriodicDaemonThread)
+from .task import (
+    TaskThread, FunctionThread, LimitedTimeTaskThread, TimeoutTaskThread, StreamingTaskThread)
+from .pool import PoolTask, LimitedTimePoolTask, TimeoutPoolTask
+from .process import ProcessTaskThread, ProcessFunctionThread
+from .green import GreenTask, LimitedTimeGreenTask, TimeoutGreenTask
 
 
 ################################################################################
@@ -78,6 +84,18 @@ class IdleDaemonThread(DaemonThread):
         self._sleep()
 
 
+class SlowStoppingDaemonThread(IdleDaemonThread):
+    """ A daemon thread which takes ``stop_delay`` seconds to stop """
+
+    def __init__(self, stop_delay=1, **kwargs):
+        super().__init__(**kwargs)
+        self.stop_delay = stop_delay
+
+    def _main_destroy(self):
+        time.sleep(self.stop_delay)
+        super()._main_destroy()
+
+
 class ReturningDaemonThread(DaemonThread):
     """ A daemon which returns immediately (not a valid behavior for a daemon) """
     def _main(self):
@@ -108,6 +126,19 @@ class MetronomeDaemonThread(DaemonThread):
         print(msg)
 
 
+class MetronomePeriodicDaemonThread(PeriodicDaemonThread):
+    """ A metronome which keeps time (doesn't drift) """
+
+    def __init__(self, period=1, **kwargs):
+        super().__init__(period=period / 2., **kwargs)
+        self.count = 0
+
+    def _on_tick(self, ticks):
+        msg = ['Tick', 'tocK'][self.count % 2]
+        self.count += ticks
+        print(msg)
+
+
 class MetronomeEventLoopThread(EventLoopThread):
     """ An event-loop based metronome """
 
@@ -135,6 +166,44 @@ class FaultyMetronomeEventLoopThread(MetronomeEventLoopThread):
         return super()._handle_event(event)
 
 
+class MetronomeBatchEventLoopThread(BatchEventLoopThread, MetronomeEventLoopThread):
+    """ A batching event-loop based metronome, printing the ticks and tocks of a batch at once """
+
+    def _handle_events(self, batch):
+        print(' '.join(batch))
+
+
+class FaultyMetronomeBatchEventLoopThread(MetronomeBatchEventLoopThread):
+    """ A batching event-loop based metronome, which sometime fails handling a batch """
+
+    def _handle_events(self, batch):
+        if self.count % 10 == 0:
+            raise RuntimeError('glitch')
+        return super()._handle_events(batch)
+
+
+class RecordingQueueEventLoopThread(QueueEventLoopThread):
+    """ An event-loop which records the events put in its queue """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.events = []
+
+    def _handle_event(self, event):
+        self.events.append(event)
+
+
+class RecordingPriorityEventLoopThread(PriorityEventLoopThread, RecordingQueueEventLoopThread):
+    """ A priority event-loop which records the events put in its queue """
+    pass
+
+
+class RecordingCoalescingEventLoopThread(
+        CoalescingEventLoopThread, RecordingQueueEventLoopThread):
+    """ A coalescing event-loop which records the (coalesced) events it handles """
+    pass
+
+
 ################################################################################
 # TaskThread samples
 
@@ -189,6 +258,39 @@ class SlowTaskThread(TaskThread):
             x += 1
 
 
+class CountingStreamingTaskThread(StreamingTaskThread):
+    """ A task which yields the numbers up to ``n``, sleeping ``period`` between them """
+
+    RESULT = SAMPLE_RESULT
+
+    def __init__(self, n=10, period=None, **kwargs):
+        super().__init__(**kwargs)
+        self.n = n
+        self.period = period
+        self.closed = False
+
+    def _main(self):
+        try:
+            for i in range(self.n):
+                if self.period is not None:
+                    self._sleep(self.period)
+                yield i
+        finally:
+            self.closed = True
+        return self.RESULT
+
+
+class FailedStreamingTaskThread(StreamingTaskThread):
+    """ A task which yields a few items, and then raises an exception """
+
+    EXCEPTION_TYPE = type(SAMPLE_EXCEPTION)
+
+    def _main(self):
+        yield 0
+        yield 1
+        _fail()
+
+
 def noop_function_thread():
     """ Same as `NoopTaskThread`_, but implemeted using a `FunctionThread`_ """
     return FunctionThread(_noop_func)
@@ -257,6 +359,165 @@ class FailedTimeoutTaskThread(TimeoutTaskThread):
         _fail()
 
 
+################################################################################
+# PoolTask samples
+
+class NoopPoolTask(PoolTask):
+    """ Same as `NoopTaskThread`_, but implemented as a `PoolTask`_ """
+
+    RESULT = SAMPLE_RESULT
+
+    def _main(self):
+        return self.RESULT
+
+
+class IdlePoolTask(PoolTask):
+    """ Same as `IdleTaskThread`_, but implemented as a `PoolTask`_ """
+
+    RESULT = SAMPLE_RESULT
+
+    def __init__(self, period=10, **kwargs):
+        super().__init__(**kwargs)
+        self.period = period
+
+    def _main(self):
+        self._sleep(self.period)
+        return self.RESULT
+
+
+class FailedPoolTask(PoolTask):
+    """ Same as `FailedTaskThread`_, but implemented as a `PoolTask`_ """
+
+    EXCEPTION_TYPE = type(SAMPLE_EXCEPTION)
+
+    def _main(self):
+        _fail()
+
+
+class IdleLimitedTimePoolTask(LimitedTimePoolTask):
+    """ A pool task which sleeps until expired """
+
+    def _main(self):
+        self._sleep(9999999999)
+
+
+class IdleTimeoutPoolTask(TimeoutPoolTask):
+    """ A pool task which sleeps until expired """
+
+    def _main(self):
+        self._sleep(9999999999)
+
+
+################################################################################
+# ProcessTaskThread samples
+
+class ProcessSlowTaskThread(ProcessTaskThread, SlowTaskThread):
+    """ Same as `SlowTaskThread`_, but running in a worker process """
+    pass
+
+
+class ProcessIdleTaskThread(ProcessTaskThread, IdleTaskThread):
+    """ Same as `IdleTaskThread`_, but running in a worker process """
+    pass
+
+
+class ProcessFailedTaskThread(ProcessTaskThread, FailedTaskThread):
+    """ Same as `FailedTaskThread`_, but running in a worker process """
+    pass
+
+
+class ProcessIdleTimeoutTaskThread(ProcessTaskThread, IdleTimeoutTaskThread):
+    """ Same as `IdleTimeoutTaskThread`_, but running in a worker process """
+    pass
+
+
+def idle_process_function_thread(period=10, **kwargs):
+    """
+    Same as `idle_function_thread`_, but running in a worker process.
+    The function is not well-behaved, so it can only be stopped by killing the worker process.
+
+    ``kwargs`` are passed to the thread.
+    """
+    return ProcessFunctionThread(_long_func, args=(period,), **kwargs)
+
+
+################################################################################
+# GreenTask samples
+
+class NoopGreenTask(GreenTask):
+    """ Same as `NoopTaskThread`_, but implemented as a `GreenTask`_ """
+
+    RESULT = SAMPLE_RESULT
+
+    def _main(self):
+        yield self._stop_if_requested()
+        return self.RESULT
+
+
+class IdleGreenTask(GreenTask):
+    """ Same as `IdleTaskThread`_, but implemented as a `GreenTask`_ """
+
+    RESULT = SAMPLE_RESULT
+
+    def __init__(self, period=10, **kwargs):
+        super().__init__(**kwargs)
+        self.period = period
+
+    def _main(self):
+        yield self._sleep(self.period)
+        return self.RESULT
+
+
+class AsyncIdleGreenTask(IdleGreenTask):
+    """ Same as `IdleGreenTask`_, but implemented as a coroutine """
+
+    async def _main(self):
+        await self._sleep(self.period)
+        return self.RESULT
+
+
+class FailedGreenTask(GreenTask):
+    """ Same as `FailedTaskThread`_, but implemented as a `GreenTask`_ """
+
+    EXCEPTION_TYPE = type(SAMPLE_EXCEPTION)
+
+    def _main(self):
+        yield self._stop_if_requested()
+        _fail()
+
+
+class BusyGreenTask(GreenTask):
+    """ A green task which counts forever, giving up control after every step """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.count = 0
+
+    def _main(self):
+        while True:
+            self.count += 1
+            yield self._stop_if_requested()
+
+
+class IdleLimitedTimeGreenTask(LimitedTimeGreenTask):
+    """ A green task which sleeps until expired """
+
+    def _main(self):
+        yield self._sleep()
+
+
+class IdleTimeoutGreenTask(TimeoutGreenTask):
+    """ A green task which sleeps until expired """
+
+    def _main(self):
+        yield self._sleep()
+
+
+class BusyTimeoutGreenTask(TimeoutGreenTask, BusyGreenTask):
+    """ A green task which counts until expired """
+    pass
+
+
 ################################################################################
 # misc
 
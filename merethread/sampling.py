@@ -0,0 +1,367 @@
+"""
+A low-overhead statistical (sampling) profiler for threads.
+
+Unlike deterministic profiling (``cProfile``, used by ``profile=True``), which slows busy
+threads down considerably, sampling is cheap enough to be left running in production, e.g. on
+live ``EventLoopThread``s.
+
+A single background ``StackSampler`` thread periodically captures the stacks of the threads
+registered with it (using ``sys._current_frames()``), and aggregates them into a
+``SampledProfile`` per thread, and per thread class.  A ``SampledProfile`` can be exported as
+collapsed stacks (the input format of flamegraph tools), or as pstats-compatible stats.
+
+The easiest way to use it is passing ``profile='sampling'`` to a thread, which registers the
+thread with the default sampler while it runs.  The thread's ``profiler`` attribute is then its
+``SampledProfile``.
+"""
+
+import os
+import sys
+import time
+import pstats
+import marshal
+import threading
+import weakref
+from collections import Counter
+
+from .daemon import DaemonThread
+
+
+################################################################################
+# Profiles
+
+class SampledProfile:
+    """
+    Stack samples of a thread (or a group of threads), aggregated by stack.
+
+    Supports the stats interface of ``cProfile.Profile`` (``create_stats``, ``print_stats``,
+    ``dump_stats``), so it can be passed to ``pstats.Stats``.  The times reported are estimates:
+    the number of samples multiplied by the sampling interval.  Call counts are not known, so the
+    number of samples is reported instead.
+    """
+
+    def __init__(self, interval):
+        """
+        :param interval: the sampling interval (seconds), used for estimating times.
+        """
+        self.interval = interval
+        self.num_samples = 0
+        self._stacks = Counter()  # stack -> number of samples
+        self._lock = threading.Lock()
+
+    def add_sample(self, stack):
+        """
+        :param stack: a tuple of ``(filename, firstlineno, funcname)`` frames, outermost first.
+        """
+        with self._lock:
+            self._stacks[stack] += 1
+            self.num_samples += 1
+
+    def get_stacks(self):
+        """
+        :return: a dict mapping stacks to number of samples.
+        """
+        with self._lock:
+            return dict(self._stacks)
+
+    def clear(self):
+        with self._lock:
+            self._stacks.clear()
+            self.num_samples = 0
+
+    ################################################################################
+    # collapsed stacks
+
+    def iter_collapsed(self):
+        """
+        Generate lines in the collapsed-stack format (``frame;frame;frame count``), which is the
+        input format of flamegraph tools.
+        """
+        for stack, count in sorted(self.get_stacks().items()):
+            yield '%s %d' % (';'.join(_format_frame(frame) for frame in stack), count)
+
+    def write_collapsed(self, file):
+        """
+        Write the collapsed stacks to a file (a path or a file object).
+        """
+        if isinstance(file, str):
+            with open(file, 'w') as f:
+                return self.write_collapsed(f)
+        for line in self.iter_collapsed():
+            file.write(line + '\n')
+
+    ################################################################################
+    # pstats interface
+
+    def create_stats(self):
+        """
+        Populate ``self.stats``, in the format ``pstats.Stats`` expects.
+        """
+        interval = self.interval
+        self.stats = stats = {}
+        for stack, count in self.get_stacks().items():
+            if not stack:
+                continue
+            t = count * interval
+            for func in set(stack):
+                # cumulative: counted once per stack, even for recursive functions
+                cc, nc, tt, ct, callers = stats.get(func) or (0, 0, 0., 0., {})
+                stats[func] = (cc + count, nc + count, tt, ct + t, callers)
+            leaf = stack[-1]
+            cc, nc, tt, ct, callers = stats[leaf]
+            stats[leaf] = (cc, nc, tt + t, ct, callers)
+            for caller, callee in set(zip(stack, stack[1:])):
+                callers = stats[callee][4]
+                c_cc, c_nc, c_tt, c_ct = callers.get(caller, (0, 0, 0., 0.))
+                callers[caller] = (c_cc + count, c_nc + count, c_tt + t, c_ct + t)
+
+    def get_stats(self):
+        """
+        :return: a ``pstats.Stats`` object.
+        """
+        return pstats.Stats(self)
+
+    def print_stats(self, sort=-1):
+        self.get_stats().strip_dirs().sort_stats(sort).print_stats()
+
+    def dump_stats(self, file):
+        """
+        Write the stats to a file, which can be loaded using ``pstats.Stats(file)``.
+        """
+        self.create_stats()
+        with open(file, 'wb') as f:
+            marshal.dump(self.stats, f)
+
+    def __repr__(self):
+        return '<%s %d samples>' % (self.__class__.__name__, self.num_samples)
+
+
+def _format_frame(frame):
+    filename, lineno, funcname = frame
+    return '%s (%s:%d)' % (funcname, os.path.basename(filename), lineno)
+
+
+def _extract_stack(frame, max_depth):
+    stack = []
+    while frame is not None and len(stack) < max_depth:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+################################################################################
+# Sampler
+
+class StackSampler(DaemonThread):
+    """
+    A daemon thread which periodically samples the stacks of the threads registered with it.
+
+    Threads are registered using ``add_thread`` (and unregistered using ``remove_thread``, or
+    automatically, once they are no longer alive).  The samples are aggregated into a
+    ``SampledProfile`` per thread (returned by ``add_thread``), and per thread class
+    (``get_class_profile``).
+
+    The overhead is bounded: if taking a sample takes longer than ``max_overhead`` (a fraction)
+    of the sampling interval, the sampler waits longer between samples.
+    """
+
+    interval = 0.01
+    max_depth = 100
+    max_overhead = 0.02
+
+    def __init__(self, *, interval=None, max_depth=None, max_overhead=None, **kwargs):
+        """
+        :param interval: number of seconds between samples.
+        :param max_depth: max number of frames to capture per stack (innermost frames are kept).
+        :param max_overhead: max fraction of time to spend sampling.
+        """
+        super().__init__(**kwargs)
+        if interval is not None:
+            self.interval = interval
+        if max_depth is not None:
+            self.max_depth = max_depth
+        if max_overhead is not None:
+            self.max_overhead = max_overhead
+        if self.interval <= 0:
+            raise ValueError('Invalid sampling interval: %r' % self.interval)
+        self._threads = {}  # ident -> (weakref to thread, SampledProfile)
+        self._class_profiles = {}  # class name -> SampledProfile
+        self._lock = threading.Lock()
+        self._delay = self.interval
+
+    ################################################################################
+    # interface
+
+    def add_thread(self, thread=None):
+        """
+        Start sampling a thread (which must be alive).
+
+        :param thread: defaults to the current thread.
+        :return: the thread's ``SampledProfile``.
+        """
+        if thread is None:
+            thread = threading.current_thread()
+        if thread.ident is None:
+            raise RuntimeError('cannot sample a thread which is not started')
+        cls_name = type(thread).__name__
+        with self._lock:
+            entry = self._threads.get(thread.ident)
+            if entry is not None and entry[0]() is thread:
+                return entry[1]
+            profile = SampledProfile(self.interval)
+            self._threads[thread.ident] = (weakref.ref(thread), profile)
+            if cls_name not in self._class_profiles:
+                self._class_profiles[cls_name] = SampledProfile(self.interval)
+        return profile
+
+    def remove_thread(self, thread=None):
+        """
+        Stop sampling a thread.
+
+        :param thread: defaults to the current thread.
+        """
+        if thread is None:
+            thread = threading.current_thread()
+        with self._lock:
+            entry = self._threads.get(thread.ident)
+            if entry is not None and entry[0]() is thread:
+                del self._threads[thread.ident]
+
+    def get_class_profile(self, cls):
+        """
+        :param cls: a thread class, or a class name.
+        :return: the ``SampledProfile`` aggregating the samples of all threads of the class, or
+            None if no such thread has been sampled.
+        """
+        if not isinstance(cls, str):
+            cls = cls.__name__
+        with self._lock:
+            return self._class_profiles.get(cls)
+
+    @property
+    def class_profiles(self):
+        """ a dict mapping class names to their ``SampledProfile`` """
+        with self._lock:
+            return dict(self._class_profiles)
+
+    def num_threads(self):
+        """ the number of threads currently sampled """
+        with self._lock:
+            return len(self._threads)
+
+    ################################################################################
+    # main
+
+    def _main_iteration(self):
+        self._sleep(self._delay)
+        t0 = time.perf_counter()
+        self.sample()
+        cost = time.perf_counter() - t0
+        self._delay = max(self.interval, cost / self.max_overhead - cost)
+
+    def sample(self):
+        """
+        Take a single sample of all registered threads.
+        """
+        with self._lock:
+            entries = list(self._threads.items())
+            class_profiles = self._class_profiles
+        if not entries:
+            return
+        frames = sys._current_frames()
+        max_depth = self.max_depth
+        dead = []
+        for ident, (ref, profile) in entries:
+            thread = ref()
+            frame = frames.get(ident)
+            if thread is None or frame is None or not thread.is_alive():
+                dead.append((ident, ref))
+                continue
+            stack = _extract_stack(frame, max_depth)
+            profile.add_sample(stack)
+            class_profiles[type(thread).__name__].add_sample(stack)
+        if dead:
+            with self._lock:
+                for ident, ref in dead:
+                    entry = self._threads.get(ident)
+                    if entry is not None and entry[0] is ref:
+                        del self._threads[ident]
+
+
+_default_sampler = None
+_default_sampler_lock = threading.Lock()
+
+
+def get_default_stack_sampler():
+    """
+    The ``StackSampler`` used by ``profile='sampling'`` by default (created and started on first
+    use).
+    """
+    global _default_sampler
+    with _default_sampler_lock:
+        if _default_sampler is None:
+            _default_sampler = StackSampler(name='StackSampler')
+            _default_sampler.start()
+        return _default_sampler
+
+
+################################################################################
+# Thread integration
+
+class SamplingProfileContext:
+    """
+    A context manager for sampling the current thread while running a block.  Used by threads
+    created with ``profile='sampling'``.
+
+    ``profiler`` is the ``SampledProfile`` of the thread.
+    """
+
+    def __init__(self, sampler=None, print_stats=False, print_stats_kwargs=None,
+                 dump_to_file=None, collapsed_file=None):
+        """
+        :param sampler: the ``StackSampler`` to use.  Defaults to ``get_default_stack_sampler()``.
+        :param print_stats: if True, will print stats on exit
+        :param dump_to_file: if passed, will ``dump_stats`` to this path on exit
+        :param collapsed_file: if passed, will write collapsed stacks to this path on exit
+        """
+        self.sampler = sampler
+        self.print_stats = print_stats
+        self.print_stats_kwargs = print_stats_kwargs
+        self.dump_to_file = dump_to_file
+        self.collapsed_file = collapsed_file
+        self.profiler = None
+
+    def __enter__(self):
+        if self.sampler is None:
+            self.sampler = get_default_stack_sampler()
+        self.profiler = self.sampler.add_thread()
+
+    def __exit__(self, type, value, tb):
+        self.sampler.remove_thread()
+
+        if self.print_stats:
+            kwargs = self.print_stats_kwargs or {}
+            try:
+                self.profiler.print_stats(**kwargs)
+            except Exception:
+                # __exit__ must not raise
+                pass
+
+        if self.dump_to_file is not None:
+            try:
+                self.profiler.dump_stats(self.dump_to_file)
+            except Exception:
+                # __exit__ must not raise
+                pass
+
+        if self.collapsed_file is not None:
+            try:
+                self.profiler.write_collapsed(self.collapsed_file)
+            except Exception:
+                # __exit__ must not raise
+                pass
+
+
+################################################################################
@@ -3,9 +3,13 @@ Definitions of task-thread types: temporary threads which are meant
 to perform a single task.
 """
 
+import collections
 import datetime
+import inspect
+import threading
 from concurrent.futures import CancelledError
 from .thread import Thread, ThreadStatus, _ThreadStop
+from .misc import monotonic_ns, timedelta_to_ns
 
 
 ################################################################################
@@ -85,29 +89,56 @@ class TaskThread(Thread):
                 raise
 
 
-class _ExpiringTaskThread(TaskThread):
+class _ExpiringTaskMixin:
     """
-    An abstract thread to run a task with a predefined expiry.
-    When expires, the thread exits gracefully.
+    A mixin adding a predefined expiry to a task.
+    When expires, the task exits gracefully.
 
     ``expiry`` can be:
 
-     - int/float: number of seconds since thread is started
-     - datetime.timedelta: time since thread is started
+     - int/float: number of seconds since task is started
+     - datetime.timedelta: time since task is started
      - datetime.datetime: absolute expiration time
 
+    The expiry is enforced using the task's ``_now_ns`` clock (monotonic, by default), so it is
+    not affected by system clock adjustments.  An absolute expiration time is converted to a
+    deadline on that clock when the task starts.
+
+    With the default (monotonic) clock, the deadline is owned by a shared ``DeadlineScheduler``
+    (see ``merethread.deadlines``), which marks the task as expired when its time is up, so
+    checking for expiry in ``_stop_if_requested`` doesn't need to read the clock.  With a custom
+    clock, the clock is read on every check instead.
+
+    The mixin only relies on the task hooks (``_on_enter``, ``_on_exit``, ``_sleep``,
+    ``_on_thread_stop``) and on ``_now`` and ``_now_ns``, so it can be combined with any task type
+    implementing them.
     """
 
     class _Expired(_ThreadStop):
         """ An internal error raised to signal it has expired and should stop executing. """
         pass
 
-    def __init__(self, *, expiry, **kwargs):
+    # True for the default DeadlineScheduler, or a DeadlineScheduler.  If False, the clock
+    # is read on every expiry check.
+    deadline_scheduler = True
+
+    def __init__(self, *, expiry, deadline_scheduler=None, **kwargs):
+        """
+        :param expiry: see above.
+        :param deadline_scheduler: True for the default ``DeadlineScheduler``, a
+            ``DeadlineScheduler``, or False for checking the clock on every expiry check.
+            Ignored when using a custom clock.
+        """
         super().__init__(**kwargs)
+        if deadline_scheduler is not None:
+            self.deadline_scheduler = deadline_scheduler
 
         self._expiry_raw = expiry
-        self._expiry = None
+        self._expiry = None  # wall-clock expiration time, for display
+        self._expiry_ns = None  # deadline on the _now_ns clock, for enforcing
         self._expired = False
+        self._deadline_handle = None  # set while registered with a DeadlineScheduler
+        self._deadline_reached = False  # set by the DeadlineScheduler
 
         # If we got an invalid expiry, report it early:
         self._calc_expiry(self._expiry_raw)
@@ -117,19 +148,29 @@ class _ExpiringTaskThread(TaskThread):
 
         super()._on_enter()
         # set expiry:
-        self._expiry = self._calc_expiry(self._expiry_raw)
+        self._expiry, self._expiry_ns = self._calc_expiry(self._expiry_raw)
         # check if already expired:
         self._check_expiry()
-
-    def _sleep(self, timeout):
+        # register the deadline:
+        scheduler = self._get_deadline_scheduler()
+        if scheduler is not None:
+            self._deadline_handle = scheduler.add(self._expiry_ns, self._on_deadline)
+
+    def _on_exit(self):
+        handle = self._deadline_handle
+        if handle is not None:
+            self._get_deadline_scheduler().remove(handle)
+        super()._on_exit()
+
+    def _sleep(self, timeout=None):
         # enforcing expiry when sleeping
 
         # check if already expired:
         self._check_expiry()
         # modify timeout so we don't sleep beyond expiry:
         expire_after_sleep = False
-        max_timeout = (self._expiry - self._now()).total_seconds()
-        if timeout > max_timeout:
+        max_timeout = (self._expiry_ns - self._now_ns()) / 1e9
+        if timeout is None or timeout > max_timeout:
             timeout = max(0, max_timeout)
             expire_after_sleep = True
         # sleep:
@@ -139,6 +180,11 @@ class _ExpiringTaskThread(TaskThread):
             raise self._Expired()
         self._check_expiry()  # just in case
 
+    def _check_stop_requested(self):
+        # enforcing expiry when checking for stop
+        super()._check_stop_requested()
+        self._check_expiry()
+
     def _on_thread_stop(self, e):
         # handle exit-on-expiry
 
@@ -149,21 +195,49 @@ class _ExpiringTaskThread(TaskThread):
         return super()._on_thread_stop(e)
 
     def _check_expiry(self):
-        if self._now() >= self._expiry:
+        # this is called on every stop-check, so avoiding the clock when the scheduler owns the
+        # deadline, and else calling the clock directly, skipping _now_ns()
+        if self._deadline_handle is not None:
+            if self._deadline_reached:
+                raise self._Expired()
+        elif self._clock_ns() >= self._expiry_ns:
             raise self._Expired()
 
+    def _on_deadline(self):
+        # called by the DeadlineScheduler (in its thread) when the deadline is reached
+        self._deadline_reached = True
+
+    def _get_deadline_scheduler(self):
+        scheduler = self.deadline_scheduler
+        # (note: not checking the scheduler's truth value, which is its number of deadlines)
+        if scheduler is None or scheduler is False or self._clock_ns is not monotonic_ns:
+            # a custom clock: the scheduler's deadlines are on the monotonic clock
+            return None
+        if scheduler is True:
+            # imported here to avoid a circular import (the scheduler is a thread)
+            from .deadlines import get_default_deadline_scheduler
+            scheduler = get_default_deadline_scheduler()
+        return scheduler
+
     def _calc_expiry(self, expiry_raw):
+        """
+        :return: a ``(expiry, expiry_ns)`` tuple: the expiration time (for display), and the
+            deadline on the ``_now_ns`` clock.
+        """
+        now = self._now()
+        now_ns = self._now_ns()
         if isinstance(expiry_raw, datetime.datetime):
             # this is already the expiration time
-            return expiry_raw
+            delta = expiry_raw - now
         elif isinstance(expiry_raw, datetime.timedelta):
             # delta relative to now
-            return self._now() + expiry_raw
+            delta = expiry_raw
         elif isinstance(expiry_raw, (int, float)):
             # number of seconds, relative to now
-            return self._now() + datetime.timedelta(seconds=expiry_raw)
+            delta = datetime.timedelta(seconds=expiry_raw)
         else:
             raise TypeError('Invalid expiry: %r' % expiry_raw)
+        return now + delta, now_ns + timedelta_to_ns(delta)
 
     def is_expired(self):
         return self._expired
@@ -176,6 +250,16 @@ class _ExpiringTaskThread(TaskThread):
         raise NotImplementedError
 
 
+class _ExpiringTaskThread(_ExpiringTaskMixin, TaskThread):
+    """
+    An abstract thread to run a task with a predefined expiry.
+    When expires, the thread exits gracefully.
+
+    See `_ExpiringTaskMixin`_ for the supported ``expiry`` values.
+    """
+    pass
+
+
 class LimitedTimeTaskThread(_ExpiringTaskThread):
     """
     A `TaskThread` which runs for a predefined period of time, and then finishes
@@ -238,3 +322,151 @@ class FunctionThread(TaskThread):
 
 
 ################################################################################
+
+class StreamingTaskThread(TaskThread):
+    """
+    A task which streams its results to a consumer, as they are produced.  ``_main`` is a
+    generator, and the items it yields are passed to the consumer through a bounded buffer::
+
+        class RowsTaskThread(StreamingTaskThread):
+            def _main(self):
+                for row in self.query():
+                    yield row
+                return 'done'
+
+        task = RowsTaskThread(buffer_size=100)
+        task.start()
+        for row in task.iter_results():
+            ...
+
+    When the buffer is full, the task blocks until the consumer takes the items (backpressure),
+    so the memory used is bounded, regardless of the number of items produced.  (The consumer
+    takes all the buffered items at once, so up to twice ``buffer_size`` items are held.)
+
+    The task checks for stop (``_stop_if_requested``) at each yield, so when cancelled (e.g. by
+    the consumer), it stops at its next yield, including when blocked on a full buffer.
+
+    The value returned by the generator is the result of the task, and is set on its future, as
+    for any task.
+    """
+
+    # the max number of items in the buffer.  Can also be passed to the constructor.
+    buffer_size = 1000
+
+    def __init__(self, *, buffer_size=None, **kwargs):
+        """
+        :param buffer_size: see ``buffer_size`` above.
+        """
+        super().__init__(**kwargs)
+        if buffer_size is not None:
+            self.buffer_size = buffer_size
+        if self.buffer_size < 1:
+            raise ValueError('Invalid buffer_size: %r' % self.buffer_size)
+        self._buffer = collections.deque()
+        lock = threading.Lock()
+        self._not_empty = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+        self._num_getters = 0
+        self._num_putters = 0
+        self._stream_ended = False
+
+    ################################################################################
+    # consumer interface
+
+    def iter_results(self, timeout=None):
+        """
+        Iterate over the items yielded by the task, as they are produced.  Meant to be used by a
+        single consumer.
+
+        The iteration ends when the task finishes, after the items left in the buffer.  If the
+        task aborted (or was cancelled), its exception is raised then.  If the consumer stops
+        iterating before that (e.g. breaks out of the loop), the task is cancelled.
+
+        :param timeout: the max number of seconds to wait for each item.
+        :raise TimeoutError: if no item is produced within ``timeout``.
+        """
+        try:
+            while True:
+                items = self._get_items(timeout)
+                if not items:
+                    break
+                yield from items
+        except GeneratorExit:
+            self.cancel('consumer stopped iterating')
+            raise
+        self.reraise()
+
+    def __iter__(self):
+        return self.iter_results()
+
+    def _get_items(self, timeout):
+        """
+        Take all the items in the buffer (taking the lock once, rather than once per item).
+
+        :return: a list of items, empty if the stream has ended.
+        """
+        with self._not_empty:
+            buffer = self._buffer
+            if not buffer and not self._stream_ended:
+                self._num_getters += 1
+                try:
+                    if not self._not_empty.wait_for(
+                            lambda: self._buffer or self._stream_ended, timeout):
+                        raise TimeoutError()
+                finally:
+                    self._num_getters -= 1
+            items = list(buffer)
+            buffer.clear()
+            if self._num_putters:
+                self._not_full.notify()
+            return items
+
+    ################################################################################
+    # producer implementation
+
+    def _run_main(self):
+        gen = self._main()
+        if not inspect.isgenerator(gen):
+            raise TypeError('_main() of %s should be a generator function' % (
+                self.__class__.__name__))
+        try:
+            while True:
+                try:
+                    item = next(gen)
+                except StopIteration as e:
+                    return e.value
+                self._put_item(item)
+                self._stop_if_requested()
+        finally:
+            # (if stopped, this raises GeneratorExit at the yield, so the generator cleans up)
+            gen.close()
+
+    def _put_item(self, item):
+        with self._not_full:
+            if len(self._buffer) >= self.buffer_size:
+                self._num_putters += 1
+                try:
+                    while len(self._buffer) >= self.buffer_size:
+                        # (_request_stop notifies, so a stop request is not missed)
+                        self._check_stop_requested()
+                        self._not_full.wait()
+                finally:
+                    self._num_putters -= 1
+            self._buffer.append(item)
+            if self._num_getters:
+                self._not_empty.notify()
+
+    def _request_stop(self, reason=None):
+        super()._request_stop(reason)
+        # wake up the task if blocked on a full buffer
+        with self._not_full:
+            self._not_full.notify_all()
+
+    def _on_exit(self):
+        with self._not_empty:
+            self._stream_ended = True
+            self._not_empty.notify_all()
+        super()._on_exit()
+
+
+################################################################################
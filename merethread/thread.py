@@ -6,9 +6,11 @@ import datetime
 from enum import Enum
 import threading as threading
 from concurrent.futures import Future
-import lo99ing
 
-from .misc import Runtime, ProfileContext, NoopContext, get_currnet_stacktrace
+from .misc import (
+    Runtime, ProfileContext, NOOP_CONTEXT, LazyEvent, StopCheckThrottle, get_clock_ns,
+    get_currnet_stacktrace)
+from .registry import register_thread
 
 
 ################################################################################
@@ -50,7 +52,7 @@ class ThreadFuture(Future):
 
         def cb(fut):
             try:
-                result = fut.get_result()
+                result = fut.result()
             except Exception:
                 # error, so not calling the callback
                 pass
@@ -70,7 +72,7 @@ class ThreadFuture(Future):
 
         def eb(fut):
             try:
-                fut.get_result()
+                fut.result()
                 # no error, so not calling the errback
             except Exception as e:
                 return fn(fut.thread, e)
@@ -84,10 +86,233 @@ class ThreadFuture(Future):
             '(e.g. future.thread.cancel()).')
 
 
+# Futures are created on first access.  The stage of the thread (or task) is recorded, so a
+# future created late is brought up to date, and the lock makes creating the future and
+# advancing the stage mutually exclusive.  A single lock is shared by all threads, because it
+# is only held for a few attribute accesses.
+_FUTURE_PENDING, _FUTURE_RUNNING, _FUTURE_DONE = range(3)
+_future_lock = threading.Lock()
+
+# the values of the ``logger_mode`` option (see merethread.logs)
+LOGGER_MODES = ('name', 'class')
+
+
+################################################################################
+# The interface shared by threads and tasks
+
+class _ThreadCoreMixin:
+    """
+    The parts of the *merethread* thread interface which do not depend on running on a thread of
+    its own, shared by ``Thread`` and ``PoolTask``: the logger, the clock, cooperative stopping,
+    metrics, and the lazy future.
+
+    Classes using this mixin call ``_init_core`` from their constructor, implement the ``result``
+    and ``exception`` properties (used for setting the outcome of the future), and call
+    ``_set_future_running`` and ``_set_future_done`` as they run.
+    """
+
+    # stop-check amortization (see StopCheckThrottle_). Can also be passed to the constructor.
+    stop_check_every = None
+    stop_check_interval = None
+
+    # metrics collection (see merethread.metrics): None/False (disabled), True (using the default
+    # registry), or a MetricsRegistry.  Can also be passed to the constructor.
+    metrics = None
+
+    # the logger used when not passing a logger (or logger_name): 'name' (a logger per thread
+    # name) or 'class' (a logger shared by the threads of the class, see merethread.logs).
+    # Can also be passed to the constructor.
+    logger_mode = 'name'
+
+    def _init_core(self, logger, logger_name, logger_mode, clock,
+                   stop_check_every, stop_check_interval, metrics):
+        """
+        Initialize the state of the mixin.  The arguments are the constructor options of the
+        same names (see ``Thread.__init__``).
+        """
+        # the logger is created on first use (see the logger property)
+        self._logger = logger
+        self._logger_name = logger_name
+        if logger_mode is not None:
+            self.logger_mode = logger_mode
+        if self.logger_mode not in LOGGER_MODES:
+            raise ValueError('Invalid logger_mode: %r' % self.logger_mode)
+        # wall-clock (or custom) time, for display.  Durations and deadlines use _clock_ns, which
+        # is monotonic, unless a custom clock is passed.
+        self._clock = clock if clock is not None else datetime.datetime.now
+        self._clock_ns = get_clock_ns(clock)
+
+        self._stopping_event = LazyEvent()
+        self._stop_reason = None
+        if stop_check_every is not None:
+            self.stop_check_every = stop_check_every
+        if stop_check_interval is not None:
+            self.stop_check_interval = stop_check_interval
+        self._stop_check_throttle = None
+        self._stop_check_skip = 0
+        if self.stop_check_every is not None or self.stop_check_interval is not None:
+            self._stop_check_throttle = StopCheckThrottle(
+                every=self.stop_check_every, interval=self.stop_check_interval)
+
+        if metrics is not None:
+            self.metrics = metrics
+        self._metrics = None
+        if self.metrics:
+            # imported here to avoid a circular import (the exporters are threads)
+            from .metrics import get_class_metrics
+            self._metrics = get_class_metrics(self, self.metrics)
+
+        self._future = None  # created on first use (see the future property)
+        self._future_stage = _FUTURE_PENDING
+
+    ################################################################################
+    # stopping
+
+    def _request_stop(self, reason=None):
+        """
+        Signal the thread it should stop as soon as possible.
+
+        A well-behaved thread will stop shortly after ``_request_stop`` is called.
+
+        Can be called from any thread.
+        """
+        self.logger.info('stop requested (%s)', reason)
+        self._stop_reason = reason
+        self._stopping_event.set()
+
+    def _stop_if_requested(self):
+        """
+        Raises `_ThreadStop`_ if ``_request_stop`` has already been called.
+
+        This check is cheap (takes no lock), so it can be called in tight loops.  For even
+        tighter loops, the check can be amortized, using ``stop_check_every`` or
+        ``stop_check_interval``.
+
+        Subclasses adding conditions for stopping should override ``_check_stop_requested``.
+        """
+        n = self._stop_check_skip
+        if n:
+            # amortized: skipping this check
+            self._stop_check_skip = n - 1
+            return
+        throttle = self._stop_check_throttle
+        if throttle is not None:
+            self._stop_check_skip = throttle.next_skip()
+        self._check_stop_requested()
+
+    def _check_stop_requested(self):
+        """
+        The actual check performed by ``_stop_if_requested``.
+        """
+        if self._stopping_event.is_set():
+            raise _ThreadStop()
+
+    def _sleep(self, timeout=None):
+        """
+        Sleep for ``timeout`` seconds (or indefinitely, if None), or until ``_request_stop`` is
+        called.
+
+        :raise _ThreadStop: if ``_request_stop`` is called while (or prior to) sleeping.
+        """
+        is_stopping = self._stopping_event.wait(timeout)
+        if is_stopping:
+            raise _ThreadStop()
+
+    def is_stopping(self):
+        """
+        Is this thread being stopped?
+
+        A thread is in a "stopping" state if self._request_stop() has been called, but the thread
+        is still alive.
+        """
+        return self._stopping_event.is_set() and self.is_alive()
+
+    ################################################################################
+    # future
+
+    @property
+    def future(self):
+        """
+        A ThreadFuture_ which can be used for adding callbacks (and errbacks) to be
+        called when the thread finishes.
+
+        Useful mainly for ``TaskThread``s.
+
+        The future is created on first access (possibly after the thread finished).
+
+        :note: A ``Thread`` *cannot* be cancelled using ``t.future.cancel()`` (unlike a
+            ``PoolTask``, see ``PoolTaskFuture``).
+        """
+        fut = self._future
+        if fut is None:
+            with _future_lock:
+                fut = self._future
+                if fut is None:
+                    fut = self.Future(self)
+                    stage = self._future_stage
+                    if stage >= _FUTURE_RUNNING:
+                        fut.set_running_or_notify_cancel()
+                    if stage == _FUTURE_DONE:
+                        self._set_future_outcome(fut)
+                    self._future = fut
+        return fut
+
+    def _set_future_running(self):
+        self._advance_future(_FUTURE_RUNNING)
+
+    def _set_future_done(self):
+        """ Set the future with the result (or exception), once they are set. """
+        self._advance_future(_FUTURE_DONE)
+
+    def _advance_future(self, stage):
+        with _future_lock:
+            self._future_stage = stage
+            fut = self._future
+        if fut is None:
+            return  # no future yet.  It is brought up to date when created
+        if stage == _FUTURE_RUNNING:
+            fut.set_running_or_notify_cancel()
+        else:
+            self._set_future_outcome(fut)
+
+    def _set_future_outcome(self, fut):
+        if not fut.cancelled():
+            exception = self.exception
+            if exception is not None:
+                fut.set_exception(exception)
+            else:
+                fut.set_result(self.result)
+
+    ################################################################################
+    # other
+
+    @property
+    def logger(self):
+        """
+        The logger of the thread.  Created on first use, unless passed to the constructor.
+        """
+        logger = self._logger
+        if logger is None:
+            # imported here to avoid a circular import (merethread.logs defines a thread)
+            from .logs import get_thread_logger
+            logger = self._logger = get_thread_logger(self, self._logger_name, self.logger_mode)
+        return logger
+
+    @logger.setter
+    def logger(self, logger):
+        self._logger = logger
+
+    def _now(self):
+        return self._clock()
+
+    def _now_ns(self):
+        return self._clock_ns()
+
+
 ################################################################################
 # The MereThread thread baseclass
 
-class Thread(threading.Thread):
+class Thread(_ThreadCoreMixin, threading.Thread):
     """
     The *merethread* ``Thread`` baseclass.
     This class is merely a subclass of `threading.Thread`_, which adds various useful features and
@@ -129,28 +354,43 @@ class Thread(threading.Thread):
     ################################################################################
     # constructor
 
+    # (the stop_check_every, stop_check_interval, metrics and logger_mode options are defined in
+    # _ThreadCoreMixin.  They can also be passed to the constructor)
+
+    # a method which ``run`` calls instead of ``_main``, for thread types which drive their
+    # ``_main`` instead of just calling it (e.g. StreamingTaskThread, whose _main is a
+    # generator).  None for calling ``_main`` directly (keeping the stack of ``_main`` as is).
+    _run_main = None
+
     def __init__(self, *,
-                 logger=None, logger_name=None, clock=None,
+                 logger=None, logger_name=None, logger_mode=None, clock=None,
                  profile=False, profile_kwargs=None,
+                 stop_check_every=None, stop_check_interval=None,
+                 metrics=None,
                  **kwargs):
         """
+        :param logger: the logger to use.  By default, a logger is created (on first use)
+            according to ``logger_name`` and ``logger_mode``.
+        :param logger_name: the name of the logger to use.
+        :param logger_mode: see ``logger_mode`` (of ``_ThreadCoreMixin``).
+        :param clock: a function returning the current time (a ``datetime``), used for
+            timestamps.  By default, wall-clock time is used for timestamps, and a monotonic clock
+            for durations and expiry.  If passed, it is used for all of them.
         :param profile: If True, the thread will run with profiling enabled, using ProfileContext_.
+            If ``'sampling'``, the thread will be sampled by a low-overhead sampling profiler,
+            using ``SamplingProfileContext`` (see ``merethread.sampling``).
         :param profile_kwargs: extra kwargs to pass to the ``ProfileContext``.
+        :param stop_check_every: if passed, ``_stop_if_requested`` only checks once every
+            ``stop_check_every`` calls.
+        :param stop_check_interval: if passed, ``_stop_if_requested`` only checks approximately
+            once every ``stop_check_interval`` seconds.
+        :param metrics: if True, or a ``MetricsRegistry``, the thread's metrics are collected (see
+            ``merethread.metrics``).
         """
 
         super().__init__(**kwargs)
-
-        if logger is None:
-            if logger_name is None:
-                logger_name = '%s' % self.name
-            logger = lo99ing.get_logger(logger_name)
-        self.logger = logger
-        if clock is None:
-            clock = datetime.datetime.now
-        self._clock = clock
-
-        self._stopping_event = threading.Event()
-        self._stop_reason = None
+        self._init_core(logger, logger_name, logger_mode, clock,
+                        stop_check_every, stop_check_interval, metrics)
 
         if profile_kwargs is None:
             profile_kwargs = {}
@@ -159,8 +399,9 @@ class Thread(threading.Thread):
         # The following are private. subclasses should not set them:
         self.__result = None
         self.__exception = None
-        self.__runtime = self.Runtime(clock=self._clock)
-        self.__future = self.Future(self)
+        self.__runtime = self.Runtime(clock=clock)
+
+        register_thread(self)
 
     ################################################################################
     # main
@@ -179,14 +420,15 @@ class Thread(threading.Thread):
 
             try:
 
-                self.future.set_running_or_notify_cancel()
+                self._set_future_running()
 
                 # pre-start checks
                 if not self._stopping_event.is_set():
                     # starting
                     self._on_enter()
                     # main
-                    result = self._main()
+                    run_main = self._run_main
+                    result = self._main() if run_main is None else run_main()
                 else:
                     # thread stop requested before we got a chance to start running
                     self._handle_stop_before_start()
@@ -213,11 +455,11 @@ class Thread(threading.Thread):
                     self.__result = result
 
                 # set self.future with the result/exception:
-                if not self.future.cancelled():
-                    if exception is not None:
-                        self.future.set_exception(exception)
-                    else:
-                        self.future.set_result(result)
+                self._set_future_done()
+
+                if self._metrics is not None:
+                    runtime = self.__runtime
+                    self._metrics.record_exit(self, runtime.now_ns() - runtime.start_ns)
 
                 # other cleanups:
                 self._on_exit()
@@ -230,37 +472,6 @@ class Thread(threading.Thread):
         """
         return super().run()
 
-    ################################################################################
-    # stopping
-
-    def _request_stop(self, reason=None):
-        """
-        Signal the thread it should stop as soon as possible.
-
-        A well-behaved thread will stop shortly after ``_request_stop`` is called.
-
-        Can be called from any thread.
-        """
-        self.logger.info('stop requested (%s)', reason)
-        self._stop_reason = reason
-        self._stopping_event.set()
-
-    def _stop_if_requested(self):
-        """
-        Raises `_ThreadStop`_ if ``_request_stop`` has already been called.
-        """
-        self._sleep(0)
-
-    def _sleep(self, timeout):
-        """
-        Sleep for ``timeout`` seconds, or until ``_request_stop`` is called.
-
-        :raise _ThreadStop: if ``_request_stop`` is called while (or prior to) sleeping.
-        """
-        is_stopping = self._stopping_event.wait(timeout)
-        if is_stopping:
-            raise _ThreadStop()
-
     ################################################################################
     # state
 
@@ -270,15 +481,6 @@ class Thread(threading.Thread):
         """
         return self._started.is_set()
 
-    def is_stopping(self):
-        """
-        Is this thread being stopped?
-
-        A thread is in a "stopping" state if self._request_stop() has been called, but the thread
-        is still alive.
-        """
-        return self._stopping_event.is_set() and self.is_alive()
-
     def is_stopped(self):
         """
         Has this thread already stopped?
@@ -364,17 +566,23 @@ class Thread(threading.Thread):
     # profiling, debugging, introspection
 
     def _get_profiler_ctxmgr(self, profile, **kwargs):
-        if profile:
+        if profile == 'sampling':
+            # imported here to avoid a circular import (the sampler is a thread)
+            from .sampling import SamplingProfileContext
+            return SamplingProfileContext(**kwargs)
+        elif profile:
             return self.ProfileContext(**kwargs)
         else:
-            return NoopContext()
+            return NOOP_CONTEXT
 
     @property
     def profiler(self):
         """
         A profiler object which can be used for accessing profiler stats for this thread.
 
-        This is None if profiling has not been enabled (using the ``profile`` flag)
+        This is None if profiling has not been enabled (using the ``profile`` flag).
+        With ``profile='sampling'``, this is a ``SampledProfile``, which is None until the thread
+        starts.
         """
         return getattr(self._profiler_ctx, 'profiler', None)
 
@@ -388,24 +596,15 @@ class Thread(threading.Thread):
     def get_current_stacktrace(self):
         """
         :return: a multiline string capturing the current stack-trace of this thread.
+
+        For dumping the stacks of many threads, use ``merethread.registry.dump_stacks``
+        instead, which takes a single snapshot for all of them.
         """
         return get_currnet_stacktrace(self)
 
     ################################################################################
     # other
 
-    @property
-    def future(self):
-        """
-        A ThreadFuture_ which can be used for adding callbacks (and errbacks) to be
-        called when the thread finishes.
-
-        Useful mainly for ``TaskThread``s.
-
-        :note: The thread *cannot* be cancelled using ``t.future.cancel()``.
-        """
-        return self.__future
-
     @property
     def result(self):
         """
@@ -447,9 +646,6 @@ class Thread(threading.Thread):
         super().join(timeout)
         return not self.is_alive()
 
-    def _now(self):
-        return self._clock()
-
     def __repr__(self):
         assert self._initialized, "Thread.__init__() was not called"
 
@@ -2,10 +2,109 @@
 Potentially useful tools for working with threads.
 """
 
-from . import TaskThread
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import CancelledError, wait
 
 
 ################################################################################
+# Stopping many threads
+
+# the min number of seconds to wait for a thread whose future is done to exit, even if the
+# deadline has passed: it has finished its work, and only has its exit hooks left to run
+EXIT_GRACE_PERIOD = 0.5
+
+StopResult = namedtuple('StopResult', 'finished timed_out aborted')
+StopResult.__doc__ = """
+The outcome of ``stop_threads`` (or ``join_threads``): three lists of threads.
+
+:param finished: threads which finished (cancelled tasks included).
+:param timed_out: threads which did not finish in time.
+:param aborted: threads which finished due to an error (other than a ``CancelledError``).
+"""
+
+
+def stop_threads(threads, timeout=None, reason=None):
+    """
+    Stop many threads (or tasks), and wait for all of them to finish, under a single deadline.
+
+    All threads are signalled first (``TaskThread``s and ``PoolTask``s are cancelled, other
+    threads are stopped), so they stop in parallel, and stopping takes as long as the slowest
+    thread, instead of the sum of their stopping times.  Threads which cannot be stopped (e.g. a
+    running ``FunctionThread``) are only waited for.
+
+    :param timeout: the max number of seconds to wait, for all threads together.
+    :return: a ``StopResult``.
+    """
+    threads = list(threads)
+    for thread in threads:
+        _stop_thread(thread, reason)
+    return join_threads(threads, timeout)
+
+
+def join_threads(threads, timeout=None):
+    """
+    Wait for many threads (or tasks) to finish, under a single deadline.
+
+    The threads are waited for together, using their futures (a single wait, instead of a
+    ``join`` per thread).  Threads which were not started are not waited for (once stopped,
+    they will not run), and are reported as finished.  Threads which finished their work by the
+    deadline, but are still exiting, are given ``EXIT_GRACE_PERIOD`` seconds to exit.
+
+    :param timeout: the max number of seconds to wait, for all threads together.
+    :return: a ``StopResult``.
+    """
+    threads = list(threads)
+    end_time = None if timeout is None else time.monotonic() + timeout
+    waited = [t for t in threads if not _is_unstarted_thread(t)]
+    wait([t.future for t in waited], timeout)
+    # the future is set just before the thread exits, so the joins below are quick
+    result = StopResult([], [], [])
+    for thread in threads:
+        if _is_unstarted_thread(thread):
+            result.finished.append(thread)
+            continue
+        if not thread.future.done():
+            result.timed_out.append(thread)
+            continue
+        remaining = None
+        if end_time is not None:
+            # (even if the deadline has passed: the thread is exiting)
+            remaining = max(EXIT_GRACE_PERIOD, end_time - time.monotonic())
+        if not thread.join(remaining):
+            result.timed_out.append(thread)
+        elif _is_error(thread.exception):
+            result.aborted.append(thread)
+        else:
+            result.finished.append(thread)
+    return result
+
+
+def _stop_thread(thread, reason=None):
+    if thread.is_stopped():
+        return
+    try:
+        if hasattr(thread, 'cancel'):
+            thread.cancel(reason=reason)
+        else:
+            thread.stop(reason=reason)
+    except RuntimeError as e:
+        # cannot be stopped (e.g. a running FunctionThread): not failing the other threads
+        thread.logger.info('cannot be stopped, waiting for it to finish: %s', e)
+
+
+def _is_unstarted_thread(thread):
+    # (PoolTasks are not threads: a pending task is finalized by its executor, so it is waited for)
+    return isinstance(thread, threading.Thread) and not thread.is_started()
+
+
+def _is_error(exception):
+    return exception is not None and not isinstance(exception, CancelledError)
+
+
+################################################################################
+# Context managers
 
 class ThreadLifeCycleContext:
     """
@@ -16,7 +115,8 @@ class ThreadLifeCycleContext:
     print memory-consumption while a (long-running) block runs.
 
     On `__enter__`, the thread is started (if haven't been started before).
-    On `__exit__`, the thread is (optionally) stopped, and (optionally) joined.
+    On `__exit__`, the thread is (optionally) stopped, and (optionally) joined.  Multiple threads
+    are stopped together, and joined under a single deadline (see ``stop_threads``).
 
     To be clear, the threads are oblivious to the code running in the block.
     They run their own code, and the code in the block runs in the original caller thread.
@@ -31,8 +131,10 @@ class ThreadLifeCycleContext:
         :param threads: `merethread.Thread`s
         :param stop: whether to stop threads on __exit__
         :param join: whether to join threads on __exit__
-        :param join_timeout: timeout to pass to `thread.join()`, if `join=True`
-        :param raise_on_timeout: whether to raise a `TimeoutError` if `thread.join()` times out
+        :param join_timeout: max number of seconds to wait for the threads (all together) to
+            finish, if `join=True`
+        :param raise_on_timeout: whether to raise a `TimeoutError` (with the threads which did
+            not finish) if joining times out
         :param reraise: whether to reraise an exception causing one of the threads to abort
         :param suppress_keyboard_interrupt: whether to propagate KeyboardInterrupt exception
         """
@@ -44,6 +146,7 @@ class ThreadLifeCycleContext:
         self.should_reraise = reraise
         self.suppress_keyboard_interrupt = suppress_keyboard_interrupt
         self._stopped = False
+        self.stop_result = None  # the StopResult of joining the threads, once joined
 
     def __enter__(self):
         for thread in self.threads:
@@ -60,19 +163,10 @@ class ThreadLifeCycleContext:
 
         if self.should_join:
             interrupt = None
-            for thread in reversed(self.threads):
-                try:
-                    self._join_thread(thread)
-                except TimeoutError as e:
-                    new_exception = e
-                    break
-                except KeyboardInterrupt as e:
-                    interrupt = e
-                    new_exception = e
-                    break
-                except Exception as e:
-                    new_exception = e
-                    break
+            try:
+                new_exception = self._join()
+            except KeyboardInterrupt as e:
+                interrupt = e
 
             # handle KeyboardInterrupt raised while joining:
             if interrupt is not None:
@@ -81,13 +175,9 @@ class ThreadLifeCycleContext:
                     # note: we stop in case of KeyboardInterrupt, even if self.should_stop=False
                     self._stop()
                     # now join again, after stopping
-                    for thread in reversed(self.threads):
-                        try:
-                            self._join_thread(thread)
-                        except TimeoutError as e:
-                            return self._report_exception(exc_value, e)
-                        except Exception as e:
-                            return self._report_exception(exc_value, e)
+                    new_exception = self._join()
+                    if new_exception is not None:
+                        return self._report_exception(exc_value, new_exception)
 
                 return self._report_exception(exc_value, interrupt)
 
@@ -95,32 +185,22 @@ class ThreadLifeCycleContext:
 
     def _stop(self):
         self._stopped = True
+        reason = '%s.__exit__' % type(self).__name__
         for thread in reversed(self.threads):
-            self._stop_thread(thread)
+            _stop_thread(thread, reason)
 
-    def _stop_thread(self, thread):
-        if not thread.is_alive():
-            return
-        reason = '%s.__exit__' % type(self).__name__
-        if isinstance(thread, TaskThread):
-            thread.cancel(reason=reason)
-        else:
-            thread.stop(reason=reason)
+    def _join(self):
+        """
+        Join the threads, under a single deadline.
 
-    def _join_thread(self, thread):
-        is_done = thread.join(self.join_timeout)
-        if is_done:
-            if self.should_reraise:
-                self._reraise(thread)
-        else:
-            if self.should_raise_on_timeout:
-                raise TimeoutError(thread)
-
-    def _reraise(self, thread):
-        kwargs = {}
-        if isinstance(thread, TaskThread):
-            kwargs.update(suppress_cancelled=True)
-        thread.reraise(**kwargs)
+        :return: the exception to report, or None.
+        """
+        result = self.stop_result = join_threads(reversed(self.threads), self.join_timeout)
+        if result.aborted and self.should_reraise:
+            return result.aborted[0].exception
+        if result.timed_out and self.should_raise_on_timeout:
+            return TimeoutError(*result.timed_out)
+        return None
 
     def _report_exception(self, original_exception, new_exception=None):
         # suppress_keyboard_interrupt if relevant:
@@ -0,0 +1,115 @@
+"""
+A watchdog for detecting stalled daemon threads.
+
+A ``DaemonThread`` with a ``stall_timeout`` is monitored by a ``StallWatchdog`` while running:
+the thread records when each iteration of its main loop (``_main_iteration``, e.g. reading and
+handling an event, in an ``EventLoopThread``) begins, and the watchdog periodically checks for
+iterations running longer than the thread's ``stall_timeout``.  When it finds one, it captures
+the stack of the stalled thread, and calls the thread's ``_on_stall`` hook (in the watchdog
+thread).  Each stalled iteration is reported once.
+
+Checking is cheap (a few attribute reads per thread, and a stack snapshot only when a stall is
+found), so a single watchdog thread can monitor thousands of threads.
+"""
+
+import sys
+import threading
+import weakref
+
+from .daemon import DaemonThread
+from .misc import monotonic_ns, get_currnet_stacktrace
+
+
+################################################################################
+
+class StallWatchdog(DaemonThread):
+    """
+    A daemon thread which monitors the iterations of daemon threads, and reports the
+    iterations which stall (run longer than the thread's ``stall_timeout``).
+
+    Threads are added and removed automatically (by their main loop), according to their
+    ``stall_timeout`` and ``watchdog`` options.
+    """
+
+    check_interval = 1.
+
+    def __init__(self, *, check_interval=None, **kwargs):
+        """
+        :param check_interval: number of seconds between checks.  Stalls are detected at most
+            this long after the deadline.
+        """
+        super().__init__(**kwargs)
+        if check_interval is not None:
+            self.check_interval = check_interval
+        self._threads = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    ################################################################################
+    # interface
+
+    def add_thread(self, thread):
+        with self._lock:
+            self._threads.add(thread)
+
+    def remove_thread(self, thread):
+        with self._lock:
+            self._threads.discard(thread)
+
+    def num_threads(self):
+        """ the number of threads currently monitored """
+        with self._lock:
+            return len(self._threads)
+
+    ################################################################################
+    # main
+
+    def _main_iteration(self):
+        self._sleep(self.check_interval)
+        self.check()
+
+    def check(self):
+        """
+        Check all monitored threads for stalls, and report the stalled ones.
+
+        :return: the list of threads found stalled (in this check).
+        """
+        with self._lock:
+            threads = list(self._threads)
+        now = monotonic_ns()
+        stalled = []
+        for t in threads:
+            start = t._iteration_start_ns
+            if start is None or start == t._stall_reported_ns:
+                continue
+            if now - start > t._stall_timeout_ns:
+                t._stall_reported_ns = start
+                stalled.append((t, (now - start) / 1e9))
+        if not stalled:
+            return []
+        frames = sys._current_frames()  # a single snapshot for all stalled threads
+        for t, duration in stalled:
+            stacktrace = get_currnet_stacktrace(t, frames=frames)
+            try:
+                t._on_stall(duration, stacktrace)
+            except Exception as e:
+                self.logger.exception('error in _on_stall of %s', t, exc_info=e)
+        return [t for t, _ in stalled]
+
+
+_default_watchdog = None
+_default_watchdog_lock = threading.Lock()
+
+
+def get_default_watchdog():
+    """
+    The ``StallWatchdog`` used by daemon threads by default (created and started on first use).
+    """
+    global _default_watchdog
+    with _default_watchdog_lock:
+        if _default_watchdog is None:
+            _default_watchdog = StallWatchdog(name='StallWatchdog')
+            _default_watchdog.start()
+        return _default_watchdog
+
+
+################################################################################
@@ -27,7 +27,8 @@ setup(
     author_email='shx222@gmail.com',
     license='MIT',
 
-    packages=find_packages(exclude=['tests*']),
+    packages=find_packages(exclude=['tests*', 'benchmarks*']),
+    python_requires='>=3.7',
 
     # See https://pypi.python.org/pypi?%3Aaction=list_classifiers
     classifiers=[
@@ -50,6 +50,13 @@ class BaseThreadTest(unittest.TestCase):
             if time.time() > start_time + timeout:
                 raise RuntimeError('thread not started: %s' % t)
 
+    def wait_for(self, predicate, timeout=LONG_TIMEOUT):
+        start_time = time.time()
+        while not predicate():
+            time.sleep(self.SHORT_DELAY / 10)
+            if time.time() > start_time + timeout:
+                raise RuntimeError('timed out waiting for condition')
+
     def assert_not_started(self, t):
         self.assertFalse(t.is_alive())
         self.assertFalse(t.is_started())
@@ -0,0 +1,95 @@
+"""
+Unit-tests for AsyncioEventLoopThreads.
+"""
+
+import asyncio
+import time
+import concurrent.futures
+
+from .base import BaseThreadTest
+from merethread.aio import AsyncioEventLoopThread
+
+
+################################################################################
+
+async def _add(x, y):
+    await asyncio.sleep(0)
+    return x + y
+
+
+class AsyncioEventLoopThreadTest(BaseThreadTest):
+
+    def create_thread(self, tcls=AsyncioEventLoopThread, **kwargs):
+        kwargs.setdefault('lag_interval', self.SHORT_DELAY / 10)
+        return super().create_thread(tcls, **kwargs)
+
+    def test_submit(self):
+        t = self.start_thread(self.create_thread())
+        fut = t.submit(_add(1, 2))
+        self.assertIsInstance(fut, concurrent.futures.Future)
+        self.assertEqual(3, fut.result(self.SHORT_TIMEOUT))
+        self.assert_running(t)
+
+    def test_call_soon(self):
+        t = self.start_thread(self.create_thread())
+        res = concurrent.futures.Future()
+        t.call_soon(res.set_result, 'called')
+        self.assertEqual('called', res.result(self.SHORT_TIMEOUT))
+
+    def test_stop_cancels_pending_tasks(self):
+        t = self.start_thread(self.create_thread())
+        futs = [t.submit(asyncio.sleep(100)) for _ in range(10)]
+        self.wait_for(lambda: t.num_pending_tasks() == 10)
+        t0 = time.monotonic()
+        t.stop('testing')
+        t.join(self.SHORT_TIMEOUT)
+        self.assertLess(time.monotonic() - t0, self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertTrue(t.loop.is_closed())
+        for fut in futs:
+            self.assertTrue(fut.cancelled())
+
+    def test_stop_timeout(self):
+        async def stubborn():
+            while True:
+                try:
+                    await asyncio.sleep(100)
+                except asyncio.CancelledError:
+                    pass
+
+        t = self.start_thread(self.create_thread(stop_timeout=self.SHORT_DELAY))
+        t.submit(stubborn())
+        t.stop('testing')
+        self.assertTrue(t.join(self.SHORT_TIMEOUT))
+        self.assert_stopped_no_error(t)
+
+    def test_stop_before_start(self):
+        t = self.create_thread()
+        t.stop('testing')
+        t.start()
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertTrue(t.loop.is_closed())
+
+    def test_loop_lag(self):
+        t = self.start_thread(self.create_thread())
+        self.wait_for(lambda: t.loop_lag is not None)
+        self.assertEqual(0, t.num_pending_tasks())
+        t.call_soon(time.sleep, self.SHORT_DELAY)  # block the loop
+        self.wait_for(lambda: t.max_loop_lag >= self.SHORT_DELAY / 2)
+
+    def test_unhandled_errors(self):
+        errors = []
+        t = self.create_thread()
+        t._on_error = errors.append
+        self.start_thread(t)
+
+        def fail():
+            raise RuntimeError('failed')
+        t.call_soon(fail)
+        self.wait_for(lambda: errors)
+        self.assertIsInstance(errors[0], RuntimeError)
+        self.assert_running(t)
+
+
+################################################################################
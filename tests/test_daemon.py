@@ -2,10 +2,16 @@
 Unit-tests for DaemonThreads.
 """
 
+import time
+import collections
+
 from .base import BaseThreadTest
+from merethread.daemon import BatchEventLoopThread, QueueEventLoopThread, PeriodicDaemonThread
 from merethread.samples import (
     IdleDaemonThread,
     MetronomeDaemonThread, MetronomeEventLoopThread, FaultyMetronomeEventLoopThread,
+    MetronomeBatchEventLoopThread, FaultyMetronomeBatchEventLoopThread,
+    MetronomePeriodicDaemonThread,
     ReturningDaemonThread, AbortingDaemonThread)
 
 
@@ -76,4 +82,164 @@ class EventLoopThreadTest(_BaseDaemonThreadTest):
     ]
 
 
+class _RecordingBatchEventLoopThread(BatchEventLoopThread):
+    """ Handles events read from a list, recording batches and failed events """
+
+    def __init__(self, events, fail_on=(), **kwargs):
+        super().__init__(**kwargs)
+        self.events = collections.deque(events)
+        self.fail_on = set(fail_on)
+        self.batches = []
+        self.handled = []
+        self.failed = []
+
+    def _read_next_event(self):
+        if self.events:
+            return self.events.popleft()
+        self._sleep(BaseThreadTest.SHORT_DELAY / 10)
+
+    def _handle_event(self, event):
+        if event in self.fail_on:
+            raise RuntimeError(event)
+        self.handled.append(event)
+
+    def _handle_events(self, batch):
+        self.batches.append(batch)
+        super()._handle_events(batch)
+
+    def _on_event_error(self, event, e):
+        self.failed.append(event)
+
+
+class _RecordingQueueBatchEventLoopThread(BatchEventLoopThread, QueueEventLoopThread):
+    """ Handles events put in its queue, recording batches """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+
+    def _handle_events(self, batch):
+        self.batches.append(batch)
+
+
+class BatchEventLoopThreadTest(_BaseDaemonThreadTest):
+
+    VALID_DAEMON_THREADS = [
+        (MetronomeBatchEventLoopThread, METRONOME_KWARGS),
+        (FaultyMetronomeBatchEventLoopThread, METRONOME_KWARGS),
+    ]
+
+    def test_batches(self):
+        events = list(range(1000))
+        t = self.start_thread(self.create_thread(
+            _RecordingBatchEventLoopThread, events, fail_on=[5, 500], batch_size=64))
+        self.wait_for(lambda: len(t.handled) + len(t.failed) == len(events))
+        t.stop('testing')
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertEqual([e for e in events if e not in (5, 500)], t.handled)
+        self.assertEqual([5, 500], t.failed)
+        self.assertTrue(all(0 < len(b) <= 64 for b in t.batches))
+        self.assertLess(len(t.batches), 100)
+
+    def test_flush_by_age(self):
+        t = self.start_thread(self.create_thread(
+            _RecordingBatchEventLoopThread, [1, 2, 3], batch_size=64,
+            batch_max_wait=self.SHORT_DELAY))
+        self.wait_for(lambda: t.handled == [1, 2, 3])
+        self.assertEqual([[1, 2, 3]], t.batches)
+
+    def test_flush_by_age_blocking_reader(self):
+        # the queue goes idle with a partial batch
+        t = self.start_thread(self.create_thread(
+            _RecordingQueueBatchEventLoopThread, batch_size=64, batch_max_wait=self.SHORT_DELAY))
+        for event in [1, 2, 3]:
+            t.put(event)
+        self.wait_for(lambda: t.batches, timeout=self.SHORT_TIMEOUT * 2)
+        self.assertEqual([[1, 2, 3]], t.batches)
+        t.stop('testing')
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+
+    def test_invalid_batch_size(self):
+        self.assertRaises(ValueError, _RecordingBatchEventLoopThread, [], batch_size=0)
+
+
+class _RecordingPeriodicDaemonThread(PeriodicDaemonThread):
+    """ Records the times of its ticks.  Each tick takes ``work`` seconds (a list, consumed) """
+
+    def __init__(self, work=(), **kwargs):
+        super().__init__(**kwargs)
+        self.work = list(work)
+        self.ticks = []  # (time, ticks) pairs
+
+    def _on_tick(self, ticks):
+        self.ticks.append((time.monotonic(), ticks))
+        if self.work:
+            time.sleep(self.work.pop(0))
+
+
+class PeriodicDaemonThreadTest(_BaseDaemonThreadTest):
+
+    VALID_DAEMON_THREADS = [
+        (MetronomePeriodicDaemonThread, METRONOME_KWARGS),
+    ]
+
+    PERIOD = 0.02
+
+    def run_ticks(self, num_ticks, **kwargs):
+        t = self.create_thread(_RecordingPeriodicDaemonThread, period=self.PERIOD, **kwargs)
+        start = time.monotonic()
+        self.start_thread(t)
+        self.wait_for(lambda: len(t.ticks) >= num_ticks)
+        t.stop('testing')
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        return t, [(tick_time - start, ticks) for tick_time, ticks in t.ticks[:num_ticks]]
+
+    def test_no_drift(self):
+        # each tick takes half a period, which doesn't delay the following ticks
+        t, ticks = self.run_ticks(10, work=[self.PERIOD / 2] * 10)
+        last_time, _ = ticks[-1]
+        self.assertGreaterEqual(last_time, 10 * self.PERIOD)
+        self.assertLess(last_time, 10 * self.PERIOD + self.PERIOD / 2)
+        self.assertEqual(0, t.tick_stats.missed)
+        self.assertGreaterEqual(t.tick_stats.ticks, 10)
+        self.assertLess(t.tick_stats.lateness_max, self.PERIOD)
+
+    def test_skip(self):
+        # the 2nd tick takes 2.5 periods: the 3rd tick is skipped, and the 4th runs late
+        t, ticks = self.run_ticks(4, work=[0, 2.5 * self.PERIOD], missed_tick_policy='skip')
+        self.assertEqual([1, 1, 1, 1], [n for _, n in ticks])
+        self.assertGreaterEqual(ticks[2][0], 4.5 * self.PERIOD)
+        self.assertGreaterEqual(ticks[3][0], 5 * self.PERIOD)  # the 5th: back on schedule
+        self.assertEqual(1, t.tick_stats.missed)
+
+    def test_catch_up(self):
+        t, ticks = self.run_ticks(5, work=[0, 2.5 * self.PERIOD], missed_tick_policy='catch_up')
+        self.assertEqual([1, 1, 1, 1, 1], [n for _, n in ticks])
+        # the 3rd and 4th ticks run immediately after the 2nd, the 5th is back on schedule
+        self.assertLess(ticks[3][0] - ticks[2][0], self.PERIOD / 2)
+        self.assertGreaterEqual(ticks[4][0], 5 * self.PERIOD)
+        self.assertEqual(0, t.tick_stats.missed)
+
+    def test_coalesce(self):
+        t, ticks = self.run_ticks(4, work=[0, 2.5 * self.PERIOD], missed_tick_policy='coalesce')
+        # the 3rd and 4th ticks run as one, and the 5th is back on schedule
+        self.assertEqual([1, 1, 2, 1], [n for _, n in ticks])
+        self.assertGreaterEqual(ticks[3][0], 5 * self.PERIOD)
+        self.assertEqual(1, t.tick_stats.missed)
+
+    def test_jitter(self):
+        t, ticks = self.run_ticks(1, jitter=self.PERIOD)
+        self.assertGreaterEqual(ticks[0][0], self.PERIOD)
+        self.assertLess(ticks[0][0], 2 * self.PERIOD + self.PERIOD / 2)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, _RecordingPeriodicDaemonThread)
+        self.assertRaises(ValueError, _RecordingPeriodicDaemonThread, period=0)
+        self.assertRaises(
+            ValueError, _RecordingPeriodicDaemonThread, period=1, missed_tick_policy='nope')
+
+
 ################################################################################
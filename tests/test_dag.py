@@ -0,0 +1,155 @@
+"""
+Unit-tests for TaskGraph.
+"""
+
+import time
+from concurrent.futures import CancelledError
+
+from .base import BaseThreadTest
+from merethread.task import FunctionThread
+from merethread.dag import TaskGraph
+from merethread.samples import IdleTaskThread, FailedTaskThread, SAMPLE_RESULT, SAMPLE_EXCEPTION
+
+
+################################################################################
+
+class TaskGraphTest(BaseThreadTest):
+
+    def function_task(self, func):
+        """ :return: a factory of tasks which call ``func`` with the upstream results """
+        return lambda *args: self.create_thread(FunctionThread, func, args=args)
+
+    def idle_task(self, period):
+        return lambda *args: self.create_thread(IdleTaskThread, period=period)
+
+    def failed_task(self):
+        return lambda *args: self.create_thread(FailedTaskThread)
+
+    ################################################################################
+
+    def test_diamond(self):
+        graph = TaskGraph()
+        graph.add('total', self.function_task(lambda a, b: a + b), deps=['double', 'square'])
+        graph.add('load', self.function_task(lambda: 3))
+        graph.add('double', self.function_task(lambda x: x * 2), deps=['load'])
+        graph.add('square', self.function_task(lambda x: x * x), deps=['load'])
+        self.assertTrue(graph.run(self.LONG_TIMEOUT))
+        self.assertEqual({'load': 3, 'double': 6, 'square': 9, 'total': 15}, graph.results)
+        self.assertEqual({'succeeded'}, {node.status for node in graph.nodes.values()})
+        for node in graph.nodes.values():
+            self.assertTrue(node.runtime.is_ended)
+            self.assertTrue(node.task.is_stopped())
+        graph.reraise()  # assert no raise
+
+    def test_parallel(self):
+        graph = TaskGraph()
+        for i in range(4):
+            graph.add(i, self.idle_task(self.SHORT_DELAY))
+        t0 = time.monotonic()
+        self.assertTrue(graph.run(self.LONG_TIMEOUT))
+        self.assertLess(time.monotonic() - t0, self.SHORT_DELAY * 2)
+        self.assertEqual({i: SAMPLE_RESULT for i in range(4)}, graph.results)
+
+    def test_max_concurrency(self):
+        graph = TaskGraph(max_concurrency=2)
+        for i in range(4):
+            graph.add(i, self.idle_task(self.SHORT_DELAY))
+        t0 = time.monotonic()
+        self.assertTrue(graph.run(self.LONG_TIMEOUT))
+        self.assertGreaterEqual(time.monotonic() - t0, self.SHORT_DELAY * 2)
+        queued = [graph.nodes[i].queued_ns / 1e9 for i in range(4)]
+        self.assertLess(max(queued[:2]), self.SHORT_DELAY / 2)
+        self.assertGreaterEqual(min(queued[2:]), self.SHORT_DELAY / 2)
+
+    def test_failure_cancels_downstream(self):
+        graph = TaskGraph()
+        graph.add('load', self.failed_task())
+        graph.add('transform', self.function_task(lambda x: x), deps=['load'])
+        graph.add('report', self.function_task(lambda x: x), deps=['transform'])
+        graph.add('other', self.function_task(lambda: 1))
+        self.assertTrue(graph.run(self.LONG_TIMEOUT))
+        statuses = {name: node.status for name, node in graph.nodes.items()}
+        self.assertEqual(
+            {'load': 'failed', 'transform': 'cancelled', 'report': 'cancelled',
+             'other': 'succeeded'},
+            statuses)
+        self.assertIsNone(graph.nodes['transform'].task)
+        self.assertIsInstance(graph.nodes['report'].exception, CancelledError)
+        self.assertEqual([graph.nodes['load']], graph.failed_nodes())
+        self.assertRaises(type(SAMPLE_EXCEPTION), graph.reraise)
+
+    def test_factory_error(self):
+        def factory():
+            raise ValueError('bad factory')
+
+        graph = TaskGraph()
+        graph.add('a', factory)
+        graph.add('b', self.function_task(lambda x: x), deps=['a'])
+        self.assertTrue(graph.run(self.LONG_TIMEOUT))
+        self.assertEqual('failed', graph.nodes['a'].status)
+        self.assertEqual('cancelled', graph.nodes['b'].status)
+        self.assertRaises(ValueError, graph.reraise)
+
+    def test_slow_factory_not_in_upstream_runtime(self):
+        def slow_factory(x):
+            time.sleep(self.SHORT_DELAY)
+            return self.create_thread(FunctionThread, lambda: x)
+
+        graph = TaskGraph()
+        graph.add('a', self.function_task(lambda: 1))
+        graph.add('b', slow_factory, deps=['a'])
+        self.assertTrue(graph.run(self.LONG_TIMEOUT))
+        self.assertEqual({'a': 1, 'b': 1}, graph.results)
+        self.assertLess(graph.nodes['a'].runtime.total_seconds, self.SHORT_DELAY / 2)
+
+    def test_cancel(self):
+        graph = TaskGraph(max_concurrency=1)
+        graph.add('a', self.idle_task(self.LONG_TIMEOUT))
+        graph.add('b', self.idle_task(self.LONG_TIMEOUT))
+        graph.add('c', self.function_task(lambda x: x), deps=['a'])
+        graph.start()
+        self.wait_for(lambda: graph.nodes['a'].status == 'running')
+        graph.cancel('testing')
+        self.assertTrue(graph.wait(self.SHORT_TIMEOUT))
+        self.assertEqual(
+            {'cancelled'}, {node.status for node in graph.nodes.values()})
+        self.assertTrue(graph.nodes['a'].task.is_cancelled())
+        self.assertIsNone(graph.nodes['b'].task)
+
+    def test_critical_path(self):
+        graph = TaskGraph()
+        graph.add('quick', self.idle_task(0))
+        graph.add('slow', self.idle_task(self.SHORT_DELAY))
+        graph.add('after_quick', self.idle_task(0), deps=['quick'])
+        graph.add('last', self.idle_task(0), deps=['after_quick', 'slow'])
+        self.assertTrue(graph.run(self.LONG_TIMEOUT))
+        self.assertEqual(['slow', 'last'], [node.name for node in graph.critical_path()])
+        report = graph.format_report()
+        self.assertEqual(4, len(report.splitlines()))
+        self.assertIn('* slow', report)
+        self.assertNotIn('* quick', report)
+
+    def test_invalid(self):
+        graph = TaskGraph()
+        graph.add('a', self.idle_task(0), deps=['missing'])
+        self.assertRaises(ValueError, graph.start)
+
+        graph = TaskGraph()
+        graph.add('a', self.idle_task(0), deps=['c'])
+        graph.add('b', self.idle_task(0), deps=['a'])
+        graph.add('c', self.idle_task(0), deps=['b'])
+        graph.add('d', self.idle_task(0))
+        self.assertRaisesRegex(ValueError, 'cycle, among: a, b, c', graph.start)
+
+        graph = TaskGraph()
+        graph.add('a', self.idle_task(0))
+        self.assertRaises(ValueError, graph.add, 'a', self.idle_task(0))
+        graph.run(self.LONG_TIMEOUT)
+        self.assertRaises(RuntimeError, graph.add, 'b', self.idle_task(0))
+        self.assertRaises(ValueError, TaskGraph, max_concurrency=0)
+
+    def test_empty(self):
+        self.assertTrue(TaskGraph().run(0))
+
+
+################################################################################
@@ -0,0 +1,100 @@
+"""
+Unit-tests for the deadline scheduler.
+"""
+
+import time
+from datetime import datetime
+
+from .base import BaseThreadTest
+from merethread.deadlines import DeadlineScheduler
+from merethread.misc import monotonic_ns
+from merethread.task import TimeoutTaskThread
+from merethread.samples import SlowTaskThread, IdleTimeoutTaskThread
+
+
+################################################################################
+
+class _SlowTimeoutTaskThread(SlowTaskThread, TimeoutTaskThread):
+    pass
+
+
+class DeadlineSchedulerTest(BaseThreadTest):
+
+    def setUp(self):
+        super().setUp()
+        self.scheduler = self.start_thread(DeadlineScheduler(resolution=0.005, num_slots=16))
+
+    def tearDown(self):
+        self.scheduler.stop()
+        self.scheduler.join(self.SHORT_TIMEOUT)
+        super().tearDown()
+
+    def add(self, delay, fired, key):
+        return self.scheduler.add(
+            monotonic_ns() + int(delay * 1e9), lambda: fired.append((key, monotonic_ns())))
+
+    def test_fire(self):
+        fired = []
+        start = monotonic_ns()
+        self.add(0.05, fired, 'b')
+        self.add(0.02, fired, 'a')
+        self.add(-1, fired, 'past')  # already passed: fired on the next tick
+        self.assertEqual(3, len(self.scheduler))
+        time.sleep(self.SHORT_DELAY)
+        self.assertEqual(['past', 'a', 'b'], [key for key, _ in fired])
+        self.assertEqual(0, len(self.scheduler))
+        # not fired early:
+        self.assertGreaterEqual(fired[1][1] - start, int(0.02 * 1e9))
+        self.assertGreaterEqual(fired[2][1] - start, int(0.05 * 1e9))
+
+    def test_multiple_revolutions(self):
+        # the wheel (16 slots of 5ms) revolves every 80ms
+        fired = []
+        start = monotonic_ns()
+        self.add(0.2, fired, 'a')
+        time.sleep(0.15)
+        self.assertEqual([], fired)
+        time.sleep(self.SHORT_DELAY)
+        self.assertEqual(['a'], [key for key, _ in fired])
+        self.assertGreaterEqual(fired[0][1] - start, int(0.2 * 1e9))
+
+    def test_remove(self):
+        fired = []
+        handle = self.add(0.02, fired, 'a')
+        self.assertTrue(self.scheduler.remove(handle))
+        self.assertFalse(self.scheduler.remove(handle))
+        self.assertEqual(0, len(self.scheduler))
+        time.sleep(self.SHORT_DELAY)
+        self.assertEqual([], fired)
+
+    def test_busy_task_expires(self):
+        t = self.start_thread(self.create_thread(
+            _SlowTimeoutTaskThread, min=10 ** 12, expiry=self.SHORT_DELAY,
+            deadline_scheduler=self.scheduler))
+        time.sleep(self.SHORT_DELAY / 10)  # registered when entering
+        self.assertIsNotNone(t._deadline_handle)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_aborted(t, TimeoutError)
+        self.assertEqual(0, len(self.scheduler))
+
+    def test_done_task_unregistered(self):
+        t = self.start_thread(self.create_thread(
+            IdleTimeoutTaskThread, expiry=60, deadline_scheduler=self.scheduler))
+        time.sleep(self.SHORT_DELAY / 10)  # registered when entering
+        self.assertEqual(1, len(self.scheduler))
+        t.cancel()
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_cancelled(t)
+        self.assertEqual(0, len(self.scheduler))
+
+    def test_custom_clock_not_scheduled(self):
+        t = self.start_thread(self.create_thread(
+            IdleTimeoutTaskThread, expiry=self.SHORT_DELAY, deadline_scheduler=self.scheduler,
+            clock=datetime.now))
+        time.sleep(self.SHORT_DELAY / 10)
+        self.assertIsNone(t._deadline_handle)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_aborted(t, TimeoutError)
+
+
+################################################################################
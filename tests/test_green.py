@@ -0,0 +1,127 @@
+"""
+Unit-tests for GreenTaskScheduler and GreenTasks.
+"""
+
+import time
+
+from .base import BaseThreadTest
+from merethread.green import GreenTaskScheduler, sleep, checkpoint
+from merethread.samples import (
+    NoopGreenTask, IdleGreenTask, AsyncIdleGreenTask, FailedGreenTask, BusyGreenTask,
+    IdleLimitedTimeGreenTask, IdleTimeoutGreenTask, BusyTimeoutGreenTask,
+    SAMPLE_RESULT)
+
+
+################################################################################
+
+class GreenTaskSchedulerTest(BaseThreadTest):
+
+    EXPIRY = BaseThreadTest.SHORT_DELAY
+
+    def setUp(self):
+        super().setUp()
+        self.scheduler = self.start_thread(self.create_thread(GreenTaskScheduler))
+
+    def submit(self, tcls, **kwargs):
+        t = self.create_thread(tcls, **kwargs)
+        self.scheduler.submit_task(t)
+        self.wait_for_thread_to_start(t)
+        return t
+
+    ################################################################################
+
+    def test_not_started(self):
+        for tcls in [NoopGreenTask, IdleGreenTask, FailedGreenTask]:
+            t = self.create_thread(tcls)
+            self.assert_not_started(t)
+
+    def test_immediate_return(self):
+        t = self.submit(NoopGreenTask)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertEqual(t.RESULT, t.result)
+        self.assertTrue(t.runtime.is_ended)
+
+    def test_immediate_abort(self):
+        t = self.submit(FailedGreenTask)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_aborted(t)
+
+    def test_sleep(self):
+        for tcls in [IdleGreenTask, AsyncIdleGreenTask]:
+            t = self.submit(tcls, period=self.SHORT_DELAY)
+            self.assert_running(t)
+            self.assertIs(self.scheduler, t.worker)
+            self.assertIn('_main', t.get_current_stacktrace())
+            t.join(self.SHORT_TIMEOUT)
+            self.assert_stopped_no_error(t)
+            self.assertGreaterEqual(t.runtime.total.total_seconds(), self.SHORT_DELAY)
+
+    def test_cancel(self):
+        for tcls in [IdleGreenTask, AsyncIdleGreenTask, BusyGreenTask]:
+            t = self.submit(tcls)
+            self.assert_running(t)
+            t.cancel('testing')
+            t.join(self.SHORT_DELAY)
+            self.assert_cancelled(t)
+            self.assertIsNone(t.worker)
+
+    def test_expires(self):
+        t = self.submit(IdleLimitedTimeGreenTask, expiry=self.EXPIRY)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertTrue(t.is_expired())
+
+    def test_times_out(self):
+        for tcls in [IdleTimeoutGreenTask, BusyTimeoutGreenTask]:
+            t = self.submit(tcls, expiry=self.EXPIRY)
+            t.join(self.SHORT_TIMEOUT)
+            self.assertTrue(t.is_timed_out())
+            self.assert_aborted(t, TimeoutError)
+
+    def test_taking_turns(self):
+        tasks = [self.submit(BusyGreenTask) for _ in range(3)]
+        time.sleep(self.SHORT_DELAY)
+        counts = [t.count for t in tasks]
+        self.assertTrue(all(c > 0 for c in counts), counts)
+        for t in tasks:
+            t.cancel()
+
+    def test_many_sleeping(self):
+        tasks = [self.create_thread(IdleGreenTask, period=self.SHORT_DELAY) for _ in range(1000)]
+        futures = [self.scheduler.submit_task(t) for t in tasks]
+        for fut in futures:
+            self.assertEqual(SAMPLE_RESULT, fut.result(timeout=self.SHORT_TIMEOUT))
+        self.wait_for(lambda: self.scheduler.num_tasks() == 0)
+
+    def test_submit_function(self):
+        def gen_func(x):
+            yield sleep(0.01)
+            yield checkpoint()
+            return x * 2
+
+        async def async_func(x):
+            await sleep(0.01)
+            return x * 3
+
+        self.assertEqual(4, self.scheduler.submit(gen_func, 2).result(self.SHORT_TIMEOUT))
+        self.assertEqual(6, self.scheduler.submit(async_func, 2).result(self.SHORT_TIMEOUT))
+
+    def test_invalid_yield(self):
+        def bad_func():
+            yield 5
+
+        fut = self.scheduler.submit(bad_func)
+        self.assertRaises(TypeError, fut.result, self.SHORT_TIMEOUT)
+
+    def test_stop_cancels_tasks(self):
+        t = self.submit(IdleGreenTask)
+        self.scheduler.stop()
+        self.scheduler.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(self.scheduler)
+        self.assert_cancelled(t)
+        self.assertRaises(
+            RuntimeError, self.scheduler.submit_task, self.create_thread(IdleGreenTask))
+
+
+################################################################################
@@ -0,0 +1,114 @@
+"""
+Unit-tests for thread groups.
+"""
+
+import threading
+import collections
+
+from .base import BaseThreadTest
+from merethread.group import ShardedEventLoopGroup
+from merethread.queues import DequeEventQueue
+
+
+################################################################################
+
+class _RecordingGroup(ShardedEventLoopGroup):
+    """ Records the events handled per key, and the shard (thread) handling each key """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, key=lambda event: event[0], **kwargs)
+        self.lock = threading.Lock()
+        self.handled = collections.defaultdict(list)
+        self.threads = collections.defaultdict(set)
+        self.errors = []
+
+    def _handle_event(self, event):
+        key, value = event
+        if value is None:
+            raise RuntimeError('bad event')
+        with self.lock:
+            self.handled[key].append(value)
+            self.threads[key].add(threading.current_thread())
+
+    def _on_event_error(self, event, e):
+        with self.lock:
+            self.errors.append(event)
+
+
+class ShardedEventLoopGroupTest(BaseThreadTest):
+
+    NUM_KEYS = 20
+    NUM_EVENTS = 200
+
+    def create_group(self, **kwargs):
+        group = _RecordingGroup(4, **kwargs)
+        self._threads_created.extend(group.workers)
+        group.start()
+        return group
+
+    def put_events(self, group):
+        for i in range(self.NUM_EVENTS):
+            for key in range(self.NUM_KEYS):
+                group.put((key, i))
+        self.wait_for(lambda: sum(map(len, group.handled.values())) ==
+                      self.NUM_EVENTS * self.NUM_KEYS)
+
+    def test_per_key_order(self):
+        group = self.create_group()
+        self.put_events(group)
+        for key in range(self.NUM_KEYS):
+            self.assertEqual(list(range(self.NUM_EVENTS)), group.handled[key])
+            self.assertEqual(1, len(group.threads[key]))
+        self.assertEqual([0, 0, 0, 0], group.qsizes())
+
+    def test_rebalance_per_key_order(self):
+        group = self.create_group(rebalance=True)
+        self.put_events(group)
+        for key in range(self.NUM_KEYS):
+            self.assertEqual(list(range(self.NUM_EVENTS)), group.handled[key])
+        # all keys are idle now
+        self.wait_for(lambda: not group._assignments)
+        self.assertIsNone(group.shard_of(0))
+
+    def test_rebalance_dropped_events(self):
+        for policy in ('drop', 'drop_oldest'):
+            group = _RecordingGroup(4, rebalance=True, capacity=1, overflow_policy=policy)
+            self._threads_created.extend(group.workers)
+            # not started yet, so the queues fill up
+            queued = [group.put((key, 0)) for key in range(self.NUM_KEYS)]
+            self.assertEqual(4 if policy == 'drop' else self.NUM_KEYS, sum(queued))
+            # only the keys of the events still queued are pending
+            self.assertEqual(4, len(group._assignments))
+            group.start()
+            self.wait_for(lambda: sum(map(len, group.handled.values())) == 4)
+            self.wait_for(lambda: not group._assignments)
+            group.stop()
+            self.assertTrue(group.join(self.SHORT_TIMEOUT))
+
+    def test_event_error(self):
+        group = self.create_group()
+        group.put((1, None))
+        group.put((1, 'ok'))
+        self.wait_for(lambda: group.handled[1] == ['ok'])
+        self.assertEqual([(1, None)], group.errors)
+
+    def test_stop(self):
+        group = self.create_group()
+        self.assertTrue(group.is_alive())
+        self.assertFalse(group.future.done())
+        group.stop('testing')
+        self.assertTrue(group.join(self.SHORT_TIMEOUT))
+        self.assertFalse(group.is_alive())
+        self.assertIsNone(group.future.result(timeout=0))
+        for worker in group.workers:
+            self.assert_stopped(worker)
+            self.assertIsNone(worker.exception)
+
+    def test_invalid_num_shards(self):
+        self.assertRaises(ValueError, _RecordingGroup, 0)
+
+    def test_shared_queue(self):
+        self.assertRaises(ValueError, _RecordingGroup, 4, queue=DequeEventQueue())
+
+
+################################################################################
@@ -0,0 +1,138 @@
+"""
+Unit-tests for thread loggers and off-thread logging.
+"""
+
+import logging
+import threading
+
+from .base import BaseThreadTest
+from merethread.logs import LogWriterThread, ThreadLoggerAdapter, get_class_logger
+from merethread.samples import NoopTaskThread, NoopPoolTask
+
+
+################################################################################
+
+class _RecordingHandler(logging.Handler):
+
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level=level)
+        self.records = []
+        self.threads = []
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.append(threading.current_thread())
+
+    @property
+    def messages(self):
+        return [r.getMessage() for r in self.records]
+
+
+class _ClassLoggerTaskThread(NoopTaskThread):
+    logger_mode = 'class'
+
+
+class LoggerModeTest(BaseThreadTest):
+
+    def test_lazy(self):
+        t = self.create_thread(NoopTaskThread)
+        self.assertIsNone(t._logger)
+        self.assertIsNotNone(t.logger)
+        self.assertEqual(t.name, t.logger.name)
+
+    def test_class_mode(self):
+        handler = _RecordingHandler()
+        logger = get_class_logger(_ClassLoggerTaskThread)
+        logger.addHandler(handler)
+        try:
+            threads = [self.create_thread(_ClassLoggerTaskThread) for _ in range(2)]
+            for t in threads:
+                self.assertIsInstance(t.logger, ThreadLoggerAdapter)
+                self.assertIs(logger, t.logger.logger)
+                self.start_thread(t)
+                t.join(self.SHORT_TIMEOUT)
+        finally:
+            logger.removeHandler(handler)
+        for t in threads:
+            self.assertIn('%s: starting' % t.name, handler.messages)
+            self.assertIn(t.name, [r.thread_name for r in handler.records])
+        self.assertEqual({'_ClassLoggerTaskThread'}, {r.name for r in handler.records})
+
+    def test_class_mode_kwarg(self):
+        for tcls in [NoopTaskThread, NoopPoolTask]:
+            t = self.create_thread(tcls, logger_mode='class')
+            self.assertIs(get_class_logger(tcls), t.logger.logger)
+            self.assertEqual(t.name, t.logger.thread_name)
+
+    def test_invalid_mode(self):
+        self.assertRaises(ValueError, NoopTaskThread, logger_mode='nope')
+        self.assertRaises(ValueError, NoopPoolTask, logger_mode='nope')
+
+
+class LogWriterThreadTest(BaseThreadTest):
+
+    def setUp(self):
+        super().setUp()
+        self.logger = logging.getLogger('merethread.tests.%s' % self.id())
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.handler = _RecordingHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        super().tearDown()
+
+    def test_install(self):
+        writer = self.create_thread(LogWriterThread).install(self.logger)
+        self.assertNotIn(self.handler, self.logger.handlers)
+        for i in range(100):
+            self.logger.info('message %d', i)
+        writer.uninstall(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(writer)
+        self.assertEqual(['message %d' % i for i in range(100)], self.handler.messages)
+        self.assertEqual({writer}, set(self.handler.threads))
+        self.assertEqual([self.handler], self.logger.handlers)
+
+    def test_handler_level(self):
+        self.handler.setLevel(logging.WARNING)
+        writer = self.create_thread(LogWriterThread).install(self.logger)
+        self.logger.info('info')
+        self.logger.warning('warning')
+        writer.uninstall(self.SHORT_TIMEOUT)
+        self.assertEqual(['warning'], self.handler.messages)
+
+    def _fill(self, drop_policy):
+        # the writer is not started, so the queue fills up
+        writer = self.create_thread(
+            LogWriterThread, [self.handler], capacity=5, drop_policy=drop_policy)
+        records = [
+            logging.makeLogRecord({'msg': 'message %d' % i, 'levelno': logging.INFO})
+            for i in range(8)]
+        queued = [writer.enqueue(record) for record in records]
+        self.assertEqual(3, writer.num_dropped)
+        self.start_thread(writer)
+        writer.stop()
+        writer.join(self.SHORT_TIMEOUT)
+        return queued
+
+    def test_drop(self):
+        self.assertEqual([True] * 5 + [False] * 3, self._fill('drop'))
+        # drops are reported as soon as the writer handles a record
+        self.assertEqual(
+            ['message 0', 'log queue full: dropped 3 records'] +
+            ['message %d' % i for i in range(1, 5)],
+            self.handler.messages)
+
+    def test_drop_oldest(self):
+        self.assertEqual([True] * 8, self._fill('drop_oldest'))
+        self.assertEqual(
+            ['message 3', 'log queue full: dropped 3 records'] +
+            ['message %d' % i for i in range(4, 8)],
+            self.handler.messages)
+
+    def test_invalid_policy(self):
+        self.assertRaises(ValueError, LogWriterThread, drop_policy='nope')
+
+
+################################################################################
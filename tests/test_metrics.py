@@ -0,0 +1,177 @@
+"""
+Unit-tests for thread metrics.
+"""
+
+import os
+import tempfile
+import urllib.request
+
+from .base import BaseThreadTest
+from merethread import TaskPoolExecutor
+from merethread.daemon import BatchEventLoopThread
+from merethread.metrics import (
+    MetricsRegistry, Histogram, MetricsHTTPServerThread, MetricsFileWriterThread)
+from merethread.samples import (
+    NoopTaskThread, IdleTaskThread, FailedTaskThread, IdleTimeoutTaskThread, NoopPoolTask,
+    RecordingQueueEventLoopThread, IdleDaemonThread, MetronomePeriodicDaemonThread)
+
+
+################################################################################
+
+class _FaultyQueueEventLoopThread(RecordingQueueEventLoopThread):
+
+    def _handle_event(self, event):
+        if event < 0:
+            raise ValueError(event)
+        super()._handle_event(event)
+
+    def _on_event_error(self, event, e):
+        pass
+
+
+class _RecordingBatchEventLoopThread(BatchEventLoopThread, RecordingQueueEventLoopThread):
+
+    def _read_next_events(self, max_n, max_wait):
+        # QueueEventLoopThread reads one event at a time
+        event = self._read_next_event()
+        return [] if event is None else [event]
+
+
+class MetricsTest(BaseThreadTest):
+
+    def setUp(self):
+        super().setUp()
+        self.registry = MetricsRegistry()
+
+    def test_disabled_by_default(self):
+        t = self.create_thread(NoopTaskThread)
+        self.assertIsNone(t._metrics)
+
+    def test_task_outcomes(self):
+        threads = [
+            self.create_thread(NoopTaskThread, metrics=self.registry),
+            self.create_thread(FailedTaskThread, metrics=self.registry),
+            self.create_thread(IdleTaskThread, metrics=self.registry),
+            self.create_thread(IdleTimeoutTaskThread, expiry=0.01, metrics=self.registry),
+        ]
+        for t in threads:
+            self.start_thread(t)
+        threads[2].cancel()
+        for t in threads:
+            t.join(self.SHORT_TIMEOUT)
+
+        def outcomes(cls):
+            metrics = self.registry.get_class_metrics(cls)
+            return {k: c.value for k, c in metrics.outcomes.items() if c.value}
+
+        self.assertEqual(outcomes(NoopTaskThread), {'result': 1})
+        self.assertEqual(outcomes(FailedTaskThread), {'aborted': 1})
+        self.assertEqual(outcomes(IdleTaskThread), {'cancelled': 1})
+        self.assertEqual(outcomes(IdleTimeoutTaskThread), {'expired': 1})
+        self.assertEqual(self.registry.get_class_metrics(NoopTaskThread).runtime.count, 1)
+
+    def test_pool_task_outcomes(self):
+        with TaskPoolExecutor(2) as executor:
+            tasks = [NoopPoolTask(metrics=self.registry) for _ in range(5)]
+            for task in tasks:
+                executor.submit_task(task)
+            for task in tasks:
+                task.join(self.LONG_TIMEOUT)
+        metrics = self.registry.get_class_metrics(NoopPoolTask)
+        self.assertEqual(metrics.outcomes['result'].value, 5)
+
+    def test_event_loop(self):
+        t = self.start_thread(self.create_thread(
+            _FaultyQueueEventLoopThread, metrics=self.registry))
+        for event in [1, 2, -1, 3]:
+            t.put(event)
+        self.wait_for(lambda: len(t.events) == 3)
+        t.stop()
+        t.join(self.SHORT_TIMEOUT)
+        metrics = self.registry.get_class_metrics(_FaultyQueueEventLoopThread)
+        self.assertEqual(metrics.events_read.value, 4)
+        self.assertEqual(metrics.events_handled.value, 4)
+        self.assertEqual(metrics.event_errors.value, 1)
+        self.assertEqual(metrics.event_latency.count, 4)
+        self.assertGreaterEqual(metrics.iteration_duration.count, 4)
+        self.assertEqual(metrics.outcomes['result'].value, 1)
+
+    def test_batch_event_loop(self):
+        t = self.start_thread(self.create_thread(
+            _RecordingBatchEventLoopThread, batch_size=2, metrics=self.registry))
+        for event in range(5):
+            t.put(event)
+        self.wait_for(lambda: len(t.events) == 5)
+        t.stop()
+        t.join(self.SHORT_TIMEOUT)
+        metrics = self.registry.get_class_metrics(_RecordingBatchEventLoopThread)
+        self.assertEqual(metrics.events_read.value, 5)
+        self.assertEqual(metrics.events_handled.value, 5)
+        self.assertGreaterEqual(metrics.iteration_duration.count, 3)
+
+    def test_periodic(self):
+        t = self.start_thread(self.create_thread(
+            MetronomePeriodicDaemonThread, period=0.01, metrics=self.registry))
+        self.wait_for(lambda: t.tick_stats.ticks >= 3)
+        t.stop()
+        t.join(self.SHORT_TIMEOUT)
+        metrics = self.registry.get_class_metrics(MetronomePeriodicDaemonThread)
+        self.assertEqual(metrics.ticks.value, t.tick_stats.ticks)
+        self.assertEqual(metrics.tick_lateness.count, t.tick_stats.ticks)
+        self.assertEqual(metrics.iteration_duration.count, t.tick_stats.ticks)
+        self.assertIn('merethread_tick_lateness_seconds_count', self.registry.to_prometheus())
+
+    def test_histogram(self):
+        h = Histogram([1, 10])
+        for value in [0.5, 1, 5, 100]:
+            h.observe(value)
+        self.assertEqual(h.get_cumulative_counts(), [(1, 2), (10, 3), (float('inf'), 4)])
+        self.assertEqual(h.sum, 106.5)
+
+    def test_prometheus_format(self):
+        t = self.start_thread(self.create_thread(NoopTaskThread, metrics=self.registry))
+        t.join(self.SHORT_TIMEOUT)
+        text = self.registry.to_prometheus()
+        self.assertIn('# TYPE merethread_thread_outcomes_total counter', text)
+        self.assertIn(
+            'merethread_thread_outcomes_total{thread_class="NoopTaskThread",outcome="result"} 1',
+            text)
+        self.assertIn(
+            'merethread_thread_runtime_seconds_bucket{thread_class="NoopTaskThread",le="+Inf"} 1',
+            text)
+        self.assertIn('merethread_thread_runtime_seconds_count{thread_class="NoopTaskThread"} 1',
+                      text)
+
+    ################################################################################
+    # exporters
+
+    def test_http_server(self):
+        self.registry.get_class_metrics(IdleDaemonThread).errors.inc()
+        server = self.start_thread(self.create_thread(
+            MetricsHTTPServerThread, port=0, registry=self.registry))
+        try:
+            host, port = server.server_address
+            with urllib.request.urlopen('http://%s:%d/metrics' % (host, port), timeout=5) as r:
+                body = r.read().decode('utf-8')
+            self.assertEqual(body, self.registry.to_prometheus())
+        finally:
+            server.stop()
+            server.join(self.LONG_TIMEOUT)
+        self.assert_stopped(server)
+
+    def test_file_writer(self):
+        self.registry.get_class_metrics(IdleDaemonThread).errors.inc()
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'merethread.prom')
+            writer = self.start_thread(self.create_thread(
+                MetricsFileWriterThread, path, interval=0.01, registry=self.registry))
+            self.wait_for(lambda: os.path.exists(path))
+            self.registry.get_class_metrics(IdleDaemonThread).errors.inc()
+            writer.stop()
+            writer.join(self.SHORT_TIMEOUT)
+            with open(path) as f:
+                text = f.read()
+        self.assertIn('merethread_errors_total{thread_class="IdleDaemonThread"} 2', text)
+
+
+################################################################################
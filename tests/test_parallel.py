@@ -0,0 +1,183 @@
+"""
+Unit-tests for parallel_map.
+"""
+
+import time
+import threading
+
+from .base import BaseThreadTest
+from merethread.pool import TaskPoolExecutor
+from merethread.parallel import parallel_map, imap_unordered, _ParallelMap, _TimeoutMapChunkTask
+
+
+################################################################################
+
+def _double(x):
+    return x * 2
+
+
+class _Counter:
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def inc(self):
+        with self._lock:
+            self.count += 1
+
+
+class ParallelMapTest(BaseThreadTest):
+
+    def test_ordered(self):
+        self.assertEqual(
+            [x * 2 for x in range(1000)], list(parallel_map(_double, range(1000), max_workers=4)))
+
+    def test_unordered(self):
+        results = list(imap_unordered(_double, range(1000), max_workers=4))
+        self.assertEqual([x * 2 for x in range(1000)], sorted(results))
+
+    def test_unordered_yields_as_completed(self):
+        def func(x):
+            time.sleep(self.SHORT_DELAY if x == 0 else 0)
+            return x
+
+        results = list(imap_unordered(func, range(4), max_workers=4, chunk_size=1))
+        self.assertEqual(0, results[-1])
+
+    def test_empty(self):
+        self.assertEqual([], list(parallel_map(_double, [])))
+
+    def test_lazy_input(self):
+        consumed = _Counter()
+
+        def items():
+            for i in range(10 ** 9):
+                consumed.inc()
+                yield i
+
+        results = parallel_map(_double, items(), max_workers=2, chunk_size=10)
+        self.assertEqual([0, 2, 4], [next(results) for _ in range(3)])
+        results.close()
+        # at most 2 * max_workers chunks in flight
+        self.assertLessEqual(consumed.count, 2 * 2 * 10 + 10)
+
+    def test_automatic_chunking(self):
+        pm = _ParallelMap(_double, range(10000), True, 2, None, None, None)
+        self.assertEqual(1, pm.chunk_size)
+        self.assertEqual(10000, len(list(pm)))
+        self.assertGreater(pm.chunk_size, 1)
+
+    def test_fail_fast(self):
+        processed = _Counter()
+
+        def func(x):
+            if x == 5:
+                raise ValueError(x)
+            time.sleep(0.01)
+            processed.inc()
+            return x
+
+        t0 = time.monotonic()
+        self.assertRaises(ValueError, list, parallel_map(func, range(1000), max_workers=4))
+        self.assertLess(time.monotonic() - t0, self.SHORT_TIMEOUT)
+        time.sleep(self.SHORT_DELAY)
+        self.assertLess(processed.count, 100)
+
+    def test_fail_fast_ordered(self):
+        # a failure of a later item is raised without waiting for the earlier (slow) ones
+        def func(x):
+            if x == 0:
+                time.sleep(1)
+            elif x == 1:
+                raise ValueError(x)
+            return x
+
+        t0 = time.monotonic()
+        self.assertRaises(
+            ValueError, list, parallel_map(func, range(4), max_workers=4, chunk_size=1))
+        self.assertLess(time.monotonic() - t0, self.SHORT_TIMEOUT)
+
+    def test_timeout(self):
+        def func(x):
+            time.sleep(0.01)
+            return x
+
+        t0 = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            for _ in parallel_map(func, range(1000), max_workers=2, timeout=self.SHORT_DELAY):
+                pass
+        self.assertLess(time.monotonic() - t0, self.SHORT_TIMEOUT)
+
+    def test_timeout_not_reached(self):
+        self.assertEqual(
+            list(range(0, 20, 2)),
+            list(parallel_map(_double, range(10), timeout=self.LONG_TIMEOUT)))
+
+    def test_chunk_expiry_is_the_deadline(self):
+        # the expiry of a chunk is the (monotonic) deadline of the map, whenever it starts
+        deadline = time.monotonic() + self.LONG_TIMEOUT
+        t = _TimeoutMapChunkTask(func=_double, items=[1], expiry=deadline)
+        time.sleep(self.SHORT_DELAY)
+        t._run()
+        self.assertEqual([2], t.result)
+        self.assertAlmostEqual(deadline, t._expiry_ns / 1e9, delta=self.SHORT_DELAY / 2)
+        t = _TimeoutMapChunkTask(func=_double, items=[1], expiry=time.monotonic())
+        t._run()
+        self.assertTrue(t.is_expired())
+
+    def test_consumer_stops(self):
+        processed = _Counter()
+
+        def func(x):
+            time.sleep(0.001)
+            processed.inc()
+            return x
+
+        for x in parallel_map(func, range(100000), max_workers=2):
+            if x == 10:
+                break
+        time.sleep(self.SHORT_DELAY)
+        count = processed.count
+        time.sleep(self.SHORT_DELAY)
+        self.assertEqual(count, processed.count)
+
+    def test_executor(self):
+        executor = TaskPoolExecutor(2)
+        try:
+            self.assertEqual([0, 2, 4], list(parallel_map(_double, range(3), executor=executor)))
+            self.assertFalse(executor.is_shutdown())
+            self.assertEqual([6], list(parallel_map(_double, [3], executor=executor)))
+        finally:
+            executor.shutdown()
+
+    def test_max_workers_shared_executor(self):
+        # the executor has more workers than max_workers
+        running = _Counter()
+        peak = []
+        lock = threading.Lock()
+
+        def func(x):
+            with lock:
+                running.count += 1
+                peak.append(running.count)
+            time.sleep(0.005)
+            with lock:
+                running.count -= 1
+            return x
+
+        executor = TaskPoolExecutor(8)
+        try:
+            results = list(parallel_map(
+                func, range(40), max_workers=2, chunk_size=1, executor=executor))
+        finally:
+            executor.shutdown()
+        self.assertEqual(list(range(40)), results)
+        self.assertEqual(2, max(peak))
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, parallel_map, _double, [], max_workers=0)
+        self.assertRaises(ValueError, parallel_map, _double, [], chunk_size=0)
+
+
+################################################################################
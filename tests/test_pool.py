@@ -0,0 +1,156 @@
+"""
+Unit-tests for TaskPoolExecutor and PoolTasks.
+"""
+
+import time
+import threading
+from concurrent.futures import CancelledError
+
+from .base import BaseThreadTest
+from merethread.pool import TaskPoolExecutor
+from merethread.samples import (
+    NoopPoolTask, IdlePoolTask, FailedPoolTask,
+    IdleLimitedTimePoolTask, IdleTimeoutPoolTask,
+    SAMPLE_RESULT, SAMPLE_EXCEPTION, _noop_func, _fail)
+
+
+################################################################################
+
+class TaskPoolExecutorTest(BaseThreadTest):
+
+    SHORT_TIMEOUT = BaseThreadTest.SHORT_TIMEOUT * 2
+    EXPIRY = SHORT_TIMEOUT / 2
+
+    def setUp(self):
+        super().setUp()
+        self.executor = TaskPoolExecutor(2)
+
+    def tearDown(self):
+        super().tearDown()
+        self.executor.shutdown(cancel_futures=True)
+
+    def submit(self, tcls, **kwargs):
+        t = self.create_thread(tcls, **kwargs)
+        self.executor.submit_task(t)
+        self.wait_for_thread_to_start(t)
+        return t
+
+    ################################################################################
+
+    def test_not_started(self):
+        for tcls in [NoopPoolTask, IdlePoolTask, FailedPoolTask]:
+            t = self.create_thread(tcls)
+            self.assert_not_started(t)
+
+    def test_immediate_return(self):
+        t = self.submit(NoopPoolTask)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertEqual(t.RESULT, t.result)
+        self.assertTrue(t.runtime.is_ended)
+
+    def test_immediate_abort(self):
+        t = self.submit(FailedPoolTask)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_aborted(t)
+
+    def test_lazy_future(self):
+        # running the tasks directly, not accessing their futures until they are done
+        t = NoopPoolTask()
+        t._run()
+        self.assertIsNone(t._future)
+        self.assertEqual(t.RESULT, t.future.result(timeout=0))
+        t = FailedPoolTask()
+        t._run()
+        self.assertIs(t.exception, t.future.exception(timeout=0))
+
+    def test_cancel(self):
+        t = self.submit(IdlePoolTask)
+        self.assert_running(t)
+        self.assertIn(t.worker, self.executor.workers)
+        t.cancel('testing')
+        t.join(self.SHORT_DELAY)
+        self.assert_cancelled(t)
+        self.assertIsNone(t.worker)
+
+    def test_cancel_pending(self):
+        # occupy both workers, so the next task stays pending
+        running = [self.submit(IdlePoolTask) for _ in range(2)]
+        t = self.create_thread(IdlePoolTask)
+        fut = self.executor.submit_task(t)
+        self.assertTrue(fut.cancel())
+        for r in running:
+            r.cancel()
+        t.join(self.SHORT_TIMEOUT)
+        self.assertTrue(fut.cancelled())
+        self.assertTrue(t.is_cancelled())
+
+    def test_cancel_running_future(self):
+        t = self.submit(IdlePoolTask)
+        self.assert_running(t)
+        # like Future.cancel(), a running task is not affected
+        self.assertFalse(t.future.cancel())
+        self.assertFalse(t.future.cancelled())
+        t.join(self.SHORT_DELAY)
+        self.assert_running(t)
+        t.cancel('testing')
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_cancelled(t)
+
+    def test_expires(self):
+        t = self.submit(IdleLimitedTimePoolTask, expiry=self.EXPIRY)
+        t.join(self.SHORT_TIMEOUT)
+        self.assertTrue(t.is_expired())
+        self.assert_stopped_no_error(t)
+
+        t = self.submit(IdleTimeoutPoolTask, expiry=self.EXPIRY)
+        t.join(self.SHORT_TIMEOUT)
+        self.assertTrue(t.is_timed_out())
+        self.assert_aborted(t, TimeoutError)
+
+    def test_submit_twice(self):
+        t = self.submit(NoopPoolTask)
+        self.assertRaises(RuntimeError, self.executor.submit_task, t)
+
+    ################################################################################
+    # Executor interface
+
+    def test_submit_function(self):
+        fut = self.executor.submit(_noop_func)
+        self.assertEqual(SAMPLE_RESULT, fut.result(self.SHORT_TIMEOUT))
+        fut = self.executor.submit(_fail)
+        self.assertRaises(type(SAMPLE_EXCEPTION), fut.result, self.SHORT_TIMEOUT)
+
+    def test_map(self):
+        res = list(self.executor.map(lambda x: x * 2, range(100)))
+        self.assertEqual([x * 2 for x in range(100)], res)
+
+    def test_workers_reused(self):
+        idents = set()
+        futs = [self.executor.submit(lambda: idents.add(threading.get_ident()))
+                for _ in range(50)]
+        for fut in futs:
+            fut.result(self.SHORT_TIMEOUT)
+        self.assertLessEqual(len(idents), 2)
+
+    def test_shutdown(self):
+        futs = [self.executor.submit(time.sleep, self.SHORT_DELAY / 10) for _ in range(4)]
+        self.executor.shutdown(wait=True)
+        self.assertTrue(all(fut.done() for fut in futs))
+        self.assertFalse(any(w.is_alive() for w in self.executor.workers))
+        self.assertRaises(RuntimeError, self.executor.submit, _noop_func)
+
+    def test_shutdown_cancel_futures(self):
+        running = [self.submit(IdlePoolTask) for _ in range(2)]
+        futs = [self.executor.submit(_noop_func) for _ in range(4)]
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for r in running:
+            r.cancel()
+        self.executor.shutdown(wait=True)
+        for fut in futs:
+            self.assertTrue(fut.cancelled())
+            self.assertRaises(CancelledError, fut.result, 0)
+            self.assertTrue(fut.thread.is_cancelled())
+
+
+################################################################################
@@ -0,0 +1,100 @@
+"""
+Unit-tests for ProcessTaskThreads.
+"""
+
+import os
+
+from .base import BaseThreadTest
+from merethread.process import ProcessPool, ProcessFunctionThread
+from merethread.samples import (
+    ProcessSlowTaskThread, ProcessIdleTaskThread, ProcessFailedTaskThread,
+    ProcessIdleTimeoutTaskThread, idle_process_function_thread)
+
+
+################################################################################
+
+class ProcessTaskThreadTest(BaseThreadTest):
+
+    SHORT_TIMEOUT = BaseThreadTest.SHORT_TIMEOUT * 5
+    EXPIRY = BaseThreadTest.SHORT_TIMEOUT
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessPool(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def create_thread(self, tcls, *args, **kwargs):
+        return super().create_thread(tcls, *args, process_pool=self.pool, **kwargs)
+
+    def test_result(self):
+        t = self.start_thread(self.create_thread(ProcessSlowTaskThread, min=1000))
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertEqual(1009, t.result)
+
+    def test_runs_in_worker_process(self):
+        t = self.start_thread(self.create_thread(ProcessFunctionThread, os.getpid))
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertNotEqual(os.getpid(), t.result)
+
+    def test_abort(self):
+        t = self.start_thread(self.create_thread(ProcessFailedTaskThread))
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_aborted(t)
+
+    def test_cancel(self):
+        t = self.start_thread(self.create_thread(ProcessIdleTaskThread))
+        self.wait_for(lambda: t.process_pid is not None)
+        pid = t.process_pid
+        t.cancel('testing')
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_cancelled(t)
+        # the task stopped cooperatively, so the worker process is reused
+        t2 = self.start_thread(self.create_thread(ProcessFunctionThread, os.getpid))
+        t2.join(self.SHORT_TIMEOUT)
+        self.assertIn(pid, self.pool_pids() + [t2.result])
+
+    def test_cancel_kills_non_cooperative(self):
+        t = self.start_thread(self.create_thread(idle_process_function_thread, grace_period=0.1))
+        self.wait_for(lambda: t.process_pid is not None)
+        t.cancel('testing')
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_cancelled(t)
+
+    def test_cancel_before_start(self):
+        t = self.create_thread(ProcessIdleTaskThread)
+        t.cancel('testing')
+        t.start()
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_cancelled(t)
+
+    def test_timeout(self):
+        t = self.start_thread(self.create_thread(ProcessIdleTimeoutTaskThread, expiry=self.EXPIRY))
+        t.join(self.SHORT_TIMEOUT)
+        self.assertTrue(t.is_timed_out())
+        self.assert_aborted(t, TimeoutError)
+
+    def test_worker_died(self):
+        pool = ProcessPool(1)
+        try:
+            t = self.start_thread(super().create_thread(
+                ProcessFunctionThread, os._exit, args=(1,), process_pool=pool))
+            t.join(self.SHORT_TIMEOUT)
+            self.assert_aborted(t, RuntimeError)
+            # the dead worker process is not reused
+            t2 = self.start_thread(
+                super().create_thread(ProcessFunctionThread, os.getpid, process_pool=pool))
+            t2.join(self.SHORT_TIMEOUT)
+            self.assert_stopped_no_error(t2)
+        finally:
+            pool.shutdown()
+
+    def pool_pids(self):
+        return [w.pid for w in self.pool._idle]
+
+
+################################################################################
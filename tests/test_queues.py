@@ -0,0 +1,355 @@
+"""
+Unit-tests for event-queues and QueueEventLoopThreads.
+"""
+
+import time
+import queue
+import threading
+
+from .base import BaseThreadTest
+from merethread.queues import (
+    SimpleEventQueue, DequeEventQueue, RingBufferEventQueue, BoundedEventQueue,
+    PriorityEventQueue, CoalescingEventQueue)
+from merethread.metrics import MetricsRegistry
+from merethread.samples import (
+    RecordingQueueEventLoopThread, RecordingPriorityEventLoopThread,
+    RecordingCoalescingEventLoopThread)
+
+
+################################################################################
+
+QUEUE_TYPES = [
+    SimpleEventQueue, DequeEventQueue, RingBufferEventQueue, BoundedEventQueue,
+    PriorityEventQueue, CoalescingEventQueue]
+
+
+class EventQueueTest(BaseThreadTest):
+
+    def test_fifo(self):
+        for qcls in QUEUE_TYPES:
+            q = qcls()
+            for i in range(10):
+                q.put(i)
+            self.assertEqual(10, len(q))
+            self.assertEqual(list(range(10)), [q.get() for _ in range(10)])
+            self.assertEqual(0, q.qsize())
+
+    def test_get_timeout(self):
+        for qcls in QUEUE_TYPES:
+            q = qcls()
+            t0 = time.monotonic()
+            self.assertIsNone(q.get(timeout=self.SHORT_DELAY))
+            self.assertGreaterEqual(time.monotonic() - t0, self.SHORT_DELAY * 0.9)
+
+    def test_wakeup_blocked(self):
+        for qcls in QUEUE_TYPES:
+            q = qcls()
+            res = []
+            t = threading.Thread(target=lambda: res.append(q.get()))
+            t.start()
+            time.sleep(self.SHORT_DELAY)
+            q.wakeup()
+            t.join(self.SHORT_TIMEOUT)
+            self.assertFalse(t.is_alive())
+            self.assertEqual([None], res)
+
+    def test_wakeup_pending(self):
+        for qcls in QUEUE_TYPES:
+            q = qcls()
+            q.wakeup()
+            self.assertIsNone(q.get(timeout=self.LONG_TIMEOUT))
+
+    def test_put_wakes_getter(self):
+        for qcls in QUEUE_TYPES:
+            q = qcls()
+            res = []
+            t = threading.Thread(target=lambda: res.append(q.get()))
+            t.start()
+            time.sleep(self.SHORT_DELAY)
+            q.put('x')
+            t.join(self.SHORT_TIMEOUT)
+            self.assertEqual(['x'], res)
+
+    def test_ring_buffer_full(self):
+        q = RingBufferEventQueue(capacity=3)
+        for i in range(3):
+            q.put_nowait(i)
+        self.assertRaises(queue.Full, q.put_nowait, 3)
+        self.assertRaises(queue.Full, q.put, 3, timeout=self.SHORT_DELAY)
+        self.assertEqual(0, q.get())
+        q.put_nowait(3)
+        self.assertEqual([1, 2, 3], [q.get() for _ in range(3)])
+        self.assertRaises(ValueError, RingBufferEventQueue, capacity=0)
+
+    def test_ring_buffer_put_drop_oldest(self):
+        q = RingBufferEventQueue(capacity=2)
+        q.wakeup()
+        self.assertEqual([False, False, True], [q.put_drop_oldest(i) for i in range(3)])
+        self.assertEqual([1, 2], [q.get(), q.get()])
+        # the wake-up is still pending
+        t0 = time.monotonic()
+        self.assertIsNone(q.get(timeout=self.LONG_TIMEOUT))
+        self.assertLess(time.monotonic() - t0, self.SHORT_TIMEOUT)
+
+
+class BoundedEventQueueTest(BaseThreadTest):
+
+    def fill(self, q, n):
+        return [q.put(i) for i in range(n)]
+
+    def test_block(self):
+        q = BoundedEventQueue(capacity=3, put_timeout=self.SHORT_DELAY)
+        self.fill(q, 3)
+        self.assertRaises(queue.Full, q.put_nowait, 3)
+        t0 = time.monotonic()
+        self.assertRaises(queue.Full, q.put, 3)  # using put_timeout
+        self.assertGreaterEqual(time.monotonic() - t0, self.SHORT_DELAY * 0.9)
+        threading.Timer(self.SHORT_DELAY, q.get).start()
+        self.assertTrue(q.put(3, timeout=self.LONG_TIMEOUT))
+        self.assertEqual([1, 2, 3], [q.get() for _ in range(3)])
+        self.assertEqual(2, q.stats.rejected)
+        self.assertEqual(2, q.stats.blocked_puts)
+        self.assertGreater(q.stats.blocked_time, self.SHORT_DELAY * 1.5)
+
+    def test_drop(self):
+        q = BoundedEventQueue(capacity=3, overflow_policy='drop')
+        self.assertEqual([True] * 3 + [False] * 2, self.fill(q, 5))
+        self.assertEqual([0, 1, 2], [q.get() for _ in range(3)])
+        self.assertEqual(2, q.stats.dropped)
+        self.assertEqual(3, q.stats.queued)
+
+    def test_drop_oldest(self):
+        evicted = []
+        q = BoundedEventQueue(capacity=3, overflow_policy='drop_oldest', on_evict=evicted.append)
+        self.assertEqual([True] * 5, self.fill(q, 5))
+        self.assertEqual([0, 1], evicted)
+        self.assertEqual([2, 3, 4], [q.get() for _ in range(3)])
+        self.assertEqual(2, q.stats.dropped)
+        self.assertEqual(3, q.stats.max_depth)
+
+    def test_raise(self):
+        q = BoundedEventQueue(capacity=3, overflow_policy='raise')
+        self.fill(q, 3)
+        self.assertRaises(queue.Full, q.put, 3)
+        self.assertEqual(1, q.stats.rejected)
+        self.assertEqual(0, q.stats.blocked_puts)
+
+    def test_water_marks(self):
+        calls = []
+        q = BoundedEventQueue(
+            capacity=10, overflow_policy='drop', high_water_mark=8, low_water_mark=2,
+            on_high_water=lambda: calls.append('high'), on_low_water=lambda: calls.append('low'))
+        self.fill(q, 7)
+        self.assertFalse(q.is_overloaded())
+        self.fill(q, 5)
+        self.assertTrue(q.is_overloaded())
+        for _ in range(7):
+            q.get()
+        self.assertEqual(['high'], calls)
+        self.assertTrue(q.is_overloaded())
+        q.get()
+        self.assertEqual(['high', 'low'], calls)
+        self.assertFalse(q.is_overloaded())
+        self.fill(q, 8)
+        self.assertEqual(['high', 'low', 'high'], calls)
+        self.assertEqual(2, q.stats.high_water_count)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, BoundedEventQueue, overflow_policy='nope')
+        self.assertRaises(ValueError, BoundedEventQueue, capacity=10, high_water_mark=11)
+        self.assertRaises(
+            ValueError, BoundedEventQueue, capacity=10, high_water_mark=5, low_water_mark=5)
+
+
+class PriorityEventQueueTest(BaseThreadTest):
+
+    def test_priority_order(self):
+        q = PriorityEventQueue(3)
+        q.put('low1')
+        q.put('mid1', priority=1)
+        q.put('high1', priority=0)
+        q.put('low2', priority=2)
+        q.put('high2', priority=0)
+        self.assertEqual(2, q.qsize(0))
+        self.assertEqual(
+            ['high1', 'high2', 'mid1', 'low1', 'low2'], [q.get() for _ in range(5)])
+
+    def test_starvation_limit(self):
+        q = PriorityEventQueue(2, starvation_limit=3)
+        for i in range(8):
+            q.put(('high', i), priority=0)
+        for i in range(3):
+            q.put(('low', i), priority=1)
+        self.assertEqual(
+            [('high', 0), ('high', 1), ('high', 2), ('low', 0),
+             ('high', 3), ('high', 4), ('high', 5), ('low', 1),
+             ('high', 6), ('high', 7), ('low', 2)],
+            [q.get() for _ in range(11)])
+
+    def test_starvation_limit_all_levels(self):
+        # with all levels busy, every level gets a share (not only the two highest)
+        q = PriorityEventQueue(3, starvation_limit=1)
+        for i in range(30):
+            q.put(i, priority=i % 3)
+        priorities = [q.get() % 3 for _ in range(9)]
+        self.assertEqual([3, 3, 3], [priorities.count(p) for p in range(3)])
+
+    def test_high_priority_latency(self):
+        # a high-priority item is returned after at most one lower-priority item (per lower
+        # level), regardless of the backlog
+        q = PriorityEventQueue(3, starvation_limit=1)
+        for i in range(1000):
+            q.put(i, priority=1 + i % 2)
+        for _ in range(10):
+            q.get()
+        q.put('control', priority=0)
+        items = [q.get() for _ in range(3)]
+        self.assertIn('control', items)
+
+    def test_stats(self):
+        now = [0.]
+        q = PriorityEventQueue(2, clock=lambda: now[0])
+        q.put('a', priority=0)
+        q.put('b', priority=1)
+        q.put('c', priority=1)
+        now[0] = 2.
+        q.get()
+        q.get()
+        stats = q.get_stats()
+        self.assertEqual([0, 1], [s.depth for s in stats])
+        self.assertEqual([1, 2], [s.queued for s in stats])
+        self.assertEqual([1, 1], [s.dequeued for s in stats])
+        self.assertEqual([2., 2.], [s.wait_max for s in stats])
+        self.assertIsNone(PriorityEventQueue().stats[0].wait_mean)
+
+    def test_invalid(self):
+        q = PriorityEventQueue(2)
+        self.assertRaises(ValueError, q.put, 'x', priority=2)
+        self.assertRaises(ValueError, PriorityEventQueue, 0)
+        self.assertRaises(ValueError, PriorityEventQueue, starvation_limit=0)
+
+
+class CoalescingEventQueueTest(BaseThreadTest):
+
+    def test_last_wins(self):
+        q = CoalescingEventQueue(key=lambda item: item[0])
+        for i in range(10):
+            q.put(('a', i))
+            q.put(('b', i))
+        q.put(('c', 0))
+        self.assertEqual(3, len(q))
+        # coalesced items keep their place in the queue
+        self.assertEqual([('a', 9), ('b', 9), ('c', 0)], [q.get() for _ in range(3)])
+        self.assertIsNone(q.get(timeout=0))
+
+    def test_merge(self):
+        q = CoalescingEventQueue(
+            key=lambda item: item[0], merge=lambda pending, item: (item[0], pending[1] + item[1]))
+        for i in range(10):
+            q.put(('a', i))
+        self.assertEqual(('a', 45), q.get())
+        # a key is coalesced only while an item with the key is pending
+        q.put(('a', 1))
+        self.assertEqual(('a', 1), q.get())
+
+    def test_stats(self):
+        q = CoalescingEventQueue()
+        for i in range(10):
+            q.put(i % 3)
+        q.get()
+        stats = q.get_stats()
+        self.assertEqual((10, 7, 1), (stats.queued, stats.coalesced, stats.dequeued))
+
+
+class QueueEventLoopThreadTest(BaseThreadTest):
+
+    def test_handles_events_in_order(self):
+        for qcls in QUEUE_TYPES:
+            t = self.start_thread(self.create_thread(RecordingQueueEventLoopThread, queue=qcls()))
+            for i in range(1000):
+                t.put(i)
+            self.wait_for(lambda: len(t.events) == 1000)
+            self.assertEqual(list(range(1000)), t.events)
+            t.stop('testing')
+            t.join(self.SHORT_TIMEOUT)
+            self.assert_stopped_no_error(t)
+
+    def test_stop_wakes_immediately(self):
+        for qcls in QUEUE_TYPES:
+            t = self.start_thread(self.create_thread(RecordingQueueEventLoopThread, queue=qcls()))
+            time.sleep(self.SHORT_DELAY)
+            t0 = time.monotonic()
+            t.stop('testing')
+            self.assertTrue(t.join(self.SHORT_TIMEOUT))
+            self.assertLess(time.monotonic() - t0, self.SHORT_DELAY)
+            self.assert_stopped_no_error(t)
+
+    def test_stop_before_start(self):
+        t = self.create_thread(RecordingQueueEventLoopThread)
+        t.stop('testing')
+        t.start()
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+
+    def test_bounded(self):
+        registry = MetricsRegistry()
+        t = self.create_thread(
+            RecordingQueueEventLoopThread, capacity=5, overflow_policy='drop',
+            high_water_mark=4, metrics=registry)
+        self.assertIsInstance(t.queue, BoundedEventQueue)
+        with self.assertLogs(t.logger, 'WARNING'):
+            queued = [t.put(i) for i in range(8)]
+        self.assertEqual([True] * 5 + [False] * 3, queued)
+        self.assertTrue(t.is_overloaded())
+        self.start_thread(t)
+        self.wait_for(lambda: len(t.events) == 5)
+        self.assertFalse(t.is_overloaded())
+        metrics = registry.get_class_metrics(RecordingQueueEventLoopThread)
+        self.assertEqual(3, metrics.dropped_events.value)
+        self.assertEqual(1, metrics.high_water_marks.value)
+        self.assertIn('merethread_dropped_events_total', registry.to_prometheus())
+
+    def test_priority(self):
+        t = self.create_thread(RecordingPriorityEventLoopThread, num_priorities=2)
+        for i in range(5):
+            t.put(i)
+        t.put_nowait('control', priority=0)
+        self.assertEqual(6, t.qsize())
+        self.start_thread(t)
+        self.wait_for(lambda: len(t.events) == 6)
+        self.assertEqual(['control', 0, 1, 2, 3, 4], t.events)
+        self.assertEqual([1, 5], [s.dequeued for s in t.priority_stats()])
+
+    def test_coalescing(self):
+        registry = MetricsRegistry()
+        t = self.create_thread(
+            RecordingCoalescingEventLoopThread, key=lambda event: event[0], metrics=registry)
+        # a burst of events for 10 keys
+        for i in range(1000):
+            t.put((i % 10, i))
+        self.assertEqual(10, t.qsize())
+        self.start_thread(t)
+        self.wait_for(lambda: len(t.events) == 10)
+        self.assertEqual([(k, 990 + k) for k in range(10)], t.events)
+        stats = t.coalescing_stats()
+        self.assertEqual((1000, 990, 10), (stats.queued, stats.coalesced, stats.dequeued))
+        metrics = registry.get_class_metrics(RecordingCoalescingEventLoopThread)
+        self.assertEqual(990, metrics.coalesced_events.value)
+        self.assertIn('merethread_coalesced_events_total', registry.to_prometheus())
+
+    def test_coalescing_merge(self):
+        t = self.create_thread(
+            RecordingCoalescingEventLoopThread, key=len, merge=lambda pending, event: event * 2)
+        for event in ['a', 'b', 'cc']:
+            t.put(event)
+        self.start_thread(t)
+        self.wait_for(lambda: len(t.events) == 2)
+        self.assertEqual(['bb', 'cc'], t.events)
+
+    def test_invalid_event(self):
+        t = self.create_thread(RecordingQueueEventLoopThread)
+        self.assertRaises(ValueError, t.put, None)
+        self.assertRaises(ValueError, t.put_nowait, None)
+
+
+################################################################################
@@ -0,0 +1,73 @@
+"""
+Unit-tests for the thread registry and stack dumps.
+"""
+
+import gc
+import io
+import weakref
+
+from .base import BaseThreadTest
+from merethread import ThreadStatus
+from merethread.registry import get_threads, get_live_threads, get_stack_groups, dump_stacks
+from merethread.samples import IdleThread, NoopThread, IdleTaskThread
+
+
+################################################################################
+
+class RegistryTest(BaseThreadTest):
+
+    def test_lookup(self):
+        idle = [self.create_thread(IdleThread, name='registry-idle-%d' % i) for i in range(3)]
+        noop = self.create_thread(NoopThread, name='registry-noop')
+        for t in idle:
+            self.start_thread(t)
+        try:
+            self.assertEqual(get_threads(name='registry-noop'), [noop])
+            self.assertEqual([t for t in get_threads(cls=IdleThread) if t in idle], idle)
+            self.assertEqual([t for t in get_threads(cls='IdleThread') if t in idle], idle)
+            self.assertIn(noop, get_threads(status=ThreadStatus.not_started))
+            self.assertNotIn(noop, get_threads(status=ThreadStatus.running))
+            running = get_threads(status=[ThreadStatus.running, ThreadStatus.stopping])
+            self.assertTrue(set(idle) <= set(running))
+            self.assertTrue(set(idle) <= set(get_live_threads()))
+            self.assertNotIn(noop, get_live_threads())
+        finally:
+            for t in idle:
+                t.stop()
+                t.join(self.SHORT_TIMEOUT)
+
+    def test_weak(self):
+        t = NoopThread()
+        ref = weakref.ref(t)
+        self.assertIn(t, get_threads())
+        del t
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_grouped_stack_dump(self):
+        idle = [self.create_thread(IdleTaskThread, name='registry-idle-%d' % i) for i in range(20)]
+        for t in idle:
+            self.start_thread(t)
+        try:
+            groups = get_stack_groups(idle)
+            # all the idle threads are in the same place:
+            self.wait_for(lambda: len(get_stack_groups(idle)) == 1)
+            groups = get_stack_groups(idle)
+            stack, threads = groups[0]
+            self.assertEqual(set(threads), set(idle))
+            self.assertEqual(stack[-1][2], 'wait')
+
+            f = io.StringIO()
+            dump = dump_stacks(idle, file=f, max_names=3)
+            self.assertEqual(f.getvalue(), dump + '\n')
+            self.assertIn('# 20 threads: registry-idle-0, registry-idle-1, registry-idle-2, '
+                          '... (+17 more)', dump)
+            self.assertIn('in _main', dump)
+            self.assertIn('self._sleep(self.period)', dump)
+        finally:
+            for t in idle:
+                t.cancel()
+                t.join(self.SHORT_TIMEOUT)
+
+
+################################################################################
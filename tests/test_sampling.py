@@ -0,0 +1,93 @@
+"""
+Unit-tests for the sampling profiler.
+"""
+
+import os
+import io
+import pstats
+import tempfile
+
+from .base import BaseThreadTest
+from merethread.sampling import StackSampler, SampledProfile
+from merethread.samples import SlowTaskThread, IdleDaemonThread
+
+
+################################################################################
+
+class SamplingProfilerTest(BaseThreadTest):
+
+    def setUp(self):
+        super().setUp()
+        self.sampler = self.start_thread(StackSampler(interval=0.001, max_overhead=0.5))
+
+    def tearDown(self):
+        self.sampler.stop()
+        self.sampler.join(self.SHORT_TIMEOUT)
+        super().tearDown()
+
+    def test_sampling_thread(self):
+        t = self.create_thread(
+            SlowTaskThread, min=10 ** 12, profile='sampling',
+            profile_kwargs={'sampler': self.sampler})
+        self.start_thread(t)
+        self.wait_for(lambda: t.profiler is not None and t.profiler.num_samples >= 10)
+        t.cancel()
+        t.join(self.SHORT_TIMEOUT)
+        self.wait_for(lambda: self.sampler.num_threads() == 0)
+
+        profile = t.profiler
+        self.assertIsInstance(profile, SampledProfile)
+        lines = list(profile.iter_collapsed())
+        self.assertTrue(lines)
+        # (some samples may be taken while entering or exiting the thread)
+        self.assertTrue(any('_main (samples.py:' in line for line in lines))
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in lines), profile.num_samples)
+
+        class_profile = self.sampler.get_class_profile(SlowTaskThread)
+        self.assertGreaterEqual(class_profile.num_samples, profile.num_samples)
+
+    def test_pstats(self):
+        t = self.create_thread(
+            SlowTaskThread, min=10 ** 12, profile='sampling',
+            profile_kwargs={'sampler': self.sampler})
+        self.start_thread(t)
+        self.wait_for(lambda: t.profiler is not None and t.profiler.num_samples >= 10)
+        t.cancel()
+        t.join(self.SHORT_TIMEOUT)
+
+        stats = pstats.Stats(t.profiler)
+        funcs = {func[2]: v for func, v in stats.stats.items()}
+        self.assertIn('_main', funcs)
+        self.assertIn('run', funcs)
+        # _main's cumulative samples include its callees:
+        cc, nc, tt, ct, callers = funcs['_main']
+        self.assertGreaterEqual(ct, tt)
+        self.assertIn('run', [caller[2] for caller in callers])
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'stats')
+            t.profiler.dump_stats(path)
+            loaded = pstats.Stats(path, stream=io.StringIO())
+            self.assertEqual(set(loaded.stats), set(stats.stats))
+
+    def test_add_remove_thread(self):
+        t = self.start_thread(self.create_thread(IdleDaemonThread))
+        profile = self.sampler.add_thread(t)
+        self.assertIs(self.sampler.add_thread(t), profile)
+        self.wait_for(lambda: profile.num_samples >= 5)
+        self.sampler.remove_thread(t)
+        self.assertEqual(self.sampler.num_threads(), 0)
+        n = profile.num_samples
+        self.sampler.sample()
+        self.assertEqual(profile.num_samples, n)
+        t.stop()
+        t.join(self.SHORT_TIMEOUT)
+        self.assertIn('IdleDaemonThread', self.sampler.class_profiles)
+
+    def test_not_started(self):
+        t = self.create_thread(IdleDaemonThread)
+        with self.assertRaises(RuntimeError):
+            self.sampler.add_thread(t)
+
+
+################################################################################
@@ -5,12 +5,17 @@ Unit-tests for TaskThreads.
 import time
 from datetime import datetime, timedelta
 
+from concurrent.futures import CancelledError
+
 from .base import BaseThreadTest
+from merethread.task import TimeoutTaskThread, StreamingTaskThread
+from merethread.misc import StopCheckThrottle
 from merethread.samples import (
-    NoopTaskThread, IdleTaskThread, FailedTaskThread,
+    NoopTaskThread, IdleTaskThread, FailedTaskThread, SlowTaskThread,
     NoopLimitedTimeTaskThread, IdleLimitedTimeTaskThread, FailedLimitedTimeTaskThread,
     NoopTimeoutTaskThread, IdleTimeoutTaskThread, FailedTimeoutTaskThread,
     noop_function_thread, idle_function_thread, failed_function_thread,
+    CountingStreamingTaskThread, FailedStreamingTaskThread,
     SAMPLE_RESULT, SAMPLE_EXCEPTION)
 
 
@@ -132,6 +137,30 @@ class TaskThreadTest(BaseThreadTest):
         for thread_cls in self.IDLE_EXPIRY_THREADS:
             self._test_expires(thread_cls, timedelta(seconds=-100), immediate=True)
 
+    def test_expiry_ignores_wall_clock_jumps(self):
+        for thread_cls in self.IDLE_EXPIRY_THREADS:
+            t = self.create_thread(thread_cls, expiry=self.EXPIRY)
+            # the wall clock jumps forward after the task starts:
+            jump = [timedelta(0)]
+            t._clock = lambda: datetime.now() + jump[0]
+            self.start_thread(t)
+            jump[0] = timedelta(hours=1)
+            time.sleep(self.SHORT_DELAY)
+            self.assert_running(t)
+            t.join(self.SHORT_TIMEOUT)
+            self.assert_expired(t)
+
+    def test_expiry_custom_clock(self):
+        now = [datetime(2000, 1, 1)]
+        t = IdleTimeoutTaskThread(expiry=10, clock=lambda: now[0])
+        t._on_enter()
+        self.assertEqual(t._expiry, datetime(2000, 1, 1, 0, 0, 10))
+        now[0] += timedelta(seconds=9)
+        t._check_expiry()
+        now[0] += timedelta(seconds=1)
+        with self.assertRaises(t._Expired):
+            t._check_expiry()
+
     def _test_expires(self, thread_cls, expiry, immediate=False):
         t = self.start_thread(self.create_thread(thread_cls, expiry=expiry))
         time.sleep(self.SHORT_DELAY)
@@ -157,4 +186,144 @@ class TaskThreadTest(BaseThreadTest):
         self.assertEqual(res, t.CB_result)
         self.assertFalse(hasattr(t, 'CB_exception'))
 
+
+class _SlowTimeoutTaskThread(SlowTaskThread, TimeoutTaskThread):
+    pass
+
+
+class StopCheckTest(BaseThreadTest):
+
+    BIG_PRIME = 10 ** 12
+
+    def test_cancel_busy(self):
+        for kwargs in [{}, {'stop_check_every': 1000}, {'stop_check_interval': 0.001}]:
+            t = self.start_thread(self.create_thread(SlowTaskThread, min=self.BIG_PRIME, **kwargs))
+            time.sleep(self.SHORT_DELAY)
+            t.cancel('testing')
+            t.join(self.SHORT_TIMEOUT)
+            self.assert_cancelled(t)
+
+    def test_expires_busy(self):
+        for kwargs in [{}, {'stop_check_every': 1000}, {'stop_check_interval': 0.001}]:
+            t = self.start_thread(self.create_thread(
+                _SlowTimeoutTaskThread, min=self.BIG_PRIME, expiry=self.SHORT_DELAY, **kwargs))
+            t.join(self.SHORT_TIMEOUT)
+            self.assertTrue(t.is_timed_out())
+            self.assert_aborted(t, TimeoutError)
+
+    def test_throttle_every(self):
+        throttle = StopCheckThrottle(every=3)
+        self.assertEqual([2, 2, 2], [throttle.next_skip() for _ in range(3)])
+
+    def test_throttle_interval(self):
+        now = [0.]
+        throttle = StopCheckThrottle(interval=1., clock=lambda: now[0])
+        # checks every 0.01 seconds: the period grows (at most doubling per check), up to 100
+        periods = []
+        for _ in range(10):
+            throttle.next_skip()
+            periods.append(throttle.period)
+            now[0] += 0.01 * throttle.period
+        self.assertEqual([1, 2, 4, 8, 16, 32, 64, 100, 100, 100], periods)
+        # calls slow down (100 calls taking 10 seconds): the period shrinks immediately
+        now[0] += 9
+        throttle.next_skip()
+        self.assertEqual(10, throttle.period)
+
+    def test_throttle_invalid(self):
+        self.assertRaises(ValueError, StopCheckThrottle)
+        self.assertRaises(ValueError, StopCheckThrottle, every=0)
+        self.assertRaises(ValueError, StopCheckThrottle, interval=0)
+
+
+class _NotAGeneratorStreamingTaskThread(StreamingTaskThread):
+    EXCEPTION_TYPE = TypeError
+
+    def _main(self):
+        return [1, 2]
+
+
+class StreamingTaskThreadTest(BaseThreadTest):
+
+    def test_iter_results(self):
+        t = self.start_thread(self.create_thread(CountingStreamingTaskThread, n=1000))
+        self.assertEqual(list(range(1000)), list(t.iter_results(timeout=self.SHORT_TIMEOUT)))
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+        self.assertEqual(SAMPLE_RESULT, t.future.result(timeout=0))
+
+    def test_streams_before_done(self):
+        t = self.start_thread(
+            self.create_thread(CountingStreamingTaskThread, n=1000, period=self.SHORT_DELAY))
+        results = iter(t)
+        self.assertEqual([0, 1], [next(results), next(results)])
+        self.assertFalse(t.future.done())
+        t.cancel('testing')
+
+    def test_backpressure(self):
+        t = self.start_thread(
+            self.create_thread(CountingStreamingTaskThread, n=1000, buffer_size=5))
+        self.wait_for(lambda: len(t._buffer) == 5)
+        time.sleep(self.SHORT_DELAY)
+        self.assertEqual(5, len(t._buffer))
+        self.assert_running(t)
+        self.assertEqual(list(range(1000)), list(t))
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_stopped_no_error(t)
+
+    def test_cancel_while_blocked(self):
+        t = self.start_thread(
+            self.create_thread(CountingStreamingTaskThread, n=1000, buffer_size=5))
+        self.wait_for(lambda: len(t._buffer) == 5)
+        t.cancel('testing')
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_cancelled(t)
+        self.assertTrue(t.closed)
+        # the items left in the buffer, and then the cancellation
+        results = t.iter_results()
+        self.assertEqual(list(range(5)), [next(results) for _ in range(5)])
+        self.assertRaises(CancelledError, next, results)
+
+    def test_consumer_stops_iterating(self):
+        t = self.start_thread(
+            self.create_thread(CountingStreamingTaskThread, n=1000, buffer_size=5))
+        for i in t:
+            if i == 10:
+                break
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_cancelled(t)
+        self.assertTrue(t.closed)
+
+    def test_failed(self):
+        t = self.start_thread(self.create_thread(FailedStreamingTaskThread))
+        results = t.iter_results(timeout=self.SHORT_TIMEOUT)
+        self.assertEqual([0, 1], [next(results), next(results)])
+        self.assertRaises(type(SAMPLE_EXCEPTION), next, results)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_aborted(t)
+
+    def test_timeout(self):
+        t = self.start_thread(
+            self.create_thread(CountingStreamingTaskThread, n=10, period=self.SHORT_TIMEOUT))
+        self.assertRaises(TimeoutError, next, t.iter_results(timeout=self.SHORT_DELAY))
+        t.cancel('testing')
+
+    def test_cancel_before_start(self):
+        t = self.create_thread(CountingStreamingTaskThread)
+        t.cancel('testing')
+        t.start()
+        self.assertRaises(CancelledError, list, t)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_cancelled(t)
+
+    def test_not_a_generator(self):
+        t = self.start_thread(self.create_thread(_NotAGeneratorStreamingTaskThread))
+        self.assertRaises(TypeError, list, t)
+        t.join(self.SHORT_TIMEOUT)
+        self.assert_aborted(t)
+
+    def test_invalid_buffer_size(self):
+        self.assertRaises(ValueError, CountingStreamingTaskThread, buffer_size=0)
+
+
 ################################################################################
@@ -2,7 +2,12 @@
 Unit-tests of the basic merethread.Thread class.
 """
 
+import threading
+from datetime import datetime, timedelta
+
 from .base import BaseThreadTest
+from merethread import ThreadStatus
+from merethread.misc import Runtime, LazyEvent
 from merethread.samples import (
     IdleThread, IdleThreadTARGET,
     NoopThread, NoopThreadTARGET,
@@ -31,4 +36,117 @@ class ThreadTest(BaseThreadTest):
         t.join(self.SHORT_TIMEOUT)
         self.assert_aborted(t)
 
+    def test_future_callbacks(self):
+        results, errors = [], []
+        t = self.create_thread(NoopThread)
+        t.future.add_callback(lambda thread, result: results.append((thread, result)))
+        t.future.add_errback(lambda thread, e: errors.append((thread, e)))
+        self.start_thread(t)
+        t.join(self.SHORT_TIMEOUT)
+        self.assertEqual(results, [(t, None)])
+        self.assertEqual(errors, [])
+
+        results, errors = [], []
+        t = self.create_thread(AbortingThread)
+        t.future.add_callback(lambda thread, result: results.append((thread, result)))
+        t.future.add_errback(lambda thread, e: errors.append((thread, e)))
+        self.start_thread(t)
+        t.join(self.SHORT_TIMEOUT)
+        self.assertEqual(results, [])
+        self.assertEqual([(thread, type(e)) for thread, e in errors], [(t, type(t.exception))])
+
+
+class LazyFutureTest(BaseThreadTest):
+
+    def create_thread(self, tcls, *args, **kwargs):
+        # not accessing the future (unlike BaseThreadTest.create_thread)
+        t = tcls(*args, **kwargs)
+        self._threads_created.append(t)
+        return t
+
+    def test_not_created(self):
+        t = self.create_thread(NoopThread)
+        t.start()
+        t.join(self.SHORT_TIMEOUT)
+        self.assertIsNone(t._future)
+        self.assertEqual(t.status(), ThreadStatus.stopped)
+
+    def test_created_after_done(self):
+        t = self.create_thread(NoopThread)
+        t.start()
+        t.join(self.SHORT_TIMEOUT)
+        self.assertTrue(t.future.done())
+        self.assertIsNone(t.future.result(timeout=0))
+        self.assertIs(t.future, t.future)
+
+        t = self.create_thread(AbortingThread)
+        t.start()
+        t.join(self.SHORT_TIMEOUT)
+        self.assertIs(t.exception, t.future.exception(timeout=0))
+
+    def test_created_while_running(self):
+        t = self.create_thread(IdleThread)
+        t.start()
+        self.wait_for(t.is_alive)
+        fut = t.future
+        self.assertTrue(fut.running())
+        t.stop()
+        self.assertIsNone(fut.result(timeout=self.SHORT_TIMEOUT))
+
+
+class LazyEventTest(BaseThreadTest):
+
+    def test_wait(self):
+        event = LazyEvent()
+        self.assertFalse(event.is_set())
+        self.assertFalse(event.wait(0))
+        self.assertIsNone(event._event)
+        self.assertFalse(event.wait(0.01))
+        threading.Timer(self.SHORT_DELAY, event.set).start()
+        self.assertTrue(event.wait(self.LONG_TIMEOUT))
+        self.assertTrue(event.is_set())
+        self.assertTrue(event.wait())
+
+    def test_set_before_wait(self):
+        event = LazyEvent()
+        event.set()
+        self.assertTrue(event.wait(self.SHORT_TIMEOUT))
+        self.assertIsNone(event._event)
+
+
+class RuntimeTest(BaseThreadTest):
+
+    def test_thread_runtime(self):
+        t = self.start_thread(self.create_thread(NoopThread))
+        t.join(self.SHORT_TIMEOUT)
+        runtime = t.runtime
+        self.assertIsInstance(runtime.start, datetime)
+        self.assertIsInstance(runtime.total_ns, int)
+        self.assertGreaterEqual(runtime.total_ns, 0)
+        self.assertEqual(runtime.total, timedelta(microseconds=runtime.total_ns // 1000))
+
+    def test_custom_clock(self):
+        now = [datetime(2000, 1, 1)]
+        runtime = Runtime(clock=lambda: now[0])
+        with runtime:
+            now[0] += timedelta(seconds=3)
+        self.assertEqual(runtime.start, datetime(2000, 1, 1))
+        self.assertEqual(runtime.total, timedelta(seconds=3))
+        self.assertEqual(runtime.total_ns, 3 * 10 ** 9)
+        self.assertEqual(runtime.total_seconds, 3)
+
+    def test_explicit_times(self):
+        t0 = datetime(2000, 1, 1)
+        runtime = Runtime()
+        runtime.set_start(t0)
+        runtime.set_end(t0 + timedelta(seconds=5))
+        self.assertEqual(runtime.start, t0)
+        self.assertEqual(runtime.total, timedelta(seconds=5))
+        self.assertEqual(runtime.total_ns, 5 * 10 ** 9)
+        # only the start time passed
+        runtime.set_start(datetime.now() - timedelta(seconds=60))
+        runtime.set_end()
+        self.assertGreaterEqual(runtime.total, timedelta(seconds=60))
+        self.assertLess(runtime.total, timedelta(seconds=61))
+
 ################################################################################
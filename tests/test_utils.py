@@ -0,0 +1,139 @@
+"""
+Unit-tests for merethread.utils.
+"""
+
+import time
+
+from .base import BaseThreadTest
+from merethread.utils import ThreadLifeCycleContext, stop_threads, join_threads
+from merethread.samples import (
+    IdleDaemonThread, SlowStoppingDaemonThread, AbortingDaemonThread, IdleTaskThread,
+    NoopTaskThread, IdlePoolTask, idle_function_thread)
+from merethread.pool import TaskPoolExecutor
+
+
+################################################################################
+
+class _SlowExitingTaskThread(NoopTaskThread):
+    """ Exits a while after its future is set """
+
+    EXIT_DELAY = 0.2
+
+    def _on_exit(self):
+        time.sleep(self.EXIT_DELAY)
+        super()._on_exit()
+
+
+class StopThreadsTest(BaseThreadTest):
+
+    STOP_DELAY = 0.2
+
+    def start_threads(self, tcls, n, **kwargs):
+        return [self.start_thread(self.create_thread(tcls, **kwargs)) for _ in range(n)]
+
+    def test_stop(self):
+        threads = (
+            self.start_threads(IdleDaemonThread, 3) + self.start_threads(IdleTaskThread, 3))
+        result = stop_threads(threads, timeout=self.LONG_TIMEOUT, reason='testing')
+        self.assertEqual(threads, result.finished)
+        self.assertEqual([], result.timed_out)
+        self.assertEqual([], result.aborted)
+        for t in threads[:3]:
+            self.assert_stopped_no_error(t)
+        for t in threads[3:]:
+            self.assert_cancelled(t)
+
+    def test_parallel(self):
+        # stopping takes as long as the slowest thread, not the sum
+        threads = self.start_threads(SlowStoppingDaemonThread, 5, stop_delay=self.STOP_DELAY)
+        t0 = time.monotonic()
+        result = stop_threads(threads, timeout=self.LONG_TIMEOUT)
+        elapsed = time.monotonic() - t0
+        self.assertEqual(threads, result.finished)
+        self.assertLess(elapsed, self.STOP_DELAY * 3)
+
+    def test_single_deadline(self):
+        slow = self.start_threads(SlowStoppingDaemonThread, 3, stop_delay=self.SHORT_TIMEOUT * 3)
+        fast = self.start_threads(IdleDaemonThread, 2)
+        t0 = time.monotonic()
+        result = stop_threads(slow + fast, timeout=self.SHORT_TIMEOUT)
+        elapsed = time.monotonic() - t0
+        self.assertEqual(fast, result.finished)
+        self.assertEqual(slow, result.timed_out)
+        self.assertLess(elapsed, self.SHORT_TIMEOUT * 2)
+
+    def test_function_thread(self):
+        # a running FunctionThread cannot be cancelled, but the other threads are still stopped
+        fn = self.start_thread(self.create_thread(idle_function_thread, self.SHORT_TIMEOUT * 2))
+        threads = self.start_threads(IdleDaemonThread, 2) + self.start_threads(IdleTaskThread, 2)
+        result = stop_threads([fn] + threads, timeout=self.SHORT_TIMEOUT)
+        self.assertEqual(threads, result.finished)
+        self.assertEqual([fn], result.timed_out)
+        fn.join(self.LONG_TIMEOUT)
+        self.assert_stopped_no_error(fn)
+
+    def test_aborted(self):
+        t = self.create_thread(AbortingDaemonThread)
+        t.start()
+        t.join(self.SHORT_TIMEOUT)
+        result = stop_threads([t], timeout=self.SHORT_TIMEOUT)
+        self.assertEqual([t], result.aborted)
+        self.assertEqual([], result.finished)
+
+    def test_not_started(self):
+        t = self.create_thread(NoopTaskThread)
+        result = join_threads([t], timeout=self.SHORT_TIMEOUT)
+        self.assertEqual([t], result.finished)
+
+    def test_finished_at_deadline(self):
+        # the thread has finished its work (its future is done) by the deadline, but is still
+        # exiting: it is not reported as timed out
+        t = self.start_thread(self.create_thread(_SlowExitingTaskThread))
+        self.wait_for(t.future.done)
+        self.assertTrue(t.is_alive())
+        result = join_threads([t], timeout=0)
+        self.assertEqual([t], result.finished)
+        self.assertFalse(t.is_alive())
+
+    def test_pool_tasks(self):
+        executor = TaskPoolExecutor(2)
+        try:
+            tasks = [self.create_thread(IdlePoolTask) for _ in range(4)]
+            for task in tasks:
+                executor.submit_task(task)  # two of them pending
+            result = stop_threads(tasks, timeout=self.LONG_TIMEOUT)
+            self.assertEqual(tasks, result.finished)
+            for task in tasks:
+                self.assert_cancelled(task)
+        finally:
+            executor.shutdown()
+
+
+class ThreadLifeCycleContextTest(BaseThreadTest):
+
+    def test_stop_and_join(self):
+        threads = [self.create_thread(IdleDaemonThread) for _ in range(3)]
+        with ThreadLifeCycleContext(*threads) as ctx:
+            self.wait_for(lambda: all(t.is_alive() for t in threads))
+        for t in threads:
+            self.assert_stopped_no_error(t)
+        self.assertIsNone(ctx)
+
+    def test_timeout(self):
+        slow = self.create_thread(SlowStoppingDaemonThread, stop_delay=self.SHORT_TIMEOUT * 3)
+        fast = self.create_thread(IdleDaemonThread)
+        ctx = ThreadLifeCycleContext(slow, fast, join_timeout=self.SHORT_TIMEOUT)
+        with self.assertRaises(TimeoutError) as cm:
+            with ctx:
+                self.wait_for(lambda: slow.is_alive() and fast.is_alive())
+        self.assertEqual((slow,), cm.exception.args)
+        self.assertEqual([fast], ctx.stop_result.finished)
+
+    def test_reraise(self):
+        t = self.create_thread(AbortingDaemonThread)
+        with self.assertRaises(AbortingDaemonThread.EXCEPTION_TYPE):
+            with ThreadLifeCycleContext(t):
+                t.join(self.SHORT_TIMEOUT)
+
+
+################################################################################
@@ -0,0 +1,93 @@
+"""
+Unit-tests for the stall watchdog.
+"""
+
+import time
+
+from .base import BaseThreadTest
+from merethread.watchdog import StallWatchdog
+from merethread.samples import RecordingQueueEventLoopThread, IdleDaemonThread
+
+
+################################################################################
+
+class _StallRecordingMixin:
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.stalls = []
+
+    def _on_stall(self, duration, stacktrace):
+        self.stalls.append((duration, stacktrace))
+
+
+class _BlockingEventLoopThread(_StallRecordingMixin, RecordingQueueEventLoopThread):
+    """ Blocks (not well-behaved-ly) when handling events """
+
+    def _handle_event(self, event):
+        time.sleep(event)  # blocking
+        super()._handle_event(event)
+
+
+class _IdleWatchedDaemonThread(_StallRecordingMixin, IdleDaemonThread):
+    pass
+
+
+class StallWatchdogTest(BaseThreadTest):
+
+    STALL_TIMEOUT = 0.1
+
+    def setUp(self):
+        super().setUp()
+        self.watchdog = self.start_thread(StallWatchdog(check_interval=0.01))
+
+    def tearDown(self):
+        self.watchdog.stop()
+        self.watchdog.join(self.SHORT_TIMEOUT)
+        super().tearDown()
+
+    def create_watched(self, tcls, **kwargs):
+        return self.create_thread(
+            tcls, stall_timeout=self.STALL_TIMEOUT, watchdog=self.watchdog, **kwargs)
+
+    def test_stalled_event(self):
+        t = self.start_thread(self.create_watched(_BlockingEventLoopThread))
+        self.wait_for(lambda: self.watchdog.num_threads() == 1)
+        t.put(0.01)
+        t.put(self.STALL_TIMEOUT * 3)
+        t.put(0.01)
+        self.wait_for(lambda: len(t.events) == 3)
+        t.stop()
+        t.join(self.SHORT_TIMEOUT)
+        # only the long event is reported, once:
+        self.assertEqual(len(t.stalls), 1)
+        duration, stacktrace = t.stalls[0]
+        self.assertGreater(duration, self.STALL_TIMEOUT)
+        self.assertIn('time.sleep(event)  # blocking', stacktrace)
+        self.assertEqual(self.watchdog.num_threads(), 0)
+
+    def test_waiting_for_events_is_not_a_stall(self):
+        t = self.start_thread(self.create_watched(_BlockingEventLoopThread))
+        time.sleep(self.STALL_TIMEOUT * 3)
+        t.stop()
+        t.join(self.SHORT_TIMEOUT)
+        self.assertEqual(t.stalls, [])
+
+    def test_stalled_iteration(self):
+        # IdleDaemonThread sleeps in _main_iteration, which counts as stalled
+        t = self.start_thread(self.create_watched(_IdleWatchedDaemonThread))
+        self.wait_for(lambda: t.stalls)
+        t.stop()
+        t.join(self.SHORT_TIMEOUT)
+        self.assertEqual(len(t.stalls), 1)
+
+    def test_not_watched(self):
+        t = self.start_thread(self.create_thread(_IdleWatchedDaemonThread))
+        time.sleep(self.SHORT_DELAY)
+        self.assertEqual(self.watchdog.num_threads(), 0)
+        t.stop()
+        t.join(self.SHORT_TIMEOUT)
+        self.assertEqual(t.stalls, [])
+
+
+################################################################################